@@ -0,0 +1,424 @@
+from imports_nps import *
+from config_nps_qt6 import init_dict
+from StartClass import StartClass
+from ProcessROI import ProcessROI
+from ROITemplate import ROITemplate
+
+
+class BatchNPS:
+
+    """
+    Headless batch run of the NPS computation.
+
+    Replaces the dialog windows of class StartClass and the object
+    of class GUI, so that the whole program (search for files,
+    assignment of ROIs and ProcessROI) can be executed without display,
+    e.g. for nightly batches on servers.
+
+    Usage:
+        python BatchNPS.py <dataset_root> <roi_specification.json>
+                           [--exclude-start N] [--exclude-end N]
+                           [--metadata-tags TAGS] [--output-dir DIR]
+                           [--options-file FILE] [--option KEY=VALUE ...]
+
+    ROI specification (JSON):
+        {"rois": [[x0, y0, x1, y1], ...],
+         "array_rois": {"fixed_roi_height": 64, "fixed_roi_width": 64,
+                        "position_x": 100, "position_y": 100,
+                        "number_x": 3, "number_y": 3,
+                        "distance_x": 10, "distance_y": 10}}
+        Both keys are optional, "array_rois" can also be a list of such dicts.
+        A file 'variables_info.txt' stored by the form of mode 'Array_ROIs'
+        can be passed directly.
+    The same ROIs are applied to all images (as in GUI).
+
+    Attributes
+    ----------
+    obj_arrays : instance of class StartClass
+        Used to find the files and to read the images.
+
+    file_list : list of strings
+        Absolute paths to all images to be analyzed
+        (See attribute filelist of class StartClass).
+
+    all_roi_dict : ROITemplate object
+        (See attribute with the same name of class GUI).
+
+    image_rect_coord : list of tuples of int
+        (See attribute with the same name of class GUI).
+        Empty, since all ROIs are already stored in all_roi_dict.
+
+    image_rect_coord_record : list of tuples of int
+        Coordinates of all ROIs.
+        (See attribute with the same name of class GUI).
+
+    array : ndarray (2d)
+        Pixel array of the first image.
+
+    master : None
+        There is no main window to be destroyed.
+
+    Methods
+    -------
+    execute_nps(self)
+        Create object of class ProcessROI with options of init_dict
+        and calculate NPS of all series.
+
+    @staticmethod
+    read_roi_specification(path_to_json)
+        Read coordinates of ROIs from JSON.
+
+    @staticmethod
+    array_roi_coordinates(fixed_roi_height, fixed_roi_width, position_x, position_y,
+                          number_x, number_y, distance_x, distance_y)
+        Build coordinates of ROIs of mode 'Array_ROIs'.
+
+    @staticmethod
+    update_init_dict(options_file, options)
+        Update init_dict with options passed in command line.
+
+    @staticmethod
+    default_metadata_settings()
+        Get tag numbers of metadata as prefilled in dialog window 'Tag Numbers'.
+
+    @staticmethod
+    default_files_to_exclude()
+        Get numbers of files to be excluded as prefilled in dialog window.
+    """
+
+    def __init__(self, *, dataset_root, roi_coordinates, metadata_settings, files_to_exclude):
+
+        """
+        Search for files in dataset_root and assign ROIs to all of them.
+
+        :param dataset_root: string
+            Path to folder with all images to be analyzed.
+        :param roi_coordinates: list of tuples of int
+            Coordinates of ROIs (See return value of method read_roi_specification).
+        :param metadata_settings: string
+            (See parameter with the same name of class StartClass)
+        :param files_to_exclude: tuple of two ints
+            (See parameter with the same name of class StartClass)
+        """
+
+        print('Constructor of class BatchNPS is being executed')
+
+        # search for files without dialog windows
+        self.obj_arrays = StartClass(suffixes=init_dict['extensions'],
+                                     list_of_indices_raw=init_dict['list_of_indices_raw'],
+                                     folder_with_images=dataset_root,
+                                     metadata_settings=metadata_settings,
+                                     files_to_exclude=files_to_exclude,
+                                     createPNGImages=False,
+                                     num_discovery_threads=init_dict['num_discovery_threads'],
+                                     useCatalog=init_dict['useCatalog'],
+                                     catalog_name=init_dict['catalog_name'],
+                                     catalog_folder=init_dict['catalog_folder'],
+                                     pixel_cache_mb=init_dict['pixel_cache_mb'],
+                                     useVolumeCache=init_dict['useVolumeCache'],
+                                     usePartialReads=init_dict['usePartialReads'],
+                                     useRescale=init_dict['useRescale'],
+                                     exclusion_order=init_dict['exclusion_order'])
+        self.file_list = self.obj_arrays.filelist
+        if len(self.file_list) == 0:
+            raise ValueError('No files with extensions %s have been found in %s' %
+                             (init_dict['extensions'], dataset_root))
+
+        # apply the same ROIs to all images (as GUI.update_roi_dict does)
+        self.all_roi_dict = ROITemplate(files=self.file_list, rois=roi_coordinates)
+        self.image_rect_coord = []
+        self.image_rect_coord_record = list(roi_coordinates)
+
+        # initial image array
+        self.array = self.obj_arrays.create_base_array(self.file_list[0])['base_array']
+        # there is no main window
+        self.master = None
+
+        print('Constructor of class BatchNPS is done')
+
+    def execute_nps(self):
+
+        """
+        Create object of class ProcessROI with options of init_dict
+        and calculate NPS of all series.
+
+        :return: instance of class ProcessROI
+        """
+
+        obj_process_roi = ProcessROI(obj_roi=self,
+                                     obj_arr=self.obj_arrays,
+                                     fit_order=init_dict['fitting_order'],
+                                     crop_perc=init_dict['crop_percentage'],
+                                     useFitting=init_dict['useFitting'],
+                                     im_height_in_mm=init_dict['image_height_in_mm'],
+                                     im_width_in_mm=init_dict['image_width_in_mm'],
+                                     extensions=init_dict['extensions'],
+                                     trunc_percentage=init_dict['trunc_percentage'],
+                                     useCentralCropping=init_dict['useCentralCropping'],
+                                     start_freq_range=init_dict['start_freq_range'],
+                                     end_freq_range=init_dict['end_freq_range'],
+                                     step=init_dict['step'],
+                                     useTruncation=init_dict['useTruncation'],
+                                     multipleFiles=init_dict['multipleFiles'],
+                                     pixel_size_in_mm=init_dict['pixel_size_mm'],
+                                     first_data_set=init_dict['first_data_set'],
+                                     useBatchedFFT=init_dict['useBatchedFFT'],
+                                     nps_kernel=init_dict['nps_kernel'],
+                                     num_series_workers=init_dict['num_series_workers'],
+                                     num_image_threads=init_dict['num_image_threads'],
+                                     prefetch_depth=init_dict['prefetch_depth'],
+                                     num_prefetch_threads=init_dict['num_prefetch_threads'],
+                                     useNoiseMap=init_dict['useNoiseMap'],
+                                     noise_map_window=init_dict['noise_map_window'],
+                                     noise_map_stride=init_dict['noise_map_stride'],
+                                     noise_map_z_average=init_dict['noise_map_z_average'],
+                                     nps_image_policy=init_dict['nps_image_policy'],
+                                     nps_image_queue_size=init_dict['nps_image_queue_size'],
+                                     useEnsembleNPS=init_dict['useEnsembleNPS'])
+        obj_process_roi.execute_calc_nps_sorted()
+        return obj_process_roi
+
+    @staticmethod
+    def read_roi_specification(path_to_json):
+
+        """
+        Read coordinates of ROIs from JSON (See description of class BatchNPS).
+
+        :param path_to_json: string
+            Path to JSON with ROI specification.
+        :return: list of tuples of int
+            Coordinates of ROIs:
+                - x coordinate of upper left corner
+                - y coordinate of upper left corner
+                - x coordinate of lower right corner
+                - y coordinate of lower right corner
+        """
+
+        with open(path_to_json, 'r') as file_to_read_info:
+            specification = json.load(file_to_read_info)
+        if not isinstance(specification, dict):
+            raise ValueError('ROI specification %s must be a JSON object with keys '
+                             '\'rois\' and/or \'array_rois\', not %s' % (path_to_json,
+                                                                      type(specification).__name__))
+        # file stored by the form of mode 'Array_ROIs'
+        if 'fixed_roi_height' in specification:
+            specification = {'array_rois': specification}
+
+        roi_coordinates = []
+        for coord in specification.get('rois', []):
+            if len(coord) != 4:
+                raise ValueError('ROI must be given by 4 coordinates: %s' % (coord,))
+            roi_coordinates.append(tuple(int(i) for i in coord))
+        array_rois = specification.get('array_rois', [])
+        if isinstance(array_rois, dict):
+            array_rois = [array_rois]
+        for array_roi in array_rois:
+            roi_coordinates += BatchNPS.array_roi_coordinates(**array_roi)
+
+        if len(roi_coordinates) == 0:
+            raise ValueError('No ROIs are specified in %s' % path_to_json)
+        return roi_coordinates
+
+    @staticmethod
+    def array_roi_coordinates(fixed_roi_height, fixed_roi_width, position_x, position_y,
+                              number_x, number_y, distance_x, distance_y):
+
+        """
+        Build coordinates of ROIs of mode 'Array_ROIs'
+        in the same order as method readform_array_roi of class CreateForm.
+
+        :param fixed_roi_height: int
+            Height of each ROI.
+        :param fixed_roi_width: int
+            Width of each ROI.
+        :param position_x: int
+            x coordinate of left upper corner of left upper ROI.
+        :param position_y: int
+            y coordinate of left upper corner of left upper ROI.
+        :param number_x: int
+            Number of ROIs in x direction.
+        :param number_y: int
+            Number of ROIs in y direction.
+        :param distance_x: int
+            Distance between adjacent ROIs in x direction.
+        :param distance_y: int
+            Distance between adjacent ROIs in y direction.
+        :return: list of tuples of int
+            (See return value of method read_roi_specification)
+        """
+
+        roi_coordinates = []
+        # iterate over numbers of ROIs in x-direction (outer loop)
+        # and in y-direction (inner loop)
+        for x_i in range(int(number_x)):
+            for y_i in range(int(number_y)):
+                begin_rect_x = int(position_x) + x_i * (int(fixed_roi_width) + int(distance_x))
+                begin_rect_y = int(position_y) + y_i * (int(fixed_roi_height) + int(distance_y))
+                roi_coordinates.append((begin_rect_x,
+                                        begin_rect_y,
+                                        begin_rect_x + int(fixed_roi_width),
+                                        begin_rect_y + int(fixed_roi_height)))
+        return roi_coordinates
+
+    @staticmethod
+    def update_init_dict(options_file, options):
+
+        """
+        Update init_dict with options passed in command line.
+
+        :param options_file: string or None
+            Path to JSON with options (keys of init_dict).
+        :param options: list of strings
+            Options in format 'KEY=VALUE'. VALUE is parsed as JSON
+            (e.g. true, 4, "rfft2"), otherwise it is used as string.
+            Applied after options of options_file.
+        :return: nothing
+        """
+
+        new_options = {}
+        if options_file is not None:
+            with open(options_file, 'r') as file_to_read_info:
+                new_options.update(json.load(file_to_read_info))
+        for option in options:
+            if '=' not in option:
+                raise ValueError('Option must be given as KEY=VALUE: %s' % option)
+            key, value = option.split('=', 1)
+            try:
+                value = json.loads(value)
+            except ValueError:
+                pass
+            new_options.update({key.strip(): value})
+
+        for key in new_options:
+            if key not in init_dict:
+                raise ValueError('Unknown option: %s' % key)
+        init_dict.update(new_options)
+
+    @staticmethod
+    def default_metadata_settings():
+
+        """
+        Get tag numbers of metadata as prefilled in dialog window 'Tag Numbers'
+        (See class CreateFormMetaData): last settings if stored, otherwise
+        tags of init_dict.
+
+        :return: string
+            (See parameter metadata_settings of class StartClass)
+        """
+
+        if os.path.isfile('meta_data_settings.txt'):
+            with open('meta_data_settings.txt', 'r') as file_to_read_info:
+                return file_to_read_info.read()
+        return '\n'.join(', '.join(hex(int(sub_item)) for sub_item in item)
+                         for item in init_dict['list_of_indices_raw'])
+
+    @staticmethod
+    def default_files_to_exclude():
+
+        """
+        Get numbers of files to be excluded as prefilled in dialog window
+        (See class CreateForm): last settings if stored, otherwise 3 and 3.
+
+        :return: tuple of two ints
+            (See parameter files_to_exclude of class StartClass)
+        """
+
+        if os.path.isfile('file_exclusion_settings.txt'):
+            with open('file_exclusion_settings.txt', 'r') as file_to_read_info:
+                read_dict = json.load(file_to_read_info)
+            return tuple(int(read_dict[key]) for key in read_dict)
+        return 3, 3
+
+
+def create_parser():
+
+    """
+    Create parser of command line arguments.
+
+    :return: argparse.ArgumentParser
+    """
+
+    parser = argparse.ArgumentParser(description='Calculate NPS of all series in dataset_root '
+                                                 'without GUI and dialog windows.')
+    parser.add_argument('dataset_root',
+                        help='folder with all images to be analyzed')
+    parser.add_argument('roi_specification',
+                        help='JSON with ROIs applied to all images')
+    parser.add_argument('--exclude-start', type=int, default=None,
+                        help='number of files excluded from the beginning of each series '
+                             '(default: last settings or 3)')
+    parser.add_argument('--exclude-end', type=int, default=None,
+                        help='number of files excluded from the end of each series '
+                             '(default: last settings or 3)')
+    parser.add_argument('--metadata-tags', default=None,
+                        help='tags of metadata, e.g. "0x0008, 0x1030; 0x0018, 0x0050" '
+                             '(default: last settings or tags of init_dict)')
+    parser.add_argument('--output-dir', default=None,
+                        help='folder, the summary and averaged results are written into '
+                             '(default: current folder)')
+    parser.add_argument('--options-file', default=None,
+                        help='JSON with options of init_dict')
+    parser.add_argument('--option', action='append', default=[], metavar='KEY=VALUE',
+                        help='option of init_dict, e.g. --option nps_kernel=rfft2 '
+                             '--option num_series_workers=8 (can be repeated)')
+    return parser
+
+
+def main(argv=None):
+
+    """
+    Entry point of the batch run.
+
+    :param argv: list of strings or None
+        Command line arguments (sys.argv[1:] if None).
+    :return: int
+        Exit code: 0 - success, 1 - failure during the run,
+        2 - invalid arguments.
+    """
+
+    parser = create_parser()
+    args = parser.parse_args(argv)
+
+    dataset_root = os.path.abspath(args.dataset_root)
+    if not os.path.isdir(dataset_root):
+        parser.error('dataset_root is not a folder: %s' % args.dataset_root)
+    try:
+        BatchNPS.update_init_dict(options_file=args.options_file, options=args.option)
+        roi_coordinates = BatchNPS.read_roi_specification(args.roi_specification)
+    except (OSError, ValueError, TypeError) as error:
+        parser.error(str(error))
+    # there is no main window to be destroyed
+    init_dict['destroy_main_window'] = False
+
+    if args.output_dir is not None:
+        os.makedirs(args.output_dir, exist_ok=True)
+        os.chdir(args.output_dir)
+
+    metadata_settings = args.metadata_tags
+    if metadata_settings is None:
+        metadata_settings = BatchNPS.default_metadata_settings()
+    else:
+        # tag groups can be separated by semicolons in command line
+        metadata_settings = metadata_settings.replace(';', '\n')
+    files_to_exclude = BatchNPS.default_files_to_exclude()
+    if args.exclude_start is not None:
+        files_to_exclude = (args.exclude_start, files_to_exclude[1])
+    if args.exclude_end is not None:
+        files_to_exclude = (files_to_exclude[0], args.exclude_end)
+
+    try:
+        # folder for 2d-NPS-images in the folder results are written into
+        os.makedirs('01.2d_NPS_images', exist_ok=True)
+        obj_batch = BatchNPS(dataset_root=dataset_root,
+                             roi_coordinates=roi_coordinates,
+                             metadata_settings=metadata_settings,
+                             files_to_exclude=files_to_exclude)
+        obj_batch.execute_nps()
+    except Exception:
+        traceback.print_exc()
+        return 1
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,450 @@
+from imports_nps import *
+
+
+class DatasetCatalog:
+
+    """
+    Persistent catalog of files found in the folder with images.
+
+    Stored as SQLite file in a catalog folder outside of the folder with images
+    (by default in the cache folder of the user), so that the folder with images
+    is not modified and may be read-only (e.g. archive shares). The name of
+    the file contains a hash of the path to the folder with images. For each scanned
+    directory its modification time and listing are stored, so that
+    unchanged directories are not listed again when the folder is reopened.
+    For each found file its size, modification time, study and series
+    folders and the extracted metadata (See attribute metadata_subdict of class
+    StartClass) are stored. Files of changed directories are checked with
+    os.stat; files changed in place are recognized when they are read.
+    Several processes may save into the same SQLite file (e.g. series workers
+    storing metadata), SQLite serializes their transactions.
+
+    Attributes
+    ----------
+    path_to_catalog : string
+        Absolute path to SQLite file.
+
+    directories : dict of tuples
+        Keys : absolute paths to scanned directories;
+        Values : modification time (ns), list of file names, list of paths to subdirectories.
+
+    files : dict of dicts
+        Keys : absolute paths to found files;
+        Values : dicts
+            Keys : 'size', 'mtime_ns', 'study', 'series',
+                   'metadata_tags' - JSON of tags the metadata has been extracted for,
+                   'metadata' - JSON of metadata or None, if not extracted yet.
+
+    changed_directories : set of strings
+        Paths to directories, that have been listed again (not stored yet).
+
+    changed_files : set of strings
+        Paths to files, that have been changed (not stored yet).
+
+    removed_directories, removed_files : sets of strings
+        Paths to directories and files, that do not exist anymore (not deleted yet).
+
+    num_reused_directories : int
+        Number of directories, whose stored listing has been used.
+
+    Methods
+    -------
+    load(self)
+        Read catalog from SQLite file.
+
+    save(self)
+        Write changes of catalog into SQLite file.
+
+    get_directory(self, dir_name, mtime_ns)
+        Get stored listing of directory, if the directory is unchanged.
+
+    update_directory(self, dir_name, mtime_ns, listing)
+        Store listing of directory.
+
+    update_files(self, file_dict, scanned_directories, num_threads)
+        Update files after the search for files.
+
+    get_metadata(self, image_file, metadata_tags)
+        Get stored metadata of file, if the file is unchanged.
+
+    update_metadata(self, image_file, metadata_tags, metadata_subdict)
+        Store metadata of file.
+
+    @staticmethod
+    default_catalog_folder()
+        Get cache folder of the user for catalogs.
+
+    @staticmethod
+    metadata_to_json(metadata_subdict)
+        Convert metadata to JSON.
+
+    @staticmethod
+    stat_file(path_to_file)
+        Get size and modification time of file.
+    """
+
+    def __init__(self, folder_with_images, catalog_name, catalog_folder=None):
+
+        """
+        Read catalog of folder_with_images, if it already exists.
+
+        :param folder_with_images: string
+            Absolute path to folder with all images to be analyzed.
+        :param catalog_name: string
+            Name of SQLite file (a hash of folder_with_images is inserted
+            before the extension). Specified in init_dict.
+        :param catalog_folder: string or None
+            Folder the SQLite file is stored in. None (by default): cache folder
+            of the user (See static method default_catalog_folder). Specified in init_dict.
+        """
+
+        print('Constructor of class DatasetCatalog is being executed')
+
+        if catalog_folder is None:
+            catalog_folder = DatasetCatalog.default_catalog_folder()
+        name_of_catalog, extension = os.path.splitext(catalog_name)
+        hash_of_folder = hashlib.sha1(os.path.abspath(folder_with_images).encode('utf-8')).hexdigest()[:16]
+        self.path_to_catalog = os.path.join(catalog_folder, '%s_%s%s' % (name_of_catalog, hash_of_folder,
+                                                                          extension))
+        self.lock = threading.Lock()
+        self.directories = {}
+        self.files = {}
+        self.changed_directories = set()
+        self.changed_files = set()
+        self.removed_directories = set()
+        self.removed_files = set()
+        self.num_reused_directories = 0
+        self.load()
+
+        print('Constructor of class DatasetCatalog is done')
+
+    def __getstate__(self):
+
+        """
+        Drop the lock, that cannot be passed to worker processes.
+
+        :return: dict
+            Attributes of the object.
+        """
+
+        state = self.__dict__.copy()
+        state.pop('lock')
+        return state
+
+    def __setstate__(self, state):
+
+        """
+        Restore attributes and create new lock in worker process.
+
+        :param state: dict
+            (See return value of method __getstate__)
+        :return: nothing
+        """
+
+        self.__dict__.update(state)
+        self.lock = threading.Lock()
+
+    def connect(self):
+
+        """
+        Open SQLite file and create its tables, if they do not exist yet.
+
+        :return: sqlite3.Connection
+        """
+
+        connection = sqlite3.connect(self.path_to_catalog, timeout=60)
+        with connection:
+            connection.execute('CREATE TABLE IF NOT EXISTS directories '
+                               '(path TEXT PRIMARY KEY, mtime_ns INTEGER, file_names TEXT, subdirs TEXT)')
+            connection.execute('CREATE TABLE IF NOT EXISTS files '
+                               '(path TEXT PRIMARY KEY, size INTEGER, mtime_ns INTEGER, study TEXT, '
+                               'series TEXT, metadata_tags TEXT, metadata TEXT)')
+        return connection
+
+    def load(self):
+
+        """
+        Read catalog from SQLite file into attributes directories and files.
+        If the file does not exist or cannot be read, the catalog is empty.
+
+        :return: nothing
+        """
+
+        if not os.path.isfile(self.path_to_catalog):
+            return
+        try:
+            connection = self.connect()
+            try:
+                for path, mtime_ns, file_names, subdirs in connection.execute(
+                        'SELECT path, mtime_ns, file_names, subdirs FROM directories'):
+                    self.directories.update({path: (mtime_ns, json.loads(file_names), json.loads(subdirs))})
+                for path, size, mtime_ns, study, series, metadata_tags, metadata in connection.execute(
+                        'SELECT path, size, mtime_ns, study, series, metadata_tags, metadata FROM files'):
+                    self.files.update({path: {'size': size,
+                                              'mtime_ns': mtime_ns,
+                                              'study': study,
+                                              'series': series,
+                                              'metadata_tags': metadata_tags,
+                                              'metadata': metadata}})
+            finally:
+                connection.close()
+        except (sqlite3.Error, ValueError) as error:
+            print('Catalog %s cannot be read: %s' % (self.path_to_catalog, error))
+            self.directories = {}
+            self.files = {}
+        print('Catalog: %d directories, %d files' % (len(self.directories), len(self.files)))
+
+    def save(self):
+
+        """
+        Write changes of catalog into SQLite file.
+        If the file cannot be written (e.g. read-only folder), the changes are dropped.
+
+        :return: nothing
+        """
+
+        print('save is being executed')
+
+        with self.lock:
+            directory_rows = [(path,
+                               self.directories[path][0],
+                               json.dumps(self.directories[path][1]),
+                               json.dumps(self.directories[path][2]))
+                              for path in self.changed_directories]
+            file_rows = [(path,
+                          self.files[path]['size'],
+                          self.files[path]['mtime_ns'],
+                          self.files[path]['study'],
+                          self.files[path]['series'],
+                          self.files[path]['metadata_tags'],
+                          self.files[path]['metadata'])
+                         for path in self.changed_files]
+            removed_directories = [(path,) for path in self.removed_directories]
+            removed_files = [(path,) for path in self.removed_files]
+            self.changed_directories = set()
+            self.changed_files = set()
+            self.removed_directories = set()
+            self.removed_files = set()
+
+        try:
+            os.makedirs(os.path.dirname(self.path_to_catalog), exist_ok=True)
+            connection = self.connect()
+            try:
+                with connection:
+                    connection.executemany('DELETE FROM directories WHERE path = ?', removed_directories)
+                    connection.executemany('DELETE FROM files WHERE path = ?', removed_files)
+                    connection.executemany('INSERT OR REPLACE INTO directories VALUES (?, ?, ?, ?)',
+                                           directory_rows)
+                    connection.executemany('INSERT OR REPLACE INTO files VALUES (?, ?, ?, ?, ?, ?, ?)',
+                                           file_rows)
+            finally:
+                connection.close()
+        except (sqlite3.Error, OSError) as error:
+            print('Catalog %s cannot be written: %s' % (self.path_to_catalog, error))
+
+        print('save is done')
+
+    def get_directory(self, dir_name, mtime_ns):
+
+        """
+        Get stored listing of directory, if the directory is unchanged.
+
+        :param dir_name: string
+            Absolute path to directory.
+        :param mtime_ns: int
+            Current modification time of directory in ns.
+        :return: tuple of lists or None
+            (See return value of static method scan_directory of class StartClass)
+            None, if the directory is unknown or has been changed.
+        """
+
+        with self.lock:
+            stored = self.directories.get(dir_name)
+            if stored is None or stored[0] != mtime_ns:
+                return None
+            self.num_reused_directories += 1
+        return stored[1], stored[2]
+
+    def update_directory(self, dir_name, mtime_ns, listing):
+
+        """
+        Store listing of directory.
+
+        :param dir_name: string
+            Absolute path to directory.
+        :param mtime_ns: int
+            Modification time of directory in ns before it has been listed.
+        :param listing: tuple of lists
+            (See return value of static method scan_directory of class StartClass)
+        :return: nothing
+        """
+
+        with self.lock:
+            self.directories.update({dir_name: (mtime_ns, listing[0], listing[1])})
+            self.changed_directories.add(dir_name)
+
+    def update_files(self, file_dict, scanned_directories, num_threads):
+
+        """
+        Update files after the search for files: check new files and
+        files of changed directories with os.stat and remove files
+        and directories, that do not exist anymore.
+
+        :param file_dict: dict of dicts
+            (See attribute filedict of class StartClass)
+        :param scanned_directories: list of strings
+            Paths to all scanned directories.
+        :param num_threads: int
+            Number of threads calling os.stat.
+        :return: nothing
+        """
+
+        print('update_files is being executed')
+
+        # study and series folder of each found file
+        found_files = {}
+        for study in file_dict:
+            for series in file_dict[study]:
+                for path_to_file in file_dict[study][series]:
+                    found_files.update({path_to_file: (study, series)})
+
+        # new files and files in listed directories
+        files_to_check = [path_to_file for path_to_file in found_files
+                          if path_to_file not in self.files
+                          or os.path.dirname(path_to_file) in self.changed_directories]
+        with ThreadPoolExecutor(max_workers=num_threads) as executor:
+            file_stats = list(executor.map(DatasetCatalog.stat_file, files_to_check))
+
+        with self.lock:
+            for path_to_file, file_stat in zip(files_to_check, file_stats):
+                stored = self.files.get(path_to_file)
+                if stored is not None and (stored['size'], stored['mtime_ns']) == file_stat:
+                    continue
+                study, series = found_files[path_to_file]
+                self.files.update({path_to_file: {'size': file_stat[0],
+                                                  'mtime_ns': file_stat[1],
+                                                  'study': study,
+                                                  'series': series,
+                                                  'metadata_tags': None,
+                                                  'metadata': None}})
+                self.changed_files.add(path_to_file)
+            # drop files and directories, that do not exist anymore
+            scanned_directories = set(scanned_directories)
+            self.removed_files.update(path_to_file for path_to_file in self.files
+                                      if path_to_file not in found_files)
+            self.removed_directories.update(dir_name for dir_name in self.directories
+                                            if dir_name not in scanned_directories)
+            for path_to_file in self.removed_files:
+                self.files.pop(path_to_file, None)
+                self.changed_files.discard(path_to_file)
+            for dir_name in self.removed_directories:
+                self.directories.pop(dir_name, None)
+                self.changed_directories.discard(dir_name)
+
+        print('%d files checked, %d files changed, %d files removed' % (
+            len(files_to_check), len(self.changed_files), len(self.removed_files)))
+        print('update_files is done')
+
+    def get_metadata(self, image_file, metadata_tags):
+
+        """
+        Get stored metadata of file, if the file is unchanged and
+        the metadata has been extracted for the same tags.
+
+        :param image_file: string
+            Absolute path to image file.
+        :param metadata_tags: list of lists of hexstrings
+            (See attribute metadata_tags_list of class StartClass)
+        :return: dict or None
+            (See attribute metadata_subdict of class StartClass)
+            None, if there is no valid metadata.
+        """
+
+        with self.lock:
+            stored = self.files.get(image_file)
+        if stored is None or stored['metadata'] is None or \
+                stored['metadata_tags'] != json.dumps(metadata_tags):
+            return None
+        if (stored['size'], stored['mtime_ns']) != DatasetCatalog.stat_file(image_file):
+            return None
+        return json.loads(stored['metadata'])
+
+    def update_metadata(self, image_file, metadata_tags, metadata_subdict):
+
+        """
+        Store metadata of file together with its current size and modification time.
+
+        :param image_file: string
+            Absolute path to image file.
+        :param metadata_tags: list of lists of hexstrings
+            (See attribute metadata_tags_list of class StartClass)
+        :param metadata_subdict: dict
+            (See attribute metadata_subdict of class StartClass)
+        :return: nothing
+        """
+
+        file_stat = DatasetCatalog.stat_file(image_file)
+        metadata = DatasetCatalog.metadata_to_json(metadata_subdict)
+        with self.lock:
+            stored = self.files.get(image_file, {'study': os.path.dirname(os.path.dirname(image_file)),
+                                                 'series': os.path.basename(os.path.dirname(image_file))})
+            self.files.update({image_file: {'size': file_stat[0],
+                                            'mtime_ns': file_stat[1],
+                                            'study': stored['study'],
+                                            'series': stored['series'],
+                                            'metadata_tags': json.dumps(metadata_tags),
+                                            'metadata': metadata}})
+            self.changed_files.add(image_file)
+            self.removed_files.discard(image_file)
+
+    @staticmethod
+    def default_catalog_folder():
+
+        """
+        Get cache folder of the user for catalogs: %LOCALAPPDATA% on Windows,
+        $XDG_CACHE_HOME or ~/.cache otherwise.
+
+        :return: string
+            Path to folder 'NPS_PyQt/catalogs' in the cache folder.
+        """
+
+        if sys.platform == 'win32' and os.environ.get('LOCALAPPDATA'):
+            cache_folder = os.environ['LOCALAPPDATA']
+        else:
+            cache_folder = os.environ.get('XDG_CACHE_HOME') or os.path.join(os.path.expanduser('~'), '.cache')
+        return os.path.join(cache_folder, 'NPS_PyQt', 'catalogs')
+
+    @staticmethod
+    def metadata_to_json(metadata_subdict):
+
+        """
+        Convert metadata to JSON. Values of DICOM elements, that are not
+        supported by JSON (e.g. MultiValue, PersonName), are stored as lists or strings.
+
+        :param metadata_subdict: dict
+            (See attribute metadata_subdict of class StartClass)
+        :return: string
+        """
+
+        return json.dumps(metadata_subdict,
+                          default=lambda value: list(value) if isinstance(value, pydicom.multival.MultiValue)
+                          else str(value))
+
+    @staticmethod
+    def stat_file(path_to_file):
+
+        """
+        Get size and modification time of file.
+
+        :param path_to_file: string
+            Absolute path to file.
+        :return: tuple of ints
+            Size in bytes and modification time in ns;
+            (-1, -1), if the file cannot be accessed.
+        """
+
+        try:
+            file_stat = os.stat(path_to_file)
+        except OSError:
+            return -1, -1
+        return file_stat.st_size, file_stat.st_mtime_ns
@@ -1,4 +1,5 @@
 from imports_nps import *
+from ROITemplate import ROITemplate
 
 
 class GUI(tk.Frame):
@@ -96,12 +97,14 @@ class GUI(tk.Frame):
     y_coord : int
         Absolute y coordinate of mouse pointer at clicking on
         left mouse button.
-    all_roi_dict : dict of lists of tuples
-        Keys : absolute paths to dcm-images
-        Values : lists of tuples containing coordinates of
+    all_roi_dict : ROITemplate object
+        ROIs of all images: integer array containing coordinates of
             left upper (x and y) and right lower (x and y)
-            corners of ROIs. Each tuple for each ROI.
-            (See attribute image_rect_coord_record)
+            corners of ROIs (one row for each ROI), stored once
+            for all dcm-images, and overrides of single images.
+            Read as dict: keys are absolute paths to dcm-images,
+            values are arrays of ROIs of the images.
+            (See attribute image_rect_coord_record and class ROITemplate)
     form : instance of class CreateForm
         Object containing information needed in mode 'Fixed_ROIs'
         about size of fixed ROI.
@@ -359,8 +362,8 @@ class GUI(tk.Frame):
         self.image_rectangles = []
         # ROIs for current image
         self.image_roi = []
-        # dictionary for ROIs of all images
-        self.all_roi_dict = {}
+        # ROIs of all images (created, when file list is known)
+        self.all_roi_dict = None
         # collect all recorded rectangles
         self.all_rect_record = []
         # all xlsx-files
@@ -404,11 +407,9 @@ class GUI(tk.Frame):
         # create list of image files (paths to them)
         self.file_list = self.obj_arrays.filelist
         self.filedict = self.obj_arrays.filedict
-        # initialize empty dictionary for rois
+        # initialize empty ROI template for all images
         print('creation of all_roi_dict is being executed')
-        for path_to_file in self.file_list:
-            key = path_to_file
-            self.all_roi_dict.update({key: []})
+        self.all_roi_dict = ROITemplate(files=self.file_list)
         print('creation of all_roi_dict is done')
 
 
@@ -806,12 +807,10 @@ class GUI(tk.Frame):
         except IndexError:
             pass
         try:
-            # delete last roi coordinates from roi dictionary
-            for key in self.all_roi_dict:
-                roi_arr = self.all_roi_dict[key]
-                del roi_arr[-1]
-                self.all_roi_dict.update({key: roi_arr})
-            print('im_roi:    ', np.array(roi_arr).shape)  # DEBUG
+            # delete last roi coordinates from roi template
+            # (shared by all images)
+            self.all_roi_dict.remove_last()
+            print('im_roi:    ', self.all_roi_dict.rois.shape)  # DEBUG
         except IndexError:
             pass
 
@@ -838,11 +837,9 @@ class GUI(tk.Frame):
         :return: nothing.
         """
         print('ROIs are being saved. It can take some minutes')
+        # ROIs are stored once for all images
         for coord in self.image_rect_coord:
-            for key, path_to_file in zip(self.all_roi_dict, self.file_list):
-                roi_arr = self.all_roi_dict[key]
-                roi_arr.append(coord)
-                self.all_roi_dict.update({key: roi_arr})
+            self.all_roi_dict.append(coord)
         for rect in self.image_rectangles:
             self.background.itemconfig(rect, outline=self.color_rect_stored)
         # change the color of resized rectangles
@@ -857,8 +854,8 @@ class GUI(tk.Frame):
 
     def choose_whole_image(self):
         """
-        Select whole images as ROIs and store their pixel arrays
-        into all_roi_dict.
+        Select whole images as ROIs and store their coordinates
+        into all_roi_dict (as ROIs of single images).
         :return: nothing
         """
         # get minimal shape of images
@@ -868,11 +865,11 @@ class GUI(tk.Frame):
         # iterate over all images
         for key_path in self.file_list:
             # update all_roi_dict
-            key_image = os.path.basename(key_path)
             # self.all_roi_dict.update({key_image: np.array([
             #     self.arrays_dict[key_path][:min_rows][:min_columns]])})
-            self.all_roi_dict.update({key_image: np.array([
-                self.obj_arrays.create_base_array(key_path)['base_array']])})
+            rows, columns = np.shape(self.obj_arrays.create_base_array(key_path)['base_array'])
+            self.all_roi_dict.set_image_rois(image_file=key_path,
+                                             rois=[(0, 0, columns, rows)])
 
     def minimal_shape(self, dict_of_2d_arrays):
         """
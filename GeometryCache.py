@@ -0,0 +1,144 @@
+from imports_nps import *
+
+
+class GeometryCache:
+
+    """
+    Bounded registry of data precomputed per geometry of ROIs.
+
+    Data, that depends only on the geometry (shape of ROIs, pixel spacing,
+    order of fit etc.) and not on pixel values, is built once and looked up
+    afterwards, e.g.:
+        radius bins and bin counts of 2d-NPS (keyed by shape of ROIs);
+        frequency axes of 1d-NPS (keyed by size of ROIs and pixel spacing);
+        bases of polynomial detrending (keyed by order and shape of ROIs);
+        weights of resampling onto the frequency range (keyed by frequencies).
+    Keys are tuples, whose first item is the kind of data.
+    The least recently used entry is evicted, if there are more than
+    max_entries entries (e.g. for many differently sized ROIs).
+
+    Cached arrays are set read-only, as they are shared by all ROIs
+    of the same geometry.
+
+    Attributes
+    ----------
+    max_entries : int
+        Maximal number of entries.
+
+    entries : OrderedDict
+        Keys : tuples identifying kind and geometry;
+        Values : precomputed data (least recently used first).
+
+    statistics : dict
+        Keys : 'hits', 'misses', 'evictions', 'entries'.
+
+    lock : threading.Lock
+        Lock of attributes entries and statistics (ROIs are processed by several threads).
+
+    Methods
+    -------
+    get(self, key, build_function)
+        Look up data of a geometry or build it.
+
+    @staticmethod
+    freeze(value)
+        Set arrays of built data read-only.
+    """
+
+    def __init__(self, max_entries=256):
+
+        """
+        :param max_entries: int
+            (See attribute max_entries)
+        """
+
+        if max_entries < 1:
+            raise ValueError('Geometry cache must hold at least one entry, not %s' % max_entries)
+        self.max_entries = max_entries
+        self.entries = OrderedDict()
+        self.statistics = {'hits': 0, 'misses': 0, 'evictions': 0, 'entries': 0}
+        self.lock = threading.Lock()
+
+    def __getstate__(self):
+
+        """
+        Drop the lock and the entries, that are not passed to worker processes
+        (each worker builds its own entries).
+
+        :return: dict
+            Attributes of the object.
+        """
+
+        state = self.__dict__.copy()
+        state.pop('lock')
+        state.update({'entries': OrderedDict(),
+                      'statistics': {'hits': 0, 'misses': 0, 'evictions': 0, 'entries': 0}})
+        return state
+
+    def __setstate__(self, state):
+
+        """
+        Restore attributes and create new lock in worker process.
+
+        :param state: dict
+            (See return value of method __getstate__)
+        :return: nothing
+        """
+
+        self.__dict__.update(state)
+        self.lock = threading.Lock()
+
+    @staticmethod
+    def freeze(value):
+
+        """
+        Set arrays of built data read-only (arrays in dicts, tuples and lists as well).
+
+        :param value: any
+            Built data.
+        :return: any
+            The same data.
+        """
+
+        if isinstance(value, np.ndarray):
+            value.flags.writeable = False
+        elif isinstance(value, dict):
+            for item in value.values():
+                GeometryCache.freeze(item)
+        elif isinstance(value, (tuple, list)):
+            for item in value:
+                GeometryCache.freeze(item)
+        return value
+
+    def get(self, key, build_function):
+
+        """
+        Look up data of a geometry or build and store it, if it is not cached.
+
+        :param key: tuple
+            Kind of data and geometry, e.g. ('radial_bins', rows, columns).
+        :param build_function: callable
+            Function without arguments building the data (called outside
+            of the lock, so that threads do not wait for each other).
+        :return: any
+            Data built by build_function (arrays read-only).
+        """
+
+        with self.lock:
+            value = self.entries.get(key)
+            if value is not None:
+                self.entries.move_to_end(key)
+                self.statistics['hits'] += 1
+                return value
+            self.statistics['misses'] += 1
+        value = GeometryCache.freeze(build_function())
+        with self.lock:
+            # another thread may have built the same data meanwhile
+            if key in self.entries:
+                return self.entries[key]
+            self.entries.update({key: value})
+            while len(self.entries) > self.max_entries:
+                self.entries.popitem(last=False)
+                self.statistics['evictions'] += 1
+            self.statistics['entries'] = len(self.entries)
+        return value
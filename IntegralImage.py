@@ -0,0 +1,269 @@
+from imports_nps import *
+
+
+class IntegralImage:
+
+    """
+    Summed-area tables (integral images) of pixel values and of their squares.
+
+    The tables are built once per image, afterwards sum, mean and SD
+    of any rectangular window are computed from four table entries each
+    (independent of the size of the window), for many windows at once.
+
+    Integer images are summed exactly (int64) and mean and SD are reduced
+    from exact integer sums, so that no precision is lost by subtracting
+    large sums. Other images are shifted by their mean before summation
+    (float64), so that sums of squares stay small compared to the variance.
+
+    Building the tables costs several passes over the image, so that they
+    pay off only for many or overlapping windows (See static method pays_off).
+
+    Attributes
+    ----------
+    table_cost_per_pixel : int
+        Estimated cost of building the tables per summed pixel
+        relative to the cost of statistics of one pixel of a window.
+
+    cost_per_window : int
+        Estimated overhead of statistics of one window computed from its
+        pixel array (in costs of statistics of one pixel).
+
+    row_offset : int
+        Row of the whole image corresponding to the first row of the tables.
+
+    column_offset : int
+        Column of the whole image corresponding to the first column of the tables.
+
+    shape : tuple of two ints
+        Shape of summed pixel array.
+
+    exact : boolean
+        Whether pixel values are integers summed exactly.
+
+    shift : float
+        Value subtracted from pixel values before summation (0 for integers).
+
+    max_abs_value : int
+        Maximal absolute pixel value of integer images (0 for other images).
+
+    sum_table : ndarray (2d, int64 or float64)
+        Summed-area table of (shifted) pixel values with an additional
+        leading row and column of zeros.
+
+    sum_sq_table : ndarray (2d, int64 or float64)
+        Summed-area table of squares of (shifted) pixel values.
+
+    Methods
+    -------
+    window_sums(self, rois)
+        Get number of pixels, sums and sums of squares of windows.
+
+    window_statistics(self, rois)
+        Get number of pixels, mean and SD of windows.
+
+    window_maps(self, window, stride)
+        Get maps of mean and SD of sliding windows.
+
+    @staticmethod
+    summed_area_table(array, dtype)
+        Build summed-area table with leading zero row and column.
+
+    @staticmethod
+    bounding_box(rois)
+        Get rectangle covering all windows.
+
+    @staticmethod
+    pays_off(rois)
+        Check, whether tables are faster than statistics of pixel arrays of windows.
+    """
+
+    # measured with 16-bit images and ROIs of 32 x 32 to 128 x 128 pixels
+    table_cost_per_pixel = 5
+    cost_per_window = 3000
+
+    def __init__(self, pixels, row_offset=0, column_offset=0):
+
+        """
+        :param pixels: ndarray (2d)
+            Pixel values in native data type (not rescaled).
+        :param row_offset: int
+            (See attribute row_offset)
+        :param column_offset: int
+            (See attribute column_offset)
+        """
+
+        self.row_offset = row_offset
+        self.column_offset = column_offset
+        self.shape = np.shape(pixels)
+        self.exact = np.issubdtype(pixels.dtype, np.integer) or pixels.dtype == np.bool_
+        if self.exact:
+            # squares of 16-bit values summed over 2**30 pixels fit into int64
+            dtype = np.int64
+            values = pixels
+            self.shift = 0
+            self.max_abs_value = max(abs(int(np.min(pixels))), abs(int(np.max(pixels)))) if pixels.size > 0 else 0
+        else:
+            dtype = np.float64
+            self.shift = float(np.mean(pixels, dtype=np.float64)) if pixels.size > 0 else 0.0
+            self.max_abs_value = 0
+            values = pixels.astype(np.float64) - self.shift
+        # values are converted while summing, no converted copy of the image is built
+        self.sum_table = IntegralImage.summed_area_table(array=values, dtype=dtype)
+        self.sum_sq_table = IntegralImage.summed_area_table(array=np.multiply(values, values, dtype=dtype),
+                                                            dtype=dtype)
+
+    @staticmethod
+    def summed_area_table(array, dtype):
+
+        """
+        Build summed-area table: element [i, j] is the sum of array[:i, :j].
+
+        :param array: ndarray (2d)
+        :param dtype: data type
+            Data type of the table (int64 or float64), in which values are summed.
+        :return: ndarray (2d)
+            Table of shape (rows + 1, columns + 1).
+        """
+
+        table = np.zeros((array.shape[0] + 1, array.shape[1] + 1), dtype=dtype)
+        np.cumsum(array, axis=0, dtype=dtype, out=table[1:, 1:])
+        np.cumsum(table[1:, 1:], axis=1, out=table[1:, 1:])
+        return table
+
+    @staticmethod
+    def bounding_box(rois):
+
+        """
+        Get rectangle covering all windows.
+
+        :param rois: ndarray (2d) or list of tuples
+            Windows: x and y coordinates of upper left corner
+            and of lower right corner (one row for each window).
+        :return: tuple of four ints
+            x0, y0, x1, y1 of the covering rectangle.
+        """
+
+        rois = np.asarray(rois).reshape(-1, 4)
+        return (int(rois[:, 0].min()), int(rois[:, 1].min()),
+                int(rois[:, 2].max()), int(rois[:, 3].max()))
+
+    @staticmethod
+    def pays_off(rois):
+
+        """
+        Check, whether building tables of the rectangle covering all windows
+        is estimated to be faster than computing statistics of pixel arrays
+        of windows (e.g. for many or overlapping windows).
+
+        :param rois: ndarray (2d) or list of tuples
+            Windows (See static method bounding_box) with positive sizes.
+        :return: boolean
+        """
+
+        rois = np.asarray(rois, dtype=np.int64).reshape(-1, 4)
+        if len(rois) == 0:
+            return False
+        x0, y0, x1, y1 = IntegralImage.bounding_box(rois)
+        window_cost = np.sum((rois[:, 2] - rois[:, 0]) * (rois[:, 3] - rois[:, 1])) + \
+            len(rois) * IntegralImage.cost_per_window
+        return window_cost > IntegralImage.table_cost_per_pixel * (x1 - x0) * (y1 - y0)
+
+    def window_sums(self, rois):
+
+        """
+        Get number of pixels, sums and sums of squares of (shifted) pixel values
+        of windows. Windows are clipped to the summed pixel array
+        (as slicing of arrays does).
+
+        :param rois: ndarray (2d) or list of tuples
+            Windows in coordinates of the whole image (See method bounding_box).
+        :return: tuple of three ndarrays (1d)
+            Numbers of pixels, sums and sums of squares of windows.
+        """
+
+        rois = np.asarray(rois, dtype=np.int64).reshape(-1, 4)
+        # table indices of window corners
+        x0 = np.clip(rois[:, 0] - self.column_offset, 0, self.shape[1])
+        y0 = np.clip(rois[:, 1] - self.row_offset, 0, self.shape[0])
+        x1 = np.clip(rois[:, 2] - self.column_offset, x0, self.shape[1])
+        y1 = np.clip(rois[:, 3] - self.row_offset, y0, self.shape[0])
+        counts = (x1 - x0) * (y1 - y0)
+        sums = self.sum_table[y1, x1] - self.sum_table[y0, x1] - \
+            self.sum_table[y1, x0] + self.sum_table[y0, x0]
+        sums_sq = self.sum_sq_table[y1, x1] - self.sum_sq_table[y0, x1] - \
+            self.sum_sq_table[y1, x0] + self.sum_sq_table[y0, x0]
+        return counts, sums, sums_sq
+
+    def window_statistics(self, rois):
+
+        """
+        Get number of pixels, mean and SD (population SD, as np.std)
+        of pixel values of windows.
+
+        :param rois: ndarray (2d) or list of tuples
+            Windows in coordinates of the whole image (See method bounding_box).
+        :return: dict
+            Keys : 'count' - ndarray of numbers of pixels,
+                   'mean' - ndarray of mean values (nan for empty windows),
+                   'SD' - ndarray of SD (nan for empty windows).
+        """
+
+        counts, sums, sums_sq = self.window_sums(rois)
+        with np.errstate(invalid='ignore', divide='ignore'):
+            # bound is computed with Python integers, so that it does not overflow itself
+            if self.exact and (int(counts.max(initial=0)) * self.max_abs_value) ** 2 < 2 ** 62:
+                # exact integer reduction: variance = (n * S2 - S1 ** 2) / n ** 2
+                # (n * S2 and S1 ** 2 are not greater than (n * max_abs_value) ** 2)
+                numerators = counts * sums_sq - sums * sums
+                mean = sums / counts
+                variance = numerators / (counts * counts)
+            elif self.exact:
+                # the same for large windows with Python integers, that do not overflow
+                # (division is rounded once)
+                counts_obj = counts.astype(object)
+                sums_obj = sums.astype(object)
+                numerators = counts_obj * sums_sq.astype(object) - sums_obj * sums_obj
+                mean = np.array([s / n if n > 0 else np.nan for s, n in zip(sums_obj, counts_obj)],
+                                dtype=np.float64)
+                variance = np.array([v / (n * n) if n > 0 else np.nan for v, n in zip(numerators, counts_obj)],
+                                    dtype=np.float64)
+            else:
+                shifted_mean = sums / counts
+                mean = shifted_mean + self.shift
+                # variance of shifted values, rounding errors must not make it negative
+                variance = np.maximum(sums_sq / counts - shifted_mean ** 2, 0)
+        return {'count': counts,
+                'mean': mean,
+                'SD': np.sqrt(variance)}
+
+    def window_maps(self, window, stride):
+
+        """
+        Get maps of mean and SD of windows sliding over the summed pixel array
+        (only windows lying completely inside the array).
+
+        :param window: int or tuple of two ints
+            Height and width of windows in pixels (one int: square windows).
+        :param stride: int or tuple of two ints
+            Distance between neighbouring windows in pixels along rows and columns.
+        :return: dict
+            Keys : 'mean', 'SD' - ndarrays (2d): mean and SD of window,
+                       whose upper left corner is at row_starts[i], column_starts[j],
+                       as element [i, j],
+                   'row_starts', 'column_starts' - ndarrays (1d) of first rows and columns
+                       of windows in coordinates of the whole image.
+        """
+
+        window_height, window_width = np.broadcast_to(window, 2)
+        stride_rows, stride_columns = np.broadcast_to(stride, 2)
+        row_starts = np.arange(0, self.shape[0] - window_height + 1, max(stride_rows, 1)) + self.row_offset
+        column_starts = np.arange(0, self.shape[1] - window_width + 1, max(stride_columns, 1)) + self.column_offset
+        # all windows (row by row)
+        y0, x0 = np.meshgrid(row_starts, column_starts, indexing='ij')
+        rois = np.stack([x0.ravel(), y0.ravel(),
+                         x0.ravel() + window_width, y0.ravel() + window_height], axis=1)
+        statistics = self.window_statistics(rois=rois)
+        return {'mean': statistics['mean'].reshape(len(row_starts), len(column_starts)),
+                'SD': statistics['SD'].reshape(len(row_starts), len(column_starts)),
+                'row_starts': row_starts,
+                'column_starts': column_starts}
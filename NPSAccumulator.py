@@ -0,0 +1,120 @@
+from imports_nps import *
+
+
+class NPSAccumulator:
+
+    """
+    Streaming sum of 2d-NPS of all ROIs of a series.
+
+    2d-NPS of ROIs with the same geometry (shape of ROI and pixel spacing)
+    are added to one sum array as soon as an image is processed,
+    so that memory depends on the size of spectra and the number
+    of geometries, not on the number of ROIs and images.
+    The ensemble 2d-NPS of a geometry is its sum divided by its
+    number of ROIs (See method reduce_ensemble_nps of class ProcessROI).
+
+    Attributes
+    ----------
+    sums : dict of ndarrays (2d)
+        Keys : geometries - tuples (rows, columns, pixel spacing in y direction);
+        Values : sums of 2d-NPS of ROIs with the geometry.
+
+    counts : dict of ints
+        Keys : geometries (See attribute sums);
+        Values : numbers of summed 2d-NPS.
+
+    lock : threading.Lock
+        Lock of attributes sums and counts (images are processed by several threads).
+
+    Methods
+    -------
+    add_image_nps(self, nps_2d_list, roi_shapes, pixel_spacing)
+        Add 2d-NPS of ROIs of one image.
+
+    geometries(self)
+        Get ensemble 2d-NPS of all geometries.
+    """
+
+    def __init__(self):
+
+        """
+        Create empty sums.
+        """
+
+        self.sums = {}
+        self.counts = {}
+        self.lock = threading.Lock()
+
+    def __getstate__(self):
+
+        """
+        Drop the lock, that is not passed to worker processes.
+
+        :return: dict
+            Attributes of the object.
+        """
+
+        state = self.__dict__.copy()
+        state.pop('lock')
+        return state
+
+    def __setstate__(self, state):
+
+        """
+        Restore attributes and create new lock in worker process.
+
+        :param state: dict
+            (See return value of method __getstate__)
+        :return: nothing
+        """
+
+        self.__dict__.update(state)
+        self.lock = threading.Lock()
+
+    def add_image_nps(self, nps_2d_list, roi_shapes, pixel_spacing):
+
+        """
+        Add 2d-NPS of ROIs of one image to the sums of their geometries.
+
+        :param nps_2d_list: list of ndarrays (2d)
+            2d-NPS of ROIs (as computed by static method nps_spectrum_stack
+            of class ProcessROI).
+        :param roi_shapes: list of tuples of two ints
+            Shapes of the ROIs.
+        :param pixel_spacing: tuple of two floats
+            Pixel spacing of the image in y and x direction.
+        :return: nothing
+        """
+
+        # equally shaped ROIs are summed at once
+        shape_buckets = {}
+        for nps_2d, shape in zip(nps_2d_list, roi_shapes):
+            shape_buckets.setdefault(tuple(shape), []).append(nps_2d)
+        for shape, bucket in shape_buckets.items():
+            geometry = shape + (float(pixel_spacing[0]),)
+            bucket_sum = np.sum(bucket, axis=0)
+            with self.lock:
+                if geometry in self.sums:
+                    self.sums[geometry] += bucket_sum
+                    self.counts[geometry] += len(bucket)
+                else:
+                    self.sums.update({geometry: bucket_sum})
+                    self.counts.update({geometry: len(bucket)})
+
+    def geometries(self):
+
+        """
+        Get ensemble 2d-NPS of all geometries.
+
+        :return: list of dicts
+            Keys : 'shape' - shape of ROIs,
+                   'pixel_spacing' - pixel spacing in y direction,
+                   'nps_2d' - mean 2d-NPS of ROIs,
+                   'count' - number of ROIs.
+        """
+
+        with self.lock:
+            return [{'shape': geometry[:2],
+                     'pixel_spacing': geometry[2],
+                     'nps_2d': self.sums[geometry] / self.counts[geometry],
+                     'count': self.counts[geometry]} for geometry in self.sums]
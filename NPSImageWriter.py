@@ -0,0 +1,272 @@
+from imports_nps import *
+
+
+class NPSImageWriter:
+
+    """
+    Writer of 2d-NPS images in background.
+
+    2d-NPS of ROIs are handed over to a background thread, which shifts
+    and normalizes them and writes them as jpg-files, so that
+    the computation of NPS does not wait for the disk.
+    Which images are written is defined by a policy:
+        'off' - no images;
+        'first_roi_per_series' - 2d-NPS of the first ROI of the first image of each series;
+        'image_ensemble' - mean 2d-NPS of all (equally shaped) ROIs of each image;
+        'all' - 2d-NPS of each ROI.
+    Names of files contain folder, series, image and ROI, and are made unique,
+    so that images are not overwritten.
+    At most max_pending 2d-NPS wait to be written: if the disk is slower than
+    the computation, method submit waits for the oldest image, so that memory
+    does not grow with the number of ROIs (e.g. for policy 'all').
+
+    Attributes
+    ----------
+    policies : tuple of strings
+        Supported policies.
+
+    folder : string
+        Path to folder the images are written into.
+
+    policy : string
+        Policy (See above).
+
+    max_pending : int
+        Maximal number of submitted 2d-NPS, that are not written yet.
+
+    kernel : string
+        Kernel the 2d-NPS are computed with ('fft2' or 'rfft2').
+
+    full_nps_function : callable
+        Function building shifted 2d-NPS of full plane
+        (See static method full_nps_2d of class ProcessROI).
+
+    filenames : set of strings
+        Names of files already written by this writer.
+
+    executor : ThreadPoolExecutor or None
+        Thread writing images (created, when the first image is submitted).
+
+    futures : deque of Future objects
+        Images being written (in the order of submission, at most max_pending).
+
+    num_written : int
+        Number of images submitted to be written.
+
+    lock : threading.Lock
+        Lock of attributes filenames and futures (images are submitted by several threads).
+
+    Methods
+    -------
+    add_image_nps(self, nps_2d_list, roi_shapes, name, first_image)
+        Submit 2d-NPS of ROIs of one image according to policy.
+
+    submit(self, nps_2d, shape, name)
+        Submit one 2d-NPS to be written.
+
+    unique_filename(self, name)
+        Get path to image, that has not been written yet.
+
+    close(self)
+        Wait, until all submitted images are written, and stop the thread.
+
+    @staticmethod
+    write_image(nps_2d, shape, filename, kernel, full_nps_function)
+        Shift, normalize and write 2d-NPS.
+    """
+
+    policies = ('off', 'first_roi_per_series', 'image_ensemble', 'all')
+
+    def __init__(self, folder, policy, kernel, full_nps_function, max_pending=64):
+
+        """
+        :param folder: string
+            (See attribute folder)
+        :param policy: string
+            (See attribute policy)
+        :param max_pending: int
+            (See attribute max_pending)
+        :param kernel: string
+            (See attribute kernel)
+        :param full_nps_function: callable
+            (See attribute full_nps_function)
+        """
+
+        if policy not in NPSImageWriter.policies:
+            raise ValueError('Unknown policy of 2d-NPS images: %s' % policy)
+        if max_pending < 1:
+            raise ValueError('At least one 2d-NPS image must be pending, not %s' % max_pending)
+        self.folder = folder
+        self.policy = policy
+        self.max_pending = max_pending
+        self.kernel = kernel
+        self.full_nps_function = full_nps_function
+        self.filenames = set()
+        self.executor = None
+        self.futures = deque()
+        self.num_written = 0
+        self.lock = threading.Lock()
+
+    def __getstate__(self):
+
+        """
+        Drop the lock and the thread, that are not passed to worker processes.
+
+        :return: dict
+            Attributes of the object.
+        """
+
+        state = self.__dict__.copy()
+        state.pop('lock')
+        state.update({'executor': None, 'futures': deque()})
+        return state
+
+    def __setstate__(self, state):
+
+        """
+        Restore attributes and create new lock in worker process.
+        The thread is created, when the first image is submitted.
+
+        :param state: dict
+            (See return value of method __getstate__)
+        :return: nothing
+        """
+
+        self.__dict__.update(state)
+        self.lock = threading.Lock()
+
+    def add_image_nps(self, nps_2d_list, roi_shapes, name, first_image):
+
+        """
+        Submit 2d-NPS of ROIs of one image according to policy.
+
+        :param nps_2d_list: list of ndarrays (2d)
+            2d-NPS of all ROIs of the image (as computed by
+            static method nps_spectrum_stack of class ProcessROI).
+        :param roi_shapes: list of tuples of two ints
+            Shapes of the ROIs.
+        :param name: string
+            Name identifying the image (e.g. folder, series and file name).
+        :param first_image: boolean
+            Whether the image is the first image of its series.
+        :return: nothing
+        """
+
+        if self.policy == 'off' or len(nps_2d_list) == 0:
+            return
+        if self.policy == 'first_roi_per_series':
+            if first_image:
+                self.submit(nps_2d=nps_2d_list[0], shape=roi_shapes[0], name=name + '__ROI_1')
+        elif self.policy == 'all':
+            for num_of_roi, (nps_2d, shape) in enumerate(zip(nps_2d_list, roi_shapes)):
+                self.submit(nps_2d=nps_2d, shape=shape, name=name + '__ROI_%d' % (num_of_roi + 1))
+        else:
+            # equally shaped ROIs are averaged
+            shape_buckets = {}
+            for nps_2d, shape in zip(nps_2d_list, roi_shapes):
+                shape_buckets.setdefault(tuple(shape), []).append(nps_2d)
+            for shape_of_bucket, bucket in shape_buckets.items():
+                suffix = '__ensemble' if len(shape_buckets) == 1 else '__ensemble_%dx%d' % shape_of_bucket
+                self.submit(nps_2d=np.mean(bucket, axis=0), shape=shape_of_bucket, name=name + suffix)
+
+    def submit(self, nps_2d, shape, name):
+
+        """
+        Submit one 2d-NPS to be written by the background thread.
+        If max_pending images are not written yet, wait for the oldest one.
+
+        :param nps_2d: ndarray (2d)
+            2d-NPS (not modified afterwards by the caller).
+        :param shape: tuple of two ints
+            Shape of the ROI.
+        :param name: string
+            Name identifying the 2d-NPS (See method unique_filename).
+        :return: nothing
+        """
+
+        with self.lock:
+            if self.executor is None:
+                self.executor = ThreadPoolExecutor(max_workers=1)
+            # written images are forgotten (the single thread writes them
+            # in the order of submission), errors of writing are raised
+            while len(self.futures) > 0 and self.futures[0].done():
+                self.futures.popleft().result()
+            # the queue is full: wait for the disk
+            while len(self.futures) >= self.max_pending:
+                self.futures.popleft().result()
+            self.futures.append(self.executor.submit(NPSImageWriter.write_image,
+                                                     nps_2d=nps_2d,
+                                                     shape=shape,
+                                                     filename=self.unique_filename(name=name),
+                                                     kernel=self.kernel,
+                                                     full_nps_function=self.full_nps_function))
+            self.num_written += 1
+
+    def unique_filename(self, name):
+
+        """
+        Get path to image, that has not been written yet by this writer
+        (called with acquired lock).
+
+        :param name: string
+            Name identifying the 2d-NPS.
+        :return: string
+            Path to jpg-file 'NPS_2D__<name>__.jpg' in folder
+            (a number is appended to name, if it is already used).
+        """
+
+        filename = self.folder + '/NPS_2D__' + name + '__.jpg'
+        num_of_copy = 1
+        while filename in self.filenames:
+            num_of_copy += 1
+            filename = self.folder + '/NPS_2D__' + name + '_%d__.jpg' % num_of_copy
+        self.filenames.add(filename)
+        return filename
+
+    def close(self):
+
+        """
+        Wait, until all submitted images are written, and stop the thread
+        (a new thread is created, if further images are submitted).
+
+        :return: nothing
+        """
+
+        with self.lock:
+            futures = list(self.futures)
+            self.futures.clear()
+            executor = self.executor
+            self.executor = None
+        for future in futures:
+            future.result()
+        if executor is not None:
+            executor.shutdown(wait=True)
+        print('%d 2d-NPS images have been written into %s' % (self.num_written, self.folder))
+
+    @staticmethod
+    def write_image(nps_2d, shape, filename, kernel, full_nps_function):
+
+        """
+        Shift 2d-NPS (zero frequency in the center), normalize it between
+        0 and 255 and write it as image.
+
+        :param nps_2d: ndarray (2d)
+            2d-NPS (See method add_image_nps).
+        :param shape: tuple of two ints
+            Shape of the ROI.
+        :param filename: string
+            Path to created image.
+        :param kernel: string
+            (See attribute kernel)
+        :param full_nps_function: callable
+            (See attribute full_nps_function)
+        :return: string
+            filename
+        """
+
+        full_nps = full_nps_function(nps_2d=nps_2d, shape=shape, kernel=kernel)
+        max_value = np.max(full_nps)
+        min_value = np.min(full_nps)
+        image_array = (full_nps - min_value) / (max_value - min_value) * 255
+        cv2.imwrite(filename=filename, img=image_array)
+        return filename
@@ -0,0 +1,156 @@
+from imports_nps import *
+from IntegralImage import IntegralImage
+from StartClass import StartClass
+
+
+class NoiseMap:
+
+    """
+    Maps of local noise (SD of sliding windows) over whole slices of a series.
+
+    For each slice mean and SD of square windows sliding with a stride
+    are computed from summed-area tables (See class IntegralImage),
+    so that the cost does not depend on the size of windows.
+    Maps of all slices of a series are saved in one npz-file,
+    optionally averaged along z, and the map averaged over all slices
+    is saved as image (outside of the dataset, so that it is not
+    discovered as input image by next runs).
+
+    SD of several slices are averaged as pooled SD
+    (square root of mean variance).
+
+    Attributes
+    ----------
+    window : int
+        Height and width of windows in pixels.
+
+    stride : int
+        Distance between neighbouring windows in pixels.
+
+    z_average : int
+        Number of adjacent slices averaged along z (moving average):
+        1 - maps are not averaged; 0 - all slices of a series are averaged.
+
+    Methods
+    -------
+    compute(self, pixel_image)
+        Compute maps of mean and SD of one slice.
+
+    average_along_z(self, sd_stack)
+        Average SD maps of adjacent slices.
+
+    save(self, slice_maps, image_files, filename, preview_filename=None)
+        Save maps of all slices of a series.
+    """
+
+    def __init__(self, window=32, stride=8, z_average=1):
+
+        """
+        :param window: int
+            (See attribute window)
+        :param stride: int
+            (See attribute stride)
+        :param z_average: int
+            (See attribute z_average)
+        """
+
+        if window < 1 or stride < 1 or z_average < 0:
+            raise ValueError('Invalid noise map settings: window %s, stride %s, z_average %s' %
+                             (window, stride, z_average))
+        self.window = window
+        self.stride = stride
+        self.z_average = z_average
+
+    def compute(self, pixel_image):
+
+        """
+        Compute maps of mean and SD of sliding windows of one slice.
+        Rescale Slope and Intercept of the image are applied.
+
+        :param pixel_image: PixelImage object
+            Whole slice (See class PixelImage).
+        :return: dict
+            (See return value of method window_maps of class IntegralImage)
+        """
+
+        integral_image = IntegralImage(pixels=pixel_image.pixels, row_offset=pixel_image.row_offset)
+        maps = integral_image.window_maps(window=self.window, stride=self.stride)
+        # rescaling is linear
+        maps['mean'] = maps['mean'] * pixel_image.rescale_slope + pixel_image.rescale_intercept
+        maps['SD'] = maps['SD'] * abs(pixel_image.rescale_slope)
+        return maps
+
+    def average_along_z(self, sd_stack):
+
+        """
+        Average SD maps of z_average adjacent slices (pooled SD).
+
+        :param sd_stack: ndarray (3d)
+            SD maps of all slices (first axis: slices in file order).
+        :return: ndarray (3d)
+            Averaged maps: number of slices - z_average + 1 maps
+            (one map, if all slices are averaged or there are less slices).
+        """
+
+        num_of_slices = len(sd_stack)
+        num_averaged = num_of_slices if self.z_average == 0 else min(self.z_average, num_of_slices)
+        # moving sums of variances
+        variance_sums = np.cumsum(np.concatenate([np.zeros((1,) + sd_stack.shape[1:]),
+                                                  sd_stack ** 2]), axis=0)
+        moving_sums = variance_sums[num_averaged:] - variance_sums[:-num_averaged]
+        return np.sqrt(moving_sums / num_averaged)
+
+    def save(self, slice_maps, image_files, filename, preview_filename=None):
+
+        """
+        Save maps of all slices of a series into npz-file
+        and the SD map averaged over all slices as image.
+
+        :param slice_maps: list of dicts
+            Maps of slices in file order (See return value of method compute).
+        :param image_files: list of strings
+            Paths to images of slices in file order.
+        :param filename: string
+            Absolute path to created npz-file without extension.
+        :param preview_filename: string or None
+            Path to created image of the averaged SD map.
+            None (by default): the image is not created.
+        :return: list of strings
+            Paths to created files.
+        """
+
+        print('save of noise map is being executed')
+
+        settings = {'window': self.window,
+                    'stride': self.stride,
+                    'z_average': self.z_average,
+                    'image_files': np.array(image_files)}
+        created_files = [filename + '.npz']
+        if len({np.shape(maps['SD']) for maps in slice_maps}) == 1 and np.size(slice_maps[0]['SD']) > 0:
+            sd_stack = np.stack([maps['SD'] for maps in slice_maps])
+            mean_stack = np.stack([maps['mean'] for maps in slice_maps])
+            arrays = {'SD': sd_stack,
+                      'mean': mean_stack,
+                      'row_starts': slice_maps[0]['row_starts'],
+                      'column_starts': slice_maps[0]['column_starts']}
+            if self.z_average != 1:
+                arrays.update({'SD_z_average': self.average_along_z(sd_stack=sd_stack)})
+            if preview_filename is not None:
+                # map of the whole series
+                StartClass.create_image_from_2d_array(arr_2d=np.sqrt(np.mean(sd_stack ** 2, axis=0)),
+                                                      filename=preview_filename)
+                created_files.append(preview_filename)
+        else:
+            # slices of different size: maps are stored for each slice
+            print('Slices have different sizes, noise maps are not averaged')
+            arrays = {}
+            for num_of_slice, maps in enumerate(slice_maps):
+                arrays.update({'SD_%d' % num_of_slice: maps['SD'],
+                               'mean_%d' % num_of_slice: maps['mean'],
+                               'row_starts_%d' % num_of_slice: maps['row_starts'],
+                               'column_starts_%d' % num_of_slice: maps['column_starts']})
+        np.savez_compressed(filename + '.npz', **settings, **arrays)
+
+        print('save of noise map is done')
+
+        return created_files
@@ -0,0 +1,146 @@
+from imports_nps import *
+
+
+class PartialPixelReader:
+
+    """
+    Reader of row bands of uncompressed dicom-images.
+
+    The position of Pixel Data is taken for each image from the reading
+    of its header, that stops before Pixel Data (See method create_base_array
+    of class StartClass), so that headers of different length within a series
+    (UIDs, DS strings, comments etc.) are supported without further reads.
+    The element header of Pixel Data at that position is checked against
+    the image format of the header.
+    Only the requested rows are read from the file, the rest of the frame
+    is neither read nor decoded. Compressed, multi-frame, colored or
+    not 16-bit images are not supported and have to be decoded completely
+    (method read_rows returns None).
+
+    Attributes
+    ----------
+    supported_transfer_syntaxes : tuple of strings
+        UIDs of uncompressed little endian transfer syntaxes.
+
+    header_keywords : tuple of strings
+        Keywords of DICOM elements describing the format of Pixel Data,
+        that have to be read with the header.
+
+    Methods
+    -------
+    @staticmethod
+    read_rows(image_file, dataset_dicom, pixel_data_position, row_start, row_end)
+        Read rows of image.
+
+    @staticmethod
+    find_layout(dataset_dicom)
+        Get format of Pixel Data of image from its header.
+
+    @staticmethod
+    convert_band(band, layout)
+        Convert read rows of Pixel Data.
+    """
+
+    # uncompressed transfer syntaxes with little endian byte order
+    supported_transfer_syntaxes = ('1.2.840.10008.1.2', '1.2.840.10008.1.2.1')
+    header_keywords = ('Rows', 'Columns', 'BitsAllocated', 'BitsStored', 'HighBit', 'PixelRepresentation',
+                       'SamplesPerPixel', 'NumberOfFrames')
+
+    @staticmethod
+    def read_rows(image_file, dataset_dicom, pixel_data_position, row_start, row_end):
+
+        """
+        Read rows row_start to row_end (excluded) of image.
+
+        :param image_file: string
+            Absolute path to dicom-file.
+        :param dataset_dicom: Dataset object
+            Header of image_file containing at least the elements of header_keywords
+            and the file meta information.
+        :param pixel_data_position: int
+            Position of Pixel Data element in image_file (position of the file
+            after reading the header with stop_before_pixels).
+        :param row_start: int
+            First row to be read.
+        :param row_end: int
+            Row after the last row to be read (clipped to number of rows).
+        :return: ndarray (2d, uint16 or int16) or None
+            Pixel values of the rows in native data type (as method read_image
+            of class StartClass would return them); None, if the image has to be
+            decoded completely.
+        """
+
+        layout = PartialPixelReader.find_layout(dataset_dicom=dataset_dicom)
+        if layout is None:
+            return None
+        row_end = min(row_end, layout['rows'])
+        num_rows = max(row_end - row_start, 0)
+        with open(image_file, 'rb') as file_to_read:
+            file_to_read.seek(pixel_data_position)
+            element_header = file_to_read.read(layout['header_length'])
+            # tag of Pixel Data and length of uncompressed frame
+            if element_header[:4] != b'\xe0\x7f\x10\x00' or \
+                    int.from_bytes(element_header[-4:], 'little') != layout['rows'] * layout['columns'] * 2:
+                return None
+            file_to_read.seek(row_start * layout['columns'] * 2, os.SEEK_CUR)
+            band = np.fromfile(file_to_read, dtype=layout['dtype'], count=num_rows * layout['columns'])
+        # Pixel Data has to be complete
+        if band.size != num_rows * layout['columns']:
+            return None
+        return PartialPixelReader.convert_band(band=band.reshape(num_rows, layout['columns']), layout=layout)
+
+    @staticmethod
+    def find_layout(dataset_dicom):
+
+        """
+        Get format of Pixel Data of image from its header.
+
+        :param dataset_dicom: Dataset object
+            (See parameter dataset_dicom of method read_rows)
+        :return: dict or None
+            Keys : 'header_length' - length of tag, VR and length of Pixel Data element,
+                   'rows', 'columns' - size of the image,
+                   'dtype' - data type of stored pixel values,
+                   'bits_stored' - number of used bits of pixel values;
+            None, if the image is not supported.
+        """
+
+        try:
+            transfer_syntax = dataset_dicom.file_meta.TransferSyntaxUID
+            if transfer_syntax not in PartialPixelReader.supported_transfer_syntaxes or \
+                    dataset_dicom.get('SamplesPerPixel', 1) != 1 or \
+                    int(dataset_dicom.get('NumberOfFrames', 1) or 1) != 1 or \
+                    dataset_dicom.BitsAllocated != 16 or \
+                    dataset_dicom.HighBit != dataset_dicom.BitsStored - 1:
+                return None
+            # header of Pixel Data element: tag (4 bytes), VR and reserved bytes
+            # (4 bytes, only explicit VR), length (4 bytes)
+            return {'header_length': 8 if transfer_syntax == '1.2.840.10008.1.2' else 12,
+                    'rows': int(dataset_dicom.Rows),
+                    'columns': int(dataset_dicom.Columns),
+                    'dtype': '<i2' if dataset_dicom.PixelRepresentation == 1 else '<u2',
+                    'bits_stored': int(dataset_dicom.BitsStored)}
+        except (AttributeError, TypeError, ValueError):
+            return None
+
+    @staticmethod
+    def convert_band(band, layout):
+
+        """
+        Convert read rows of Pixel Data to native byte order
+        (unused bits are masked, signed values are sign-extended, as pydicom does).
+
+        :param band: ndarray (2d, '<i2' or '<u2')
+            Read rows of Pixel Data.
+        :param layout: dict
+            (See return value of static method find_layout)
+        :return: ndarray (2d, uint16 or int16)
+        """
+
+        num_unused_bits = 16 - layout['bits_stored']
+        if num_unused_bits > 0:
+            if layout['dtype'] == '<i2':
+                band = (band << num_unused_bits) >> num_unused_bits
+            else:
+                band = band & ((1 << layout['bits_stored']) - 1)
+        return band.astype(band.dtype.newbyteorder('='), copy=False)
@@ -0,0 +1,92 @@
+from imports_nps import *
+
+
+class PixelImage:
+
+    """
+    Decoded image in its native data type.
+
+    Pixel values are kept as decoded (e.g. uint16 values of DR- or
+    mammography images above 32767 are not wrapped by a conversion to int16)
+    and are not copied. Rescale Slope and Intercept are applied lazily,
+    only to the pixels of requested ROI windows.
+    The image may contain only a band of rows (See class PartialPixelReader);
+    ROI coordinates are always coordinates of the whole image.
+
+    Attributes
+    ----------
+    pixels : ndarray (2d)
+        Read-only pixel values in native data type.
+
+    row_offset : int
+        Index of the first row of pixels in the whole image.
+
+    rescale_slope : float
+        Rescale Slope applied to ROI windows (1.0: not rescaled).
+
+    rescale_intercept : float
+        Rescale Intercept applied to ROI windows (0.0: not rescaled).
+
+    Methods
+    -------
+    window(self, roi)
+        Get pixel values of ROI.
+
+    @staticmethod
+    rescale_parameters(dataset_dicom)
+        Get Rescale Slope and Intercept of dicom.
+    """
+
+    def __init__(self, pixels, row_offset=0, rescale_slope=1.0, rescale_intercept=0.0):
+
+        """
+        :param pixels: ndarray (2d)
+            Read-only pixel values in native data type.
+        :param row_offset: int
+            Index of the first row of pixels in the whole image.
+        :param rescale_slope: float
+            Rescale Slope applied to ROI windows.
+        :param rescale_intercept: float
+            Rescale Intercept applied to ROI windows.
+        """
+
+        self.pixels = pixels
+        self.row_offset = row_offset
+        self.rescale_slope = rescale_slope
+        self.rescale_intercept = rescale_intercept
+
+    def window(self, roi):
+
+        """
+        Get pixel values of ROI.
+
+        :param roi: tuple of four ints
+            Coordinates of ROI in the whole image: x and y coordinates
+            of upper left corner and of lower right corner.
+        :return: ndarray (2d)
+            View of pixels in native data type or, if the image is rescaled,
+            rescaled pixel values of the ROI (float64).
+        """
+
+        window = self.pixels[roi[1] - self.row_offset:roi[3] - self.row_offset, roi[0]:roi[2]]
+        if self.rescale_slope != 1.0 or self.rescale_intercept != 0.0:
+            # only pixels of the ROI are rescaled
+            window = window * self.rescale_slope + self.rescale_intercept
+        return window
+
+    @staticmethod
+    def rescale_parameters(dataset_dicom):
+
+        """
+        Get Rescale Slope and Intercept of dicom.
+
+        :param dataset_dicom: Dataset object or string
+            Header of dicom ('' for other image files).
+        :return: tuple of two floats
+            Rescale Slope and Intercept (1.0 and 0.0, if not specified).
+        """
+
+        try:
+            return float(dataset_dicom.RescaleSlope), float(dataset_dicom.RescaleIntercept)
+        except (AttributeError, TypeError, ValueError):
+            return 1.0, 0.0
@@ -0,0 +1,171 @@
+from imports_nps import *
+from GeometryCache import GeometryCache
+
+
+class PolynomialDetrender:
+
+    """
+    Removal of 2d polynomial background of ROIs by linear least squares.
+
+    The background is modelled as sum of i ** p * j ** q (i - row, j - column)
+    for all p, q up to the order (the same model as methods prepare_f_1 and
+    prepare_f_2 of class ProcessROI): bilinear for order 1, biquadratic for order 2.
+    The model is linear in its coefficients, so that the least squares fit
+    of an ROI is the projection of its pixel values onto the polynomial basis.
+    The pseudo-inverse of the basis (Vandermonde matrix) is computed once
+    per shape of ROIs and cached (See class GeometryCache); all equally
+    shaped ROIs are fitted by two matrix products.
+
+    Coordinates are scaled to [-1, 1], so that the basis is well conditioned
+    (the fitted background does not depend on the scaling).
+
+    Attributes
+    ----------
+    order : int
+        Order of polynomial in each coordinate (1 or 2).
+
+    exponents : list of tuples of two ints
+        Exponents (p, q) of rows and columns of basis functions.
+
+    cache : GeometryCache object
+        Registry of bases and their pseudo-inverses
+        (See return value of method get_projector).
+
+    Methods
+    -------
+    get_projector(self, shape)
+        Get basis and its pseudo-inverse for shape of ROIs.
+
+    fit_stack(self, stack)
+        Fit background of equally shaped ROIs.
+
+    detrend_stack(self, stack)
+        Subtract fitted background from equally shaped ROIs.
+
+    detrend(self, array)
+        Subtract fitted background from one ROI.
+
+    @staticmethod
+    vandermonde(shape, exponents)
+        Build basis of polynomial for shape of ROIs.
+
+    @staticmethod
+    build_projector(shape, exponents)
+        Build basis and its pseudo-inverse for shape of ROIs.
+    """
+
+    def __init__(self, order, cache=None):
+
+        """
+        :param order: int
+            (See attribute order)
+        :param cache: GeometryCache object or None
+            (See attribute cache) None (by default): a new registry is created.
+        """
+
+        if order not in (1, 2):
+            raise ValueError('Order of 2d fit must be 1 or 2, not %s' % order)
+        self.order = order
+        self.exponents = list(itertools.product(range(order + 1), range(order + 1)))
+        self.cache = GeometryCache() if cache is None else cache
+
+    @staticmethod
+    def vandermonde(shape, exponents):
+
+        """
+        Build basis of polynomial for shape of ROIs.
+
+        :param shape: tuple of two ints
+            Number of rows and columns of ROIs.
+        :param exponents: list of tuples of two ints
+            (See attribute exponents)
+        :return: ndarray (2d)
+            Matrix with rows * columns rows (pixels in C order)
+            and one column for each basis function.
+        """
+
+        # coordinates scaled to [-1, 1]
+        i = np.linspace(-1, 1, num=shape[0]) if shape[0] > 1 else np.zeros(shape[0])
+        j = np.linspace(-1, 1, num=shape[1]) if shape[1] > 1 else np.zeros(shape[1])
+        i, j = np.meshgrid(i, j, indexing='ij')
+        return np.stack([np.ravel(i ** p * j ** q) for p, q in exponents], axis=1)
+
+    def get_projector(self, shape):
+
+        """
+        Get basis and its pseudo-inverse for shape of ROIs (computed once per shape).
+
+        :param shape: tuple of two ints
+            Number of rows and columns of ROIs.
+        :return: dict
+            Keys : 'basis' - ndarray (2d) of shape (pixels, basis functions)
+                       (See static method vandermonde),
+                   'pinv' - its pseudo-inverse of shape (basis functions, pixels).
+        """
+
+        shape = tuple(int(size) for size in shape)
+        return self.cache.get(key=('projector', self.order) + shape,
+                              build_function=fut.partial(PolynomialDetrender.build_projector,
+                                                         shape=shape, exponents=self.exponents))
+
+    @staticmethod
+    def build_projector(shape, exponents):
+
+        """
+        Build basis and its pseudo-inverse for shape of ROIs.
+
+        :param shape: tuple of two ints
+            Number of rows and columns of ROIs.
+        :param exponents: list of tuples of two ints
+            (See attribute exponents)
+        :return: dict
+            (See return value of method get_projector)
+        """
+
+        basis = PolynomialDetrender.vandermonde(shape=shape, exponents=exponents)
+        return {'basis': basis,
+                'pinv': np.linalg.pinv(basis)}
+
+    def fit_stack(self, stack):
+
+        """
+        Fit background of equally shaped ROIs by least squares.
+
+        :param stack: ndarray (3d)
+            ROIs of shape (number of ROIs, rows, columns).
+        :return: ndarray (3d, float64)
+            Fitted backgrounds of ROIs (same shape as stack).
+        """
+
+        projector = self.get_projector(shape=np.shape(stack)[1:])
+        # pixels of each ROI as one row
+        values = np.reshape(stack, (len(stack), -1)).astype(np.float64, copy=False)
+        # coefficients of all ROIs at once
+        coefficients = values @ projector['pinv'].T
+        return (coefficients @ projector['basis'].T).reshape(np.shape(stack))
+
+    def detrend_stack(self, stack):
+
+        """
+        Subtract fitted background from equally shaped ROIs.
+
+        :param stack: ndarray (3d)
+            ROIs of shape (number of ROIs, rows, columns).
+        :return: ndarray (3d, float64)
+            Detrended ROIs.
+        """
+
+        return stack - self.fit_stack(stack=stack)
+
+    def detrend(self, array):
+
+        """
+        Subtract fitted background from one ROI.
+
+        :param array: ndarray (2d)
+            Pixel array of ROI.
+        :return: ndarray (2d, float64)
+            Detrended ROI.
+        """
+
+        return self.detrend_stack(stack=array[np.newaxis])[0]
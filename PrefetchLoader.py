@@ -0,0 +1,141 @@
+from imports_nps import *
+
+
+class PrefetchLoader:
+
+    """
+    Iterator over loaded images, that reads the next images in background.
+
+    While the current image is processed, up to depth following images
+    are loaded by a pool of threads. Images are yielded in the order of keys.
+    The time the caller waits for images, that are not loaded yet,
+    is measured as stall time (time of processing spent waiting on I/O).
+
+    Attributes
+    ----------
+    load_function : callable
+        Function loading one image; called with one key.
+
+    keys : list
+        Keys of images (e.g. paths to image files) in the order to be yielded.
+
+    depth : int
+        Number of images loaded ahead (read-ahead depth, at least 1).
+
+    executor : ThreadPoolExecutor
+        Threads loading images.
+
+    futures : deque of Future objects
+        Images being loaded in the order of keys.
+
+    next_index : int
+        Index of the next key to be loaded.
+
+    stall_time : float
+        Total time in seconds spent waiting for images.
+
+    num_stalls : int
+        Number of images, that were not loaded yet when requested.
+
+    Methods
+    -------
+    fill(self)
+        Start loading of next images up to read-ahead depth.
+
+    close(self)
+        Cancel pending loads and stop threads.
+
+    statistics(self)
+        Get stall time and numbers of loaded and waited images.
+    """
+
+    def __init__(self, load_function, keys, depth, num_threads=1):
+
+        """
+        :param load_function: callable
+            Function loading one image; called with one key.
+        :param keys: iterable
+            Keys of images in the order to be yielded.
+        :param depth: int
+            Number of images loaded ahead.
+        :param num_threads: int
+            Number of threads loading images.
+        """
+
+        self.load_function = load_function
+        self.keys = list(keys)
+        self.depth = max(depth, 1)
+        self.executor = ThreadPoolExecutor(max_workers=max(num_threads, 1))
+        self.futures = deque()
+        self.next_index = 0
+        self.stall_time = 0.0
+        self.num_stalls = 0
+        self.fill()
+
+    def __iter__(self):
+        return self
+
+    def __next__(self):
+
+        """
+        Get next loaded image, wait for it if necessary.
+
+        :return: any
+            Return value of load_function for the next key.
+        """
+
+        self.fill()
+        if len(self.futures) == 0:
+            raise StopIteration
+        future = self.futures.popleft()
+        if not future.done():
+            # processing waits on I/O
+            start_time = time.perf_counter()
+            loaded_image = future.result()
+            self.stall_time += time.perf_counter() - start_time
+            self.num_stalls += 1
+        else:
+            loaded_image = future.result()
+        # next images are loaded while the current image is processed
+        self.fill()
+        return loaded_image
+
+    def fill(self):
+
+        """
+        Start loading of next images, until depth images are loaded ahead.
+
+        :return: nothing
+        """
+
+        while len(self.futures) < self.depth and self.next_index < len(self.keys):
+            self.futures.append(self.executor.submit(self.load_function, self.keys[self.next_index]))
+            self.next_index += 1
+
+    def close(self):
+
+        """
+        Cancel pending loads and stop threads (e.g. if processing failed).
+
+        :return: nothing
+        """
+
+        for future in self.futures:
+            future.cancel()
+        self.futures.clear()
+        self.executor.shutdown(wait=True)
+
+    def statistics(self):
+
+        """
+        Get stall time and numbers of loaded and waited images.
+
+        :return: dict
+            Keys : 'stall_time' - time in seconds spent waiting for images,
+                   'stalls' - number of images, that were waited for,
+                   'images' - number of images started to be loaded.
+        """
+
+        return {'stall_time': self.stall_time,
+                'stalls': self.num_stalls,
+                'images': self.next_index}
@@ -1,4 +1,14 @@
 from imports_nps import *
+from config_nps_qt6 import init_dict
+from StartClass import StartClass
+from PrefetchLoader import PrefetchLoader
+from IntegralImage import IntegralImage
+from NoiseMap import NoiseMap
+from PolynomialDetrender import PolynomialDetrender
+from NPSImageWriter import NPSImageWriter
+from NPSAccumulator import NPSAccumulator
+from RunningStatistics import RunningStatistics
+from GeometryCache import GeometryCache
 
 
 class ProcessROI:
@@ -29,13 +39,14 @@ class ProcessROI:
     metadata_columns : list of strings
         List of Excel letetrs for columns containing metadata info in
         workbook_summary.
-    all_roi_dict : dict of dict of lists of tuples
+    all_roi_dict : ROITemplate object
         (See attribute all_roi_dict of class GUI)
     sorted_all_roi_dict : dict of dicts
         Dict with same structure as attribute filedict of class StartClass.
         The lists of files in series folder are transformed into dictionaries:
         Keys : absolute path to image in current series folder
-        Values : list of tuples with ROIs' diagonal coordinates:
+        Values : integer arrays (one row for each ROI) shared by all images
+            with the same ROIs (See class ROITemplate); ROIs' diagonal coordinates:
             x0 - x coordinate of left upper corner
             y0 - y coordinate of left upper corner
             x1 - x coordinate of right lower corner
@@ -84,6 +95,11 @@ class ProcessROI:
         For current series folder.
         'values' : NPS list averaged among all images in current series folder.
         'frequencies' : respective frequencies.
+    series_statistics : dict of RunningStatistics objects
+        For current series folder, updated as each image is processed.
+        Keys : 'mean_HU', 'SD' (means of ROIs of each image),
+               'AUC', 'integral_of_2d_NPS' (values of all ROIs),
+               'nps' (NPS averaged among ROIs of each image).
     peak_info_dict_ave : dict
         Peak information of NPS list averaged among images in current series folder.
         Keys : 'mean_value' (peak NPS value)
@@ -92,6 +108,9 @@ class ProcessROI:
                            sinks under 60% of peak NPS value when moving to left)
                'right_dev' (freq distance between peak freq and freq, at which NPS
                             sinks under 60% of peak NPS value when moving to right)
+    geometry_cache : GeometryCache object
+        Registry of radius bins, frequency axes, detrending bases and
+        resampling weights of ROI geometries (shared by all objects of a process).
 
 
     Methods
@@ -99,11 +118,17 @@ class ProcessROI:
 
     """
 
+    geometry_cache = GeometryCache(max_entries=256)
+
     def __init__(self, *, obj_roi, obj_arr, fit_order,
                  crop_perc, useFitting, im_height_in_mm,
                  im_width_in_mm, extensions, trunc_percentage,
                  useCentralCropping, start_freq_range, end_freq_range, step,
-                 useTruncation, multipleFiles, pixel_size_in_mm, first_data_set):
+                 useTruncation, multipleFiles, pixel_size_in_mm, first_data_set,
+                 useBatchedFFT=True, nps_kernel='fft2', num_series_workers=1, num_image_threads=1,
+                 prefetch_depth=2, num_prefetch_threads=2,
+                 useNoiseMap=False, noise_map_window=32, noise_map_stride=8, noise_map_z_average=1,
+                 nps_image_policy='image_ensemble', nps_image_queue_size=64, useEnsembleNPS=False):
 
         """
         Start initialiazation and sorting of all_roi_dict.
@@ -127,7 +152,7 @@ class ProcessROI:
         :param useFitting: boolean
             Choose method of background removal.
             True: 2d fitting is used (order is defined by attribute
-                fit_order);
+                fit_order; see class PolynomialDetrender);
             False: mean value subtraction is used.
         :param im_height_in_mm: float or string 'undefined'
             Height of current dcm-image in mm.
@@ -164,6 +189,59 @@ class ProcessROI:
         :param first_data_set: boolean
             Specify folder structure of dataset.
             Near description is to find in manual.
+        :param useBatchedFFT: boolean
+            True: all equally shaped ROIs of an image are stacked and
+                their NPS is computed at once (see method compute_nps_batch);
+            False: NPS is computed for each ROI separately (see method compute_nps).
+            Specified in init_dict.
+        :param nps_kernel: string
+            FFT used to compute 2d-NPS (see static method nps_spectrum_stack):
+            'fft2' - full complex spectrum;
+            'rfft2' - half-plane spectrum of real-valued pixel arrays.
+            Specified in init_dict.
+        :param num_series_workers: int
+            Number of worker processes, the series are processed by in parallel.
+            1: series are processed one after another by this process.
+            Specified in init_dict.
+        :param num_image_threads: int
+            Number of threads, the images of one series are processed by in parallel.
+            1: images are processed one after another.
+            Specified in init_dict.
+        :param prefetch_depth: int
+            Number of images read in background ahead of the processed image,
+            if images are processed one after another (see class PrefetchLoader).
+            0: images are read only when they are processed.
+            Specified in init_dict.
+        :param num_prefetch_threads: int
+            Number of threads reading images ahead. Specified in init_dict.
+        :param useNoiseMap: boolean
+            Whether maps of local noise (SD of sliding windows) over whole slices
+            are saved for each series into folder 'Results_<folder>' (see class NoiseMap),
+            images of maps averaged over the series into folder '01.2d_NPS_images'.
+            Specified in init_dict.
+        :param noise_map_window: int
+            Height and width of sliding windows in pixels. Specified in init_dict.
+        :param noise_map_stride: int
+            Distance between neighbouring windows in pixels. Specified in init_dict.
+        :param noise_map_z_average: int
+            Number of adjacent slices, whose noise maps are averaged
+            (1: not averaged, 0: all slices of series). Specified in init_dict.
+        :param nps_image_policy: string
+            Which 2d-NPS images are written into folder '01.2d_NPS_images'
+            in background (see class NPSImageWriter):
+            'off', 'first_roi_per_series', 'image_ensemble' or 'all'.
+            Specified in init_dict.
+        :param nps_image_queue_size: int
+            Maximal number of 2d-NPS waiting to be written as images; computation
+            waits, if the disk is slower (see class NPSImageWriter). Specified in init_dict.
+        :param useEnsembleNPS: boolean
+            True: 2d-NPS of all ROIs of a series are summed while images are processed
+                (see class NPSAccumulator) and the NPS of the series is the radial
+                mean of the ensemble 2d-NPS (see method reduce_ensemble_nps);
+                only this NPS is written into the xlsx-file of the series.
+            False: 1d-NPS of each ROI is resampled, averaged among ROIs of each
+                image and among images (see method average_roi_nps and attribute series_statistics).
+            Specified in init_dict.
         """
 
         print('Constructor of class ProcessROI is being executed')
@@ -218,9 +296,41 @@ class ProcessROI:
         self.files_to_remove = []
         self.pixel_size_in_mm = pixel_size_in_mm
         self.multipleFiles = multipleFiles
+        # whether NPS of equally shaped ROIs is computed in one batch
+        self.useBatchedFFT = useBatchedFFT
+        # FFT used to compute 2d-NPS
+        if nps_kernel not in ('fft2', 'rfft2'):
+            raise ValueError('Unknown NPS kernel: %s' % nps_kernel)
+        self.nps_kernel = nps_kernel
+        # policy of 2d-NPS images
+        self.nps_image_policy = nps_image_policy
+        self.nps_image_queue_size = nps_image_queue_size
+        # helpers holding locks and threads: least squares fit of background
+        # (pseudo-inverses are cached per ROI shape) and writer of 2d-NPS images
+        self.detrender = None
+        self.nps_image_writer = None
+        self.create_thread_helpers()
+        # whether 2d-NPS are accumulated per series
+        self.useEnsembleNPS = useEnsembleNPS
+        # sums of 2d-NPS of the current series (created for each series)
+        self.nps_accumulator = None
+        # running statistics of the current series
+        self.series_statistics = {}
+        # number of worker processes for series
+        self.num_series_workers = num_series_workers
+        # number of threads for images of one series
+        self.num_image_threads = num_image_threads
+        # read-ahead of images
+        self.prefetch_depth = prefetch_depth
+        self.num_prefetch_threads = num_prefetch_threads
+        # maps of local noise over whole slices
+        if useNoiseMap:
+            self.noise_map = NoiseMap(window=noise_map_window, stride=noise_map_stride,
+                                      z_average=noise_map_z_average)
+        else:
+            self.noise_map = None
         # declaring attributes, that are specified later
         self.nps = []
-        self.new_dict = {}
         # type of data set
         self.first_data_set = first_data_set
         self.object_roi = obj_roi
@@ -317,91 +427,260 @@ class ProcessROI:
 
         Calculate NPS by iterating over pixel array of each ROI.
         Create xlsx-files with results.
+
+        If attribute num_series_workers is larger than 1, the series are
+        processed in parallel by a pool of worker processes (see method run_series).
+        Their results are returned to this process and written into workbook_averaged
+        and workbook_summary in the same order as in serial mode.
         :return: nothing
         """
 
-        ave_folder = GUI.create_aux_folder(cur_fold=os.getcwd(), folder_name='Only_averaged_sheets')
-
-        # iterate over keys of the passed dict, i.e. folder paths
-        for self.num_folder, self.folder in enumerate(self.sorted_all_roi_dict):
-            # log the process
-            print('\n\nFolder %s is been processed: %d of %d\n\n' % (os.path.basename(self.folder), self.num_folder + 1,
-                                                                     len(self.sorted_all_roi_dict)))
-
-            if self.first_data_set:
-                self.folder_part = os.path.basename(self.folder)
-            else:
-                self.folder_part = ProcessROI.drop_part_of_name(
-                    name=os.path.basename(self.folder),
-                    pattern_of_dropped_part=r' \- \d+',
-                    dropped_from_end=True)
-
-            # create workbook for only averaged sheets
-            name_averaged_workbook = ave_folder + '/' + self.folder_part + '.xlsx'
-            self.workbook_averaged = xlsx.Workbook(name_averaged_workbook)
-
-            # iterate over series
-            for self.num_series, series in enumerate(self.sorted_all_roi_dict[self.folder]):
-
-                global start_time_series
-                start_time_series = time.time()
-
-                if self.first_data_set:
-                    self.serie_part = serie
-                    self.folder_part = os.path.basename(self.folder)
-                else:
-                    self.serie_part = ProcessROI.drop_part_of_name(
-                        name=series,
-                        pattern_of_dropped_part=r'\w*\d*_',
-                        dropped_from_end=False)[1:]
-                    self.folder_part = ProcessROI.drop_part_of_name(
-                        name=os.path.basename(self.folder),
-                        pattern_of_dropped_part=r' \- \d+',
-                        dropped_from_end=True)
-                # log the process
-                print('\nseries %s: %d of %d\nFolder %d of %d\n' % (
-                series, self.num_series + 1, len(self.sorted_all_roi_dict[self.folder]),
-                self.num_folder + 1,
-                len(self.sorted_all_roi_dict)
-                ))
-                # if len(series) > 3:
-                #     print('This is not a folder with images. Skip')
-                #     continue
-                # create folder Results
-                # GUI.create_aux_folder(cur_fold=folder, folder_name='Results')
+        ave_folder = os.getcwd() + '/Only_averaged_sheets'
+        os.makedirs(ave_folder, exist_ok=True)
+
+        # all series to be processed in the order of sorted_all_roi_dict
+        series_jobs = self.create_series_jobs()
+        # total time spent waiting for images read ahead
+        prefetch_stall_time = 0.0
+
+        if self.num_series_workers > 1:
+            # each worker process gets a copy of this object once
+            pool = mp.Pool(processes=self.num_series_workers,
+                           initializer=ProcessROI.init_series_worker,
+                           initargs=(self,))
+            # results are yielded in the order of series_jobs
+            series_results = pool.imap(ProcessROI.run_series_in_worker, series_jobs)
+        else:
+            pool = None
+            series_results = map(self.run_series, series_jobs)
 
-                GUI.create_aux_folder(cur_fold=self.folder, folder_name='Results_%s' % self.folder_part)
+        try:
+            for num_job, (series_job, series_result) in enumerate(zip(series_jobs, series_results)):
+                self.num_folder = series_job['num_folder']
+                self.folder = series_job['folder']
+                self.num_series = series_job['num_series']
+                self.folder_part, self.serie_part = self.series_name_parts(folder=self.folder,
+                                                                           series=series_job['series'])
+                # first series of the study
+                if self.num_series == 0:
+                    # log the process
+                    print('\n\nFolder %s has been processed: %d of %d\n\n' % (os.path.basename(self.folder),
+                                                                             self.num_folder + 1,
+                                                                             len(self.sorted_all_roi_dict)))
+                    # create workbook for only averaged sheets
+                    name_averaged_workbook = ave_folder + '/' + self.folder_part + '.xlsx'
+                    self.workbook_averaged = xlsx.Workbook(name_averaged_workbook)
 
                 # create worksheet to write averaged data into
                 self.worksheet_averaged = self.workbook_averaged.add_worksheet(name=self.serie_part)
+                self.write_averaged_results(series_result=series_result)
+                if series_result['prefetch_statistics'] is not None:
+                    prefetch_stall_time += series_result['prefetch_statistics']['stall_time']
 
-                name_for_xlsx = self.folder \
-                                + '/Results_%s/' % (self.folder_part) \
-                                + self.folder_part + \
-                                self.serie_part + '.xlsx'
-                # open new workbook in Excel
-                self.workbook_series = xlsx.Workbook(name_for_xlsx)
-                self.execute_nps_comp(all_roi_dict=self.sorted_all_roi_dict[self.folder][series])
-                print('++++++++++\n'
-                      'execution time per series: %f seconds\n' % (time.time() - start_time_series))
-                # self.execute_nps_comp(all_roi_dict=self.sorted_all_roi_dict[self.folder][series])
-                num_remaining_folders = len(self.sorted_all_roi_dict) - self.num_folder
-                num_rem_series_in_folder = len(self.sorted_all_roi_dict[self.folder]) - self.num_series - 1
-                time_for_one_series = time.time() - start_time_series
-                remaining_time = ((num_remaining_folders - 1) * len(self.sorted_all_roi_dict[self.folder]) +
-                                  num_rem_series_in_folder) * time_for_one_series
+                time_for_one_series = series_result['execution_time']
+                remaining_time = (len(series_jobs) - num_job - 1) * time_for_one_series / self.num_series_workers
                 remaining_hours = remaining_time // 3600
                 remaining_minutes = (remaining_time - remaining_hours * 3600) // 60
                 remaining_seconds = remaining_time - remaining_minutes * 60
                 print(
                     '%d hours, %d minutes, %f seconds remain' % (remaining_hours, remaining_minutes, remaining_seconds))
-            self.workbook_averaged.close()
-            # increment start row for summary workbook
-            self.start_row += self.num_series + 2
+
+                # last series of the study
+                if self.num_series == series_job['num_series_in_folder'] - 1:
+                    self.workbook_averaged.close()
+                    # increment start row for summary workbook
+                    self.start_row += self.num_series + 2
+        finally:
+            if pool is not None:
+                pool.close()
+                pool.join()
         self.workbook_summary.save(self.name_workbook_summary)
+        # wait for 2d-NPS images of this process
+        # (threads of worker processes finish writing, before the workers exit)
+        self.nps_image_writer.close()
+        print('pixel cache: %(hits)d hits, %(misses)d misses, %(evictions)d evictions, '
+              '%(entries)d images, %(bytes)d bytes' % self.object_arr.pixel_cache_statistics)
+        print('geometry cache: %(hits)d hits, %(misses)d misses, %(evictions)d evictions, '
+              '%(entries)d entries' % ProcessROI.geometry_cache.statistics)
+        if self.num_image_threads == 1 and self.prefetch_depth > 0:
+            print('prefetch: %f seconds total stall time' % prefetch_stall_time)
         if init_dict['destroy_main_window']:
             self.object_roi.master.destroy()
 
+    def create_series_jobs(self):
+
+        """
+        List all series of attribute sorted_all_roi_dict in the order
+        they are processed and create their folders 'Results_<folder>'.
+
+        :return: list of dicts
+            Keys : 'num_folder' - number of study folder,
+                   'folder' - path to study folder,
+                   'num_series' - number of series in study folder,
+                   'series' - name of series folder,
+                   'num_series_in_folder' - number of series in study folder.
+        """
+
+        series_jobs = []
+        for num_folder, folder in enumerate(self.sorted_all_roi_dict):
+            for num_series, series in enumerate(self.sorted_all_roi_dict[folder]):
+                folder_part, serie_part = self.series_name_parts(folder=folder, series=series)
+                # create folder Results
+                os.makedirs(folder + '/Results_%s' % folder_part, exist_ok=True)
+                series_jobs.append({'num_folder': num_folder,
+                                    'folder': folder,
+                                    'num_series': num_series,
+                                    'series': series,
+                                    'num_series_in_folder': len(self.sorted_all_roi_dict[folder])})
+        return series_jobs
+
+    def series_name_parts(self, folder, series):
+
+        """
+        Get parts of study folder's and series folder's names used
+        in names of result files and worksheets.
+
+        :param folder: string
+            Path to study folder.
+        :param series: string
+            Name of series folder.
+        :return: tuple of strings
+            Parts of study folder's and series folder's names.
+        """
+
+        if self.first_data_set:
+            serie_part = series
+            folder_part = os.path.basename(folder)
+        else:
+            serie_part = ProcessROI.drop_part_of_name(
+                name=series,
+                pattern_of_dropped_part=r'\w*\d*_',
+                dropped_from_end=False)[1:]
+            folder_part = ProcessROI.drop_part_of_name(
+                name=os.path.basename(folder),
+                pattern_of_dropped_part=r' \- \d+',
+                dropped_from_end=True)
+        return folder_part, serie_part
+
+    def run_series(self, series_job):
+
+        """
+        Calculate NPS of all images of one series and create
+        the series' xlsx-file in folder 'Results_<folder>'.
+
+        Executed either by this process or by a worker process
+        (see method execute_calc_nps_sorted).
+
+        :param series_job: dict
+            (See return value of method create_series_jobs)
+        :return: dict
+            (See return value of method execute_nps_comp)
+            Additional key : 'execution_time' - time needed for the series in seconds.
+        """
+
+        self.num_folder = series_job['num_folder']
+        self.folder = series_job['folder']
+        self.num_series = series_job['num_series']
+        series = series_job['series']
+        self.folder_part, self.serie_part = self.series_name_parts(folder=self.folder, series=series)
+
+        global start_time_series
+        start_time_series = time.time()
+
+        # log the process
+        print('\nseries %s: %d of %d\nFolder %d of %d\n' % (
+            series, self.num_series + 1, len(self.sorted_all_roi_dict[self.folder]),
+            self.num_folder + 1,
+            len(self.sorted_all_roi_dict)
+        ))
+
+        name_for_xlsx = self.folder \
+                        + '/Results_%s/' % (self.folder_part) \
+                        + self.folder_part + \
+                        self.serie_part + '.xlsx'
+        # open new workbook in Excel
+        self.workbook_series = xlsx.Workbook(name_for_xlsx)
+        # noise maps are saved next to the workbook, their image outside of the dataset
+        # (it would be discovered as input image by next runs)
+        self.name_noise_map = name_for_xlsx[:-len('.xlsx')] + '_noise_map'
+        self.name_noise_map_preview = '01.2d_NPS_images/Noise_map__%s%s.jpg' % (self.folder_part, self.serie_part)
+        series_result = self.execute_nps_comp(all_roi_dict=self.sorted_all_roi_dict[self.folder][series])
+        series_result['execution_time'] = time.time() - start_time_series
+        # store metadata of read images in catalog
+        self.object_arr.save_catalog()
+        print('++++++++++\n'
+              'execution time per series: %f seconds\n' % series_result['execution_time'])
+        return series_result
+
+    @staticmethod
+    def init_series_worker(processor):
+
+        """
+        Store the copy of ProcessROI object in a worker process
+        of the pool created in method execute_calc_nps_sorted.
+
+        :param processor: instance of class ProcessROI
+        :return: nothing
+        """
+
+        global series_processor
+        # helpers holding locks and threads are not passed (See method __getstate__)
+        processor.create_thread_helpers()
+        series_processor = processor
+
+    def create_thread_helpers(self):
+
+        """
+        Create attributes holding locks or threads, that are created
+        in each process: detrender (if fitting is used) and nps_image_writer.
+
+        :return: nothing
+        """
+
+        if self.useFitting:
+            self.detrender = PolynomialDetrender(order=self.fit_order, cache=ProcessROI.geometry_cache)
+        else:
+            self.detrender = None
+        # 2d-NPS images are written by background thread
+        self.nps_image_writer = NPSImageWriter(folder='01.2d_NPS_images', policy=self.nps_image_policy,
+                                               kernel=self.nps_kernel, full_nps_function=ProcessROI.full_nps_2d,
+                                               max_pending=self.nps_image_queue_size)
+
+    @staticmethod
+    def run_series_in_worker(series_job):
+
+        """
+        Process one series in a worker process (see method run_series).
+
+        :param series_job: dict
+            (See return value of method create_series_jobs)
+        :return: dict
+            (See return value of method run_series)
+        """
+
+        return series_processor.run_series(series_job)
+
+    def __getstate__(self):
+
+        """
+        Drop attributes, that cannot be passed to worker processes:
+        object of class GUI, workbooks of the parent process and helpers
+        holding locks and threads (created again by static method init_series_worker).
+        Attribute object_arr is passed (See method __getstate__ of class StartClass).
+
+        :return: dict
+            Attributes of the object.
+        """
+
+        state = self.__dict__.copy()
+        for attribute in ('object_roi', 'workbook_summary', 'worksheet_summary',
+                          'workbook_averaged', 'worksheet_averaged', 'workbook_series'):
+            state.pop(attribute, None)
+        state.update({'detrender': None,
+                      'nps_image_writer': None,
+                      'nps_accumulator': None})
+        return state
+
     def execute_nps_comp(self, all_roi_dict):
 
         """
@@ -409,7 +688,16 @@ class ProcessROI:
 
         :param all_roi_dict: dict
             (See attribute sorted_all_roi_dict)
-        :return: nothing
+        :return: dict
+            Averaged results of the series.
+            Keys : 'mean_of_averaged_nps_dict' (See attribute mean_of_averaged_nps_dict),
+                   'peak_info_dict_ave' (See attribute peak_info_dict_ave),
+                   'mean_integral_of_2d_NPS' - mean integral of 2d-NPS of all ROIs,
+                   'mean_AUC' - mean area under 1d-NPS profile of all ROIs,
+                   'total_mean_HU', 'total_mean_sd' - mean of mean HU and SD of all ROIs,
+                   'metadata' - metadata of the series,
+                   'prefetch_statistics' - stall time of reading images ahead
+                   (See method statistics of class PrefetchLoader) or None, if not used.
         """
         # flush dict of ave nps for the current serie
         self.all_average_nps = {}
@@ -421,134 +709,94 @@ class ProcessROI:
         self.all_SD_dict = {}
         self.integral_2d_nps_dict = {}
         self.auc_dict = {}
-        # iterate through all images
-        for num_of_image, self.key_image in enumerate(all_roi_dict):
-
-            # initialize list of image ROIs' AUC
-            image_auc_list = []
-            # initialize list of image ROI's integral of 2d NPS
-            image_integral_2d_nps_list = []
+        # noise maps of all slices
+        slice_noise_maps = []
+        # sums of 2d-NPS of the series
+        self.nps_accumulator = NPSAccumulator() if self.useEnsembleNPS else None
+        # running statistics of the series, updated as each image is merged:
+        # mean HU and SD of images (means of their ROIs), AUC and integral of 2d-NPS
+        # of all ROIs and NPS averaged among ROIs of images
+        self.series_statistics = {'mean_HU': RunningStatistics(),
+                                  'SD': RunningStatistics(),
+                                  'AUC': RunningStatistics(),
+                                  'integral_of_2d_NPS': RunningStatistics(),
+                                  'nps': RunningStatistics()}
+        # SD of mean HU and of SD among ROIs of each image
+        self.sd_of_mean_HU_dict = {}
+        self.sd_of_sd_dict = {}
+        nps_frequencies = None
+
+        # metadata of the series (header of the first image)
+        self.metadata = self.object_arr.get_series_metadata(image_file=next(iter(all_roi_dict)))
+
+        process_image = fut.partial(self.process_image, all_roi_dict=all_roi_dict)
+        executor = None
+        loader = None
+        if self.num_image_threads > 1:
+            # several images of the series are read and processed at once;
+            # results are yielded in the order of the images in all_roi_dict
+            executor = ThreadPoolExecutor(max_workers=self.num_image_threads)
+            image_results = executor.map(process_image, all_roi_dict, range(len(all_roi_dict)))
+        elif self.prefetch_depth > 0:
+            # next images are read in background while the current image is processed
+            loader = PrefetchLoader(load_function=fut.partial(self.load_image, all_roi_dict=all_roi_dict),
+                                    keys=all_roi_dict,
+                                    depth=self.prefetch_depth,
+                                    num_threads=self.num_prefetch_threads)
+            image_results = (process_image(key_image, num_of_image, data_from_dicom=data_from_dicom)
+                             for num_of_image, (key_image, data_from_dicom) in enumerate(zip(all_roi_dict, loader)))
+        else:
+            image_results = map(process_image, all_roi_dict, range(len(all_roi_dict)))
 
-            data_from_dicom = self.object_arr.create_base_array(self.key_image)
-            metadata_from_dicom = data_from_dicom['whole_dcm']
-            try:
-                pixel_spacing = [float(i) for i in metadata_from_dicom['0x0028', '0x0030'].value]
-            except ValueError:
-                pixel_spacing = self.pixel_size_in_mm
-                print('There is no property \'Pixel Spacing\'')
-            except TypeError:
-                pixel_spacing = [0.378, 0.378]
-            pixel_array_image = data_from_dicom['base_array']
-
-            # if new series begins
-            if num_of_image == 0:
-                self.metadata = data_from_dicom['metadata_subdict']
-
-            # build dict of mean HU and SD
-
-            self.build_all_mean_HU_SD_dict(array_to_operate=pixel_array_image,
-                                           all_roi_dict=all_roi_dict,
-                                           key=self.key_image)
-            print('ROIs on image %s are being processed: %d of %d; '
-                  'Folder %d of %d; '
-                  'series %d of %d ' % (os.path.basename(self.key_image),
-                                        num_of_image + 1,
-                                        len(all_roi_dict),
-                                        self.num_folder + 1,
-                                        len(self.sorted_all_roi_dict),
-                                        self.num_series + 1,
-                                        len(self.sorted_all_roi_dict[self.folder])))
-            # counter_roi_inside_image = 0
-            # list to store all nps for current image
-            self.nps_image = []
-            # collect lengths of one d nps of rois in image
-            self.lengths = []
-            self.image_roi_sizes = []
-            # iterate through all rois inside one image
-            for num_of_roi, self.item_roi in enumerate(all_roi_dict[self.key_image]):
-                subarray = pixel_array_image[self.item_roi[1]:self.item_roi[3], self.item_roi[0]:self.item_roi[2]]
-                # print progress
-                print('ROI is being processed: %d of %d' % (num_of_roi + 1, len(all_roi_dict[self.key_image])))
-                # basename of image without extensions
-                self.basename = os.path.basename(self.key_image)[:-4]
-                # basename of image with extension
-                self.basename_w_ext = os.path.basename(self.key_image)
-                # array from the image
-                array_to_operate = subarray
-                # get shape of the ROI
-                shape_of_roi = array_to_operate.shape
-                # store the shape in list
-                self.image_roi_sizes.append(shape_of_roi)
-                # # apply fitting of the image
-                # self.create_pol_fit(array_to_operate)
-                # create dictionary of nps and respective frequencies (unranged)
-                dict = self.compute_nps(array=array_to_operate, pixel_spacing=pixel_spacing)
-                AUC = dict['AUC']
-                integral_of_2d_NPS = dict['integral_of_2d_NPS']
-                # append ROI's AUC und integral of 2d NPS to resp. lists
-                image_auc_list.append(dict['AUC'])
-                image_integral_2d_nps_list.append(dict['integral_of_2d_NPS'])
-                if self.useTruncation:  # setting in init_dict
-                    # truncate lower nps and respective frequencies
-                    self.new_dict = self.truncate_nps_freq(dict=dict)
+        try:
+            # merge results of all images in file order
+            for image_result in image_results:
+                self.key_image = image_result['key_image']
+                # statistics of mean HU and SD of ROIs of the image
+                image_mean_HU = RunningStatistics.from_values(values=image_result['mean_HU'])
+                image_SD = RunningStatistics.from_values(values=image_result['SD'])
+                # update statistics of the series
+                self.series_statistics['mean_HU'].update(value=image_mean_HU.mean)
+                self.series_statistics['SD'].update(value=image_SD.mean)
+                self.series_statistics['AUC'].update_batch(values=image_result['AUC'])
+                self.series_statistics['integral_of_2d_NPS'].update_batch(values=image_result['integral_of_2d_NPS'])
+                if self.nps_accumulator is not None:
+                    self.nps_accumulator.add_image_nps(nps_2d_list=image_result['ensemble_dict']['nps_2d_list'],
+                                                       roi_shapes=image_result['roi_sizes'],
+                                                       pixel_spacing=image_result['ensemble_dict']['pixel_spacing'])
                 else:
-                    # use nps_dict as it is
-                    self.new_dict = dict
-                # create raw csv-file (with empty rows between data)
-                # self.all_xlsx.append(self.create_xlsx_file_nps(dict=self.new_dict, prefix='One_D_NPS_'))
-                # create nps range
-
-                # get equations of lines connecting each two points of nps array
-                eqs_prop = ProcessROI.nps_equation(self.new_dict['values'])
-                # initialize empty list for ranged NPS (with specified s´distance
-                # between samples)
-                nps_range = []
-                # we need this array because freq_range is restricted through
-                # size of ROI, frequencies beyond the last available freq
-                # should be truncated (dropped)
-                new_freq_range = []
-                # iterate through frequencies in freq_range
-                for item_freq in self.freq_range:
-                    try:
-                        nps_range.append(self.get_current_nps(freq_array=self.new_dict['frequencies'],
-                                                              freq_value=item_freq))
-                        new_freq_range.append(item_freq)
-                    except ValueError:
-                        # if there are no more frequencies available
-                        # print('finished')
-                        # print('nps range: ', len(nps_range))
-                        break
-                # nps_range = list(map(fut.partial(self.get_current_nps, freq_array=self.new_dict['frequencies'],
-                #                                                            eqs=eqs_prop), self.freq_range))
-                range_dict = {'values': nps_range,
-                              'frequencies': new_freq_range,
-                              'AUC': AUC,
-                              'integral_of_2d_NPS': integral_of_2d_NPS}
-
-                # store ranged nps and resp. freq in a list
-                self.nps_image.append(range_dict)
-                assert len(nps_range) == len(new_freq_range)
-                self.lengths.append(len(range_dict['values']))
-                # print('continued:  ', self.lengths)
-
-            # update dict for AUC and integral of 2d NPS
-            self.auc_dict.update({self.key_image: image_auc_list})
-            self.integral_2d_nps_dict.update({self.key_image: image_integral_2d_nps_list})
-
-            # average stored nps
-            averaged_dict = self.average_roi_nps(list_of_dict=self.nps_image)
-            self.all_average_nps.update({self.key_image: averaged_dict})
-            self.roi_size_dict.update({self.key_image: self.image_roi_sizes})
-
-            # recognize all peaks in nps-array
-            peaks = ProcessROI.collect_all_max_peaks_nps(averaged_dict)
-            # handle peak info
-            peak_info_dict = self.handle_peak_info(peak_dict=peaks,
-                                                   all_val_arr=averaged_dict['values'],
-                                                   all_freq_arr=averaged_dict['frequencies'])
-            self.all_nps_peak_info.update({self.key_image: peak_info_dict})
-
-            self.all_nps_dict.update({self.key_image: self.nps_image})
+                    self.series_statistics['nps'].update(value=image_result['averaged_dict']['values'])
+                    nps_frequencies = image_result['averaged_dict']['frequencies']
+                    # results of ROIs and images are kept for xlsx-file of the series
+                    # update dicts of mean HU and SD
+                    self.all_mean_HU_dict.update({self.key_image: image_result['mean_HU']})
+                    self.all_SD_dict.update({self.key_image: image_result['SD']})
+                    self.sd_of_mean_HU_dict.update({self.key_image: image_mean_HU.sd()})
+                    self.sd_of_sd_dict.update({self.key_image: image_SD.sd()})
+                    # update dict for AUC and integral of 2d NPS
+                    self.auc_dict.update({self.key_image: image_result['AUC']})
+                    self.integral_2d_nps_dict.update({self.key_image: image_result['integral_of_2d_NPS']})
+                    self.roi_size_dict.update({self.key_image: image_result['roi_sizes']})
+                    self.all_average_nps.update({self.key_image: image_result['averaged_dict']})
+                    self.all_nps_peak_info.update({self.key_image: image_result['peak_info_dict']})
+                    self.all_nps_dict.update({self.key_image: image_result['nps_image']})
+                if self.noise_map is not None:
+                    slice_noise_maps.append(image_result['noise_map'])
+        finally:
+            if executor is not None:
+                executor.shutdown()
+            if loader is not None:
+                loader.close()
+        if loader is not None:
+            prefetch_statistics = loader.statistics()
+            print('prefetch: %(stall_time)f seconds stall time, '
+                  '%(stalls)d of %(images)d images waited for' % prefetch_statistics)
+        else:
+            prefetch_statistics = None
+        if self.noise_map is not None:
+            self.noise_map.save(slice_maps=slice_noise_maps, image_files=list(all_roi_dict),
+                                filename=self.name_noise_map,
+                                preview_filename=self.name_noise_map_preview)
         # create mean HU and SD info dictionaries
         # self.build_all_mean_HU_SD_dict(all_roi_dict=all_roi_dict)
         # self.build_all_sd_dict(all_roi_dict=all_roi_dict,
@@ -556,27 +804,276 @@ class ProcessROI:
         # print('SD:  ', self.all_SD_dict)
         # print('mean HU:  ', self.all_mean_HU_dict)
         # calculate mean of averaged nps
-        self.mean_of_averaged_nps_dict = ProcessROI.mean_of_ave_nps(all_average_nps=self.all_average_nps)
+        if self.nps_accumulator is None:
+            # mean of NPS averaged among ROIs of each image
+            self.mean_of_averaged_nps_dict = {'values': self.series_statistics['nps'].mean,
+                                              'frequencies': nps_frequencies}
+        else:
+            # one reduction of the ensemble 2d-NPS of the series
+            self.mean_of_averaged_nps_dict = self.reduce_ensemble_nps(accumulator=self.nps_accumulator)
         # recognize all peaks in nps-array
         peaks_ave = ProcessROI.collect_all_max_peaks_nps(self.mean_of_averaged_nps_dict)
         # handle peak info
         self.peak_info_dict_ave = self.handle_peak_info(peak_dict=peaks_ave,
                                                         all_val_arr=self.mean_of_averaged_nps_dict['values'],
-                                                        all_freq_arr=self.mean_of_averaged_nps_dict['frequencies'])
+                                                        all_freq_arr=self.mean_of_averaged_nps_dict['frequencies'],
+                                                        basename=self.serie_part)
         # self.all_nps_peak_info_ave.update({self.key_image: self.peak_info_dict_ave})
-        # calculate SD of mean HU
-        self.sd_of_mean_HU_dict = ProcessROI.sd_of_dictionary(dict=self.all_mean_HU_dict)
-        # calculate SD of SD
-        self.sd_of_sd_dict = ProcessROI.sd_of_dictionary(dict=self.all_SD_dict)
-        # get total mean values for mean_HU and SD
-        self.total_mean_HU = ProcessROI.mean_of_mean(all_values_dict=self.all_mean_HU_dict)
-        self.total_mean_sd = ProcessROI.mean_of_mean(all_values_dict=self.all_SD_dict)
+        # get total mean values for mean_HU and SD (means of means of ROIs of images)
+        self.total_mean_HU = self.series_statistics['mean_HU'].mean
+        self.total_mean_sd = self.series_statistics['SD'].mean
         # create workbook for displaying results
         # self.workbook_series = xlsx.Workbook(self.name_xlsx)
-        self.create_xlsx_file_nps(all_nps_dict=self.all_nps_dict)
+        if self.nps_accumulator is None:
+            self.create_xlsx_file_nps(all_nps_dict=self.all_nps_dict)
+        else:
+            self.create_xlsx_sheet_ensemble(accumulator=self.nps_accumulator)
         self.workbook_series.close()
-        pass
-        return
+        # averaged results of the series, that are written
+        # into workbook_averaged and workbook_summary
+        series_result = {'mean_of_averaged_nps_dict': self.mean_of_averaged_nps_dict,
+                         'peak_info_dict_ave': self.peak_info_dict_ave,
+                         'mean_integral_of_2d_NPS': self.series_statistics['integral_of_2d_NPS'].mean,
+                         'mean_AUC': self.series_statistics['AUC'].mean,
+                         'total_mean_HU': self.total_mean_HU,
+                         'total_mean_sd': self.total_mean_sd,
+                         'metadata': self.metadata,
+                         'prefetch_statistics': prefetch_statistics}
+        return series_result
+
+    def load_image(self, key_image, all_roi_dict):
+
+        """
+        Read image (only rows covered by its ROIs, if possible,
+        and if noise maps of whole slices are not computed).
+
+        :param key_image: string
+            Path to image file.
+        :param all_roi_dict: dict
+            (See attribute sorted_all_roi_dict)
+        :return: dict
+            (See return value of method create_base_array of class StartClass)
+        """
+
+        if self.noise_map is not None:
+            return self.object_arr.create_base_array(key_image)
+        return self.object_arr.create_base_array(
+            key_image, row_range=ProcessROI.roi_row_range(all_roi_dict[key_image]))
+
+    def process_image(self, key_image, num_of_image, all_roi_dict, data_from_dicom=None):
+
+        """
+        Read one image and calculate NPS and side variables of its ROIs.
+
+        Only local variables are used for intermediate results,
+        so that several images can be processed by threads at once
+        (see attribute num_image_threads).
+
+        :param key_image: string
+            Path to current image file.
+        :param num_of_image: int
+            Number of the image in the series.
+        :param all_roi_dict: dict
+            (See attribute sorted_all_roi_dict)
+        :param data_from_dicom: dict or None
+            Image already read by method load_image (e.g. by PrefetchLoader).
+            None (by default): the image is read here.
+        :return: dict
+            Keys : 'key_image' - path to image file,
+                   'mean_HU', 'SD' - lists of mean HU and SD of all ROIs,
+                   'AUC', 'integral_of_2d_NPS' - respective lists of all ROIs,
+                   'nps_image' - list of ranged NPS dicts of all ROIs,
+                   'averaged_dict' - NPS averaged among ROIs,
+                   'roi_sizes' - list of shapes of all ROIs,
+                   'peak_info_dict' - peak info of averaged NPS,
+                   'ensemble_dict' - 2d-NPS of all ROIs ('nps_2d_list') and pixel spacing
+                   ('pixel_spacing') to be added to attribute nps_accumulator or None,
+                   'noise_map' - maps of local noise of the whole image
+                   (See method compute of class NoiseMap) or None, if not computed.
+                   'nps_image', 'averaged_dict' and 'peak_info_dict' are None,
+                   if ensemble 2d-NPS are accumulated (See attribute nps_accumulator),
+                   otherwise 'ensemble_dict' is None.
+        """
+
+        # initialize list of image ROIs' AUC
+        image_auc_list = []
+        # initialize list of image ROI's integral of 2d NPS
+        image_integral_2d_nps_list = []
+        # initialize list of image ROIs' (truncated) not interpolated NPS
+        image_nps_dicts = []
+
+        if data_from_dicom is None:
+            data_from_dicom = self.load_image(key_image=key_image, all_roi_dict=all_roi_dict)
+        metadata_from_dicom = data_from_dicom['whole_dcm']
+        try:
+            pixel_spacing = [float(i) for i in metadata_from_dicom['0x0028', '0x0030'].value]
+        except ValueError:
+            pixel_spacing = self.pixel_size_in_mm
+            print('There is no property \'Pixel Spacing\'')
+        except TypeError:
+            pixel_spacing = [0.378, 0.378]
+        pixel_image = data_from_dicom['pixel_image']
+        # pixel arrays of all rois inside one image
+        # (views of the image in native data type, rescaled only if specified)
+        roi_arrays = [pixel_image.window(item_roi) for item_roi in all_roi_dict[key_image]]
+
+        # map of local noise over the whole image
+        if self.noise_map is not None:
+            noise_map = self.noise_map.compute(pixel_image=pixel_image)
+        else:
+            noise_map = None
+        # build lists of mean HU and SD
+        mean_HU_SD_dict = self.build_all_mean_HU_SD_dict(pixel_image=pixel_image,
+                                                         image_rois=all_roi_dict[key_image])
+        print('ROIs on image %s are being processed: %d of %d; '
+              'Folder %d of %d; '
+              'series %d of %d ' % (os.path.basename(key_image),
+                                    num_of_image + 1,
+                                    len(all_roi_dict),
+                                    self.num_folder + 1,
+                                    len(self.sorted_all_roi_dict),
+                                    self.num_series + 1,
+                                    len(self.sorted_all_roi_dict[self.folder])))
+        # list to store all nps for current image
+        nps_image = []
+        image_roi_sizes = []
+        # 2d-NPS of all rois of the image
+        image_nps_2d_list = []
+        # basename of image without extensions
+        basename = os.path.basename(key_image)[:-4]
+        if self.useBatchedFFT:
+            # compute NPS of all rois of the image at once
+            nps_dicts = self.compute_nps_batch(arrays=roi_arrays, pixel_spacing=pixel_spacing)
+        # iterate through all rois inside one image
+        for num_of_roi, array_to_operate in enumerate(roi_arrays):
+            # print progress
+            print('ROI is being processed: %d of %d' % (num_of_roi + 1, len(roi_arrays)))
+            # store the shape of the ROI in list
+            image_roi_sizes.append(array_to_operate.shape)
+            # create dictionary of nps and respective frequencies (unranged)
+            if self.useBatchedFFT:
+                dict = nps_dicts[num_of_roi]
+            else:
+                dict = self.compute_nps(array=array_to_operate, pixel_spacing=pixel_spacing)
+            # append ROI's AUC und integral of 2d NPS to resp. lists
+            image_auc_list.append(dict['AUC'])
+            image_integral_2d_nps_list.append(dict['integral_of_2d_NPS'])
+            image_nps_2d_list.append(dict['nps_2d'])
+            if self.nps_accumulator is not None:
+                # 1d-NPS of the roi is not used
+                continue
+            if self.useTruncation:  # setting in init_dict
+                # truncate lower nps and respective frequencies
+                new_dict = self.truncate_nps_freq(dict=dict)
+            else:
+                # use nps_dict as it is
+                new_dict = dict
+            # store (truncated) nps of the roi to range it afterwards
+            image_nps_dicts.append(new_dict)
+
+        # images of 2d-NPS are written in background
+        self.nps_image_writer.add_image_nps(nps_2d_list=image_nps_2d_list, roi_shapes=image_roi_sizes,
+                                            name='%s%s__%s' % (self.folder_part, self.serie_part, basename),
+                                            first_image=num_of_image == 0)
+
+        if self.nps_accumulator is not None:
+            # 2d-NPS are summed for the series, when the results of the image are merged
+            # (in file order, so that the sums do not depend on the threads);
+            # 1d-NPS of ROIs and of the image are not built
+            ensemble_dict = {'nps_2d_list': image_nps_2d_list,
+                             'pixel_spacing': pixel_spacing}
+            nps_image = None
+            averaged_dict = None
+            peak_info_dict = None
+        else:
+            # create nps range (with specified distance between samples)
+            # for all rois of the image; freq_range is restricted through
+            # size of ROI, frequencies beyond the last available freq
+            # are truncated (dropped)
+            ensemble_dict = None
+            ranged_nps_dicts = self.resample_nps_list(list_of_dict=image_nps_dicts)
+            for nps_range_dict, AUC, integral_of_2d_NPS in zip(ranged_nps_dicts,
+                                                              image_auc_list,
+                                                              image_integral_2d_nps_list):
+                range_dict = {'values': nps_range_dict['values'],
+                              'frequencies': nps_range_dict['frequencies'],
+                              'AUC': AUC,
+                              'integral_of_2d_NPS': integral_of_2d_NPS}
+                assert len(range_dict['values']) == len(range_dict['frequencies'])
+                # store ranged nps and resp. freq in a list
+                nps_image.append(range_dict)
+
+            # average stored nps
+            averaged_dict = self.average_roi_nps(list_of_dict=nps_image)
+
+            # recognize all peaks in nps-array
+            peaks = ProcessROI.collect_all_max_peaks_nps(averaged_dict)
+            # handle peak info
+            peak_info_dict = self.handle_peak_info(peak_dict=peaks,
+                                                   all_val_arr=averaged_dict['values'],
+                                                   all_freq_arr=averaged_dict['frequencies'],
+                                                   basename=basename)
+
+        image_result = {'key_image': key_image,
+                        'mean_HU': mean_HU_SD_dict['mean_HU'],
+                        'SD': mean_HU_SD_dict['SD'],
+                        'AUC': image_auc_list,
+                        'integral_of_2d_NPS': image_integral_2d_nps_list,
+                        'nps_image': nps_image,
+                        'averaged_dict': averaged_dict,
+                        'roi_sizes': image_roi_sizes,
+                        'peak_info_dict': peak_info_dict,
+                        'ensemble_dict': ensemble_dict,
+                        'noise_map': noise_map}
+        return image_result
+
+    @staticmethod
+    def roi_row_range(image_rois):
+
+        """
+        Get rows of image covered by its ROIs.
+
+        :param image_rois: ndarray (2d) or list of tuples
+            Coordinates of ROIs of one image (See attribute sorted_all_roi_dict).
+        :return: tuple of two ints or None
+            First row and row after the last row covered by ROIs;
+            None, if there are no ROIs or negative coordinates
+            (the whole image is read).
+        """
+
+        image_rois = np.asarray(image_rois).reshape(-1, 4)
+        if len(image_rois) == 0 or image_rois[:, [1, 3]].min() < 0:
+            return None
+        return int(image_rois[:, 1].min()), int(image_rois[:, 3].max())
+
+    @staticmethod
+    def index_files(directories_dict):
+
+        """
+        Build index of all files of directories_dict, that maps
+        each file to its study and series folder.
+
+        :param directories_dict: dict of dicts of lists of strings
+            (See description of attribute filedict of class StartClass)
+        :return: dict
+            Keys : 'paths' - dict mapping absolute paths of files to lists of tuples
+                             (path to study folder, name of series folder),
+                   'basenames' - dict mapping base names of files to lists of tuples
+                                 (path to study folder, name of series folder, path to file).
+            Tuples are listed in natural order of study and series folders.
+        """
+
+        paths = {}
+        basenames = {}
+        for classdirname in natsorted(directories_dict.keys(), key=lambda f: f.split('_')[-1]):
+            subdict = directories_dict[classdirname]
+            for serie_name in natsorted(subdict.keys(), key=lambda f: f.split('_')[-1]):
+                for file_name_second in subdict[serie_name]:
+                    paths.setdefault(file_name_second, []).append((classdirname, serie_name))
+                    basenames.setdefault(os.path.basename(file_name_second), []).append(
+                        (classdirname, serie_name, file_name_second))
+        return {'paths': paths,
+                'basenames': basenames}
 
     @staticmethod
     def sort_all_roi_dict(directories_dict, all_roi_dict):
@@ -584,10 +1081,12 @@ class ProcessROI:
         Sort passed all_roi_dict to reproduce
         directory structure of dcm-images data set
         (see description below).
+        Files are looked up by their exact path in an index built once
+        (See static method index_files).
 
         :param directories_dict: dict of dicts of lists of strings
             (See description of attribute filedict of class StartClass)
-        :param all_roi_dict: dict of lists of tuples
+        :param all_roi_dict: ROITemplate object or dict of lists of tuples
             (See decription of attribute all_roi_dict of class GUI)
         :return: sorted all_roi_dict
             Keys : paths to study folder
@@ -595,7 +1094,8 @@ class ProcessROI:
                 Keys : paths to series folders
                 Values : dict
                     Keys : paths to image file
-                    Values : lists of tuples containing coordinates of ROIs:
+                    Values : arrays of ROIs of the image (not copied)
+                        containing coordinates of ROIs:
                         - x coordinate of upper left corner
                         - y coordinate of upper left corner
                         - x coordinate of lower right corner
@@ -606,134 +1106,132 @@ class ProcessROI:
         print('sort_all_roi_dict is being executed')
         # empty dict for sorted ROIs
         sorted_all_roi_dict = {}
-        total_files = len(all_roi_dict.keys())
+        # index of all files built once
+        file_index = ProcessROI.index_files(directories_dict=directories_dict)
         # iterate over keys of all_roi_dict, i.e. file names
-        for numf, file_name_prim in enumerate(natsorted(all_roi_dict.keys(), key=lambda f: f.split('_')[-1])):
-            local_start_time = time.time()
-            print('Progress: file %d of %d' % ((numf + 1), total_files))
-            # iterate over the keys of directories_dict
-            for classdirname in natsorted(directories_dict.keys(), key=lambda f: f.split('_')[-1]):
+        for file_name_prim in natsorted(all_roi_dict.keys(), key=lambda f: f.split('_')[-1]):
+            # series containing the file
+            locations = file_index['paths'].get(file_name_prim)
+            if locations is None:
+                # keys, that are file names or relative paths, are matched
+                # with the end of paths having the same base name
+                locations = [(classdirname, serie_name) for (classdirname, serie_name, file_name_second)
+                             in file_index['basenames'].get(os.path.basename(file_name_prim), [])
+                             if file_name_second.endswith(os.sep + file_name_prim) or
+                             file_name_second.endswith('/' + file_name_prim)]
+            for classdirname, serie_name in locations:
                 # update dict
-                # sorted_all_roi_dict.update({classdirname: {}})
-                # iterate over keys of subdict
-                subdict = directories_dict[classdirname]
-                for serie_name in natsorted(subdict.keys(), key=lambda f: f.split('_')[-1]):
-                    # update dict
-                    # sorted_all_roi_dict[classdirname].update({serie_name: {}})
-                    # iterate over the files in file list
-                    for file_name_second in subdict[serie_name]:
-                        # compare key of all_roi_dict and filename
-                        if file_name_prim in file_name_second:
-                            try:
-                                temp_dict_prim = sorted_all_roi_dict[classdirname]
-                            except KeyError:
-                                sorted_all_roi_dict.update({classdirname: {}})
-                                temp_dict_prim = sorted_all_roi_dict[classdirname]
-
-                            try:
-                                temp_dict = temp_dict_prim[serie_name]
-                            except KeyError:
-                                temp_dict_prim.update({serie_name: {}})
-                                temp_dict = temp_dict_prim[serie_name]
-
-                            temp_dict.update({file_name_prim: all_roi_dict[file_name_prim]})
-                            sorted_all_roi_dict[classdirname].update({serie_name: temp_dict})
-            duration_for_loop = time.time() - local_start_time
+                sorted_all_roi_dict.setdefault(classdirname, {}).setdefault(serie_name, {}).update(
+                    {file_name_prim: all_roi_dict[file_name_prim]})
         print('sort_all_roi_dict is done')
 
         return sorted_all_roi_dict
 
-    def build_all_mean_HU_SD_dict(self, all_roi_dict, array_to_operate, key):
+    def build_all_mean_HU_SD_dict(self, pixel_image, image_rois):
 
         """
         Calculate mean HU and standard deviation for each ROI
-        on the current image and update respective dictionaries
+        on the current image. The lists are stored in respective dictionaries
         all_mean_HU_dict and all_SD_dict (See description in class' docs)
-
-        :param all_roi_dict: dict
-            (See description of attribute sorted_all_roi_dict).
-        :param array_to_operate: ndarray (2d)
-            Current ROI's pixel array.
-        :param key: string
-            Path to current dcm-image file.
-        :return: nothing
+        by method execute_nps_comp.
+
+        For many or overlapping ROIs summed-area tables of the part of the image
+        covered by ROIs are built once (See class IntegralImage), mean and SD
+        of each ROI are computed from them in constant time; Rescale Slope and Intercept
+        are applied to mean and SD afterwards. Otherwise, and for ROIs with
+        negative coordinates (counted from the end of the image) or without pixels,
+        mean and SD are computed from pixel arrays of ROIs.
+
+        :param pixel_image: PixelImage object
+            Current image (See return value of method create_base_array of class StartClass).
+        :param image_rois: ndarray (2d) or list of tuples
+            Coordinates of ROIs of the current image (See attribute sorted_all_roi_dict).
+        :return: dict
+            Keys : 'mean_HU' - list of mean HU of all ROIs,
+                   'SD' - list of SD of all ROIs.
         """
 
+        image_rois = np.asarray(image_rois, dtype=np.int64).reshape(-1, 4)
+        # ROIs, that are computed from summed-area tables
+        use_tables = np.all(image_rois >= 0, axis=1) & \
+            (image_rois[:, 2] > image_rois[:, 0]) & (image_rois[:, 3] > image_rois[:, 1])
+        if not IntegralImage.pays_off(rois=image_rois[use_tables]):
+            use_tables[:] = False
         # all mean HU for the current image
-        roi_image_mean_HU = []
+        roi_image_mean_HU = [None] * len(image_rois)
         # all mean sd for current image
-        image_sd = []
-        # iterate through all rois in image
-        for coord in all_roi_dict[key]:
-            # get pixel array of current roi
-            roi_array = array_to_operate[coord[1]:coord[3], coord[0]:coord[2]]
-
+        image_sd = [None] * len(image_rois)
+        if np.any(use_tables):
+            # only the part of the image covered by ROIs is summed
+            x0, y0, x1, y1 = IntegralImage.bounding_box(image_rois[use_tables])
+            row_start = max(y0 - pixel_image.row_offset, 0)
+            integral_image = IntegralImage(pixels=pixel_image.pixels[row_start:y1 - pixel_image.row_offset, x0:x1],
+                                           row_offset=pixel_image.row_offset + row_start,
+                                           column_offset=x0)
+            statistics = integral_image.window_statistics(rois=image_rois[use_tables])
+            # rescaling is linear
+            mean_values = statistics['mean'] * pixel_image.rescale_slope + pixel_image.rescale_intercept
+            sd_values = statistics['SD'] * abs(pixel_image.rescale_slope)
+            for num_of_roi, mean_HU, sd_roi in zip(np.flatnonzero(use_tables), mean_values, sd_values):
+                roi_image_mean_HU[num_of_roi] = mean_HU
+                image_sd[num_of_roi] = sd_roi
+        # iterate through remaining rois in image
+        for num_of_roi in np.flatnonzero(~use_tables):
+            roi_array = pixel_image.window(image_rois[num_of_roi])
             # calculate mean HU
             mean_HU = np.mean(roi_array)
-            roi_image_mean_HU.append(mean_HU)
-
+            roi_image_mean_HU[num_of_roi] = mean_HU
             # calculate SD
-            # build homogen mean matrix
-            mean_matrix = np.ones(shape=np.array(roi_array).shape) * mean_HU
-            # calculate difference between roi image and mean image
-            diff_matrix = roi_array - mean_matrix
-            # flatten diff matrix to access all its elements easier
-            diff_flattened = diff_matrix.ravel()
+            # difference between roi image and its mean
+            # (mean is broadcast, no mean matrix is built)
+            diff_matrix = roi_array - mean_HU
             # calculate SD for current ROI
-            sd_roi = np.sqrt(np.mean([i ** 2 for i in diff_flattened]))
-            image_sd.append(sd_roi)
-        self.all_mean_HU_dict.update({key: roi_image_mean_HU})
-        self.all_SD_dict.update({key: image_sd})
+            image_sd[num_of_roi] = np.sqrt(np.mean(diff_matrix ** 2))
+        return {'mean_HU': roi_image_mean_HU,
+                'SD': image_sd}
 
-        pass
+    def reduce_ensemble_nps(self, accumulator):
 
-    @staticmethod
-    def mean_of_ave_nps(all_average_nps):
-        """
-        Averaging of passed nps values dict
-        among all images in current series folder.
-        :param all_average_nps: dict of lists of dicts
-            Keys : paths to images in current series folder.
-            Values : list range_dict attribute for each ROI.
-                (See attribute range_dict)
-        :return: dict
-            (Key :) 'values' : (Value :) nps list averaged
         """
-        averaged_nps_as_list = []
-        for key in all_average_nps:
-            averaged_nps_as_list.append(all_average_nps[key]['values'])
-            frequens = all_average_nps[key]['frequencies']
-        mean_of_averaged_nps = np.mean(np.array(averaged_nps_as_list), axis=0)
-        mean_of_averaged_nps_dict = {'values': mean_of_averaged_nps,
-                                     'frequencies': frequens}
-        return mean_of_averaged_nps_dict
-
-    @staticmethod
-    def sd_of_dictionary(dict):
-        """
-        Calculate standard deviation of list values of given dict.
-
-        :param dict: dict
-            Keys : whatever keys;
-            Values : lists of numeric values;
+        Build NPS of the series from ensemble 2d-NPS (mean 2d-NPS of all ROIs
+        of all images) in one reduction: radial mean of the ensemble 2d-NPS
+        of each geometry, truncation (if specified) and resampling onto attribute
+        freq_range. NPS of several geometries are averaged weighted by their numbers
+        of ROIs at frequencies, that are inside their frequency ranges.
+
+        :param accumulator: NPSAccumulator object
+            Sums of 2d-NPS of the series.
         :return: dict
-            Keys : the same keys as of dict argument;
-            Values : sd value of respective list.
+            Keys : 'values' - NPS of the series,
+                   'frequencies' - respective frequencies.
         """
 
-        # build array from dictionary
-        sd_dict = {}
-        for key in dict:
-            one_d_array = dict[key]
-            mean_value = np.mean(one_d_array)
-            squared_diff_list = []
-            for item in one_d_array:
-                squared_diff = (item - mean_value) ** 2
-                squared_diff_list.append(squared_diff)
-            sd = np.sqrt(np.mean(squared_diff_list))
-            sd_dict.update({key: sd})
-
-        return sd_dict
+        ranged_values = []
+        weights = []
+        for geometry in accumulator.geometries():
+            shape = geometry['shape']
+            max_size = max(shape)
+            if self.nps_kernel == 'fft2':
+                nps_1d = ProcessROI.radial_mean_stack(geometry['nps_2d'][np.newaxis])[0]
+            else:
+                nps_1d = ProcessROI.radial_mean_half_stack(geometry['nps_2d'][np.newaxis], shape=shape)[0]
+            # calculate respective frequencies (line pairs per cm)
+            nps_dict = {'values': nps_1d,
+                        'frequencies': ProcessROI.nps_frequencies(max_size=max_size,
+                                                                  pixel_spacing=geometry['pixel_spacing'])}
+            if self.useTruncation:
+                nps_dict = self.truncate_nps_freq(dict=nps_dict)
+            ranged_values.append(self.resample_nps_list(list_of_dict=[nps_dict])[0]['values'])
+            weights.append(geometry['count'])
+        # frequencies covered by any geometry
+        max_length = max(len(values) for values in ranged_values)
+        weighted_sum = np.zeros(max_length)
+        sum_of_weights = np.zeros(max_length)
+        for values, weight in zip(ranged_values, weights):
+            weighted_sum[:len(values)] += weight * values
+            sum_of_weights[:len(values)] += weight
+        return {'values': weighted_sum / sum_of_weights,
+                'frequencies': self.freq_range[:max_length]}
 
     def average_roi_nps(self, list_of_dict):
         """
@@ -753,9 +1251,11 @@ class ProcessROI:
         # initialize lists for nps and resp freqs
         values_to_average = []
         resp_freq_to_average = []
+        # collect lengths of 1d-NPS of ROIs in image
+        lengths = [len(roi_item_dict['values']) for roi_item_dict in list_of_dict]
         # get max length of roi nps and its index
-        max_length = max(self.lengths)
-        max_length_idx = np.argmax(self.lengths)
+        max_length = max(lengths)
+        max_length_idx = np.argmax(lengths)
         # iterate through all rois nps in image
         for roi_item_dict in list_of_dict:
             values = roi_item_dict['values']
@@ -783,24 +1283,6 @@ class ProcessROI:
                          'frequencies': averaged_freqs}
         return averaged_dict
 
-    # method is used to get total average values from all_mean_HU_dict and all_sd_dict
-    @staticmethod
-    def mean_of_mean(all_values_dict):
-
-        """
-        Build mean value of numerical values of given dictionary.
-        :param all_values_dict: dict
-            Keys : Any
-            Values : single numerical values
-        :return: mean value of the values
-        """
-
-        mean_of_mean_list = []
-        for key in all_values_dict:
-            mean_of_mean_list.append(np.mean(all_values_dict[key]))
-        mean_of_mean_value = np.mean(mean_of_mean_list)
-        return mean_of_mean_value
-
     def compute_nps(self, array, pixel_spacing):
 
         """
@@ -815,7 +1297,9 @@ class ProcessROI:
             Keys : 'values' - 1d NPS of ROI (not interpolated),
                    'frequencies' - respective frequencies,
                    'AUC' - area under 1d NPS profile,
-                   'integral_of_2d_nps' - as in the name.
+                   'integral_of_2d_nps' - as in the name,
+                   'nps_2d' - 2d-NPS (See static method nps_spectrum_stack),
+                   its image is written by method process_image.
         """
 
         # if image measurements in mm are undefined
@@ -826,55 +1310,104 @@ class ProcessROI:
             self.im_height_in_mm = self.px_height * self.pixel_size_in_mm
         # mean pixel value of whole image
         mean_value = np.mean(array)
-        # transform list into numpy array
-        # to access the array's properties
-        np_arr = np.array(array)
-        # get ROI size
-        roi_width = np_arr.shape[0]
-        roi_height = np_arr.shape[1]
+        # shape of the array (the array is not copied)
+        shape_of_array = np.shape(array)
         # maximal size of the array (height or width)
-        max_size = max(np_arr.shape)
-        # building mean value array (background)
-        mean_arr = mean_value * np.ones(np_arr.shape)
+        max_size = max(shape_of_array)
         # if 2d fitting should be used
         if self.useFitting:
-            # self.polyfit is the 2d-fit of the image
-            detrended_arr = array - self.pol_fit
+            # subtract least squares 2d-fit of the ROI
+            detrended_arr = self.detrender.detrend(array=array)
         else:
-            detrended_arr = array - mean_arr
+            # subtract mean value (background) without building mean value array
+            detrended_arr = array - mean_value
         # create file of detrended image
         # StartClass.create_image_from_2d_array(arr_2d=detrended_arr,
         #                             filename='09.Detrended_images/Detrended_image__' +
         #                                      self.basename + '__.png')
-        # apply FFT to detrended image
-        DFT_list = np.fft.fftshift(np.fft.fft2(detrended_arr))
-        # calculate 2d-NPS
-        # nps = 1 / self.px_width / self.px_height * np.abs(DFT_list)**2
-        # nps = (self.pixel_size_in_mm ** 2) / self.px_width / self.px_height * np.abs(DFT_list) ** 2
-        nps = 1 / roi_height ** 2 / roi_width ** 2 * np.abs(DFT_list) ** 2
-        integral_of_2d_NPS = np.sum(nps)
-
-        # create file of 2d-NPS-image
-        StartClass.create_image_from_2d_array(arr_2d=nps,
-                                              filename='01.2d_NPS_images/NPS_2D__' +
-                                                       self.basename + '__.jpg')
-        # building 1d-NPS from 2d_NPS using radial average
-        nps_1d = ProcessROI.radial_mean(nps)
+        # apply FFT to detrended image and calculate 2d-NPS,
+        # its integral and 1d-NPS (radial average of 2d-NPS)
+        spectrum = ProcessROI.nps_spectrum_stack(detrended_stack=detrended_arr[np.newaxis],
+                                                 kernel=self.nps_kernel)
+        nps = spectrum['nps_2d'][0]
+        integral_of_2d_NPS = spectrum['integral_of_2d_NPS'][0]
+
+        nps_1d = spectrum['nps_1d'][0]
         AUC = np.sum(nps_1d)
         # self.nps_norm = self.norm_array(arr_to_normalize=nps_1d,
         #                                 all_val_array=nps_1d)
         # freqs = np.fft.fftfreq(max_size, self.im_width_in_mm/10/self.px_width)[:max_size // 2]
         # calculate respective frequencies (line pairs per cm)
         # freqs = np.fft.fftfreq(max_size, self.im_width_in_mm/10/self.px_width)[:max_size // 2]
-        freqs = np.fft.fftfreq(max_size, pixel_spacing[0] / 10)[:max_size // 2]
+        freqs = ProcessROI.nps_frequencies(max_size=max_size, pixel_spacing=pixel_spacing[0])
         # dictionary with all NPS- and freq-values, that will be
         # truncated afterwards
         nps_dict = {'values': nps_1d,
                     'frequencies': freqs,
                     'integral_of_2d_NPS': integral_of_2d_NPS,
-                    'AUC': AUC}
+                    'AUC': AUC,
+                    'nps_2d': nps}
         return nps_dict
 
+    def compute_nps_batch(self, arrays, pixel_spacing):
+
+        """
+        Compute 2d and 1d NPS of several pixel arrays at once.
+
+        Equally shaped arrays (e.g. ROIs of mode 'Array_ROIs') are stacked
+        into one 3d-array (shape bucket). Method process_image passes the ROIs
+        of one image, so that ROIs are batched per image, not per series.
+        For each bucket one FFT over the last two axes and one radial
+        reduction are performed. Differently sized ROIs (e.g. of mode
+        'Draw_Diagonal') result in several buckets.
+
+        :param arrays: list of ndarrays (2d)
+            Pixel arrays of ROIs.
+        :param pixel_spacing: tuple of two floats
+            Pixel spacing of dcm-images in y and
+            x direction (same for all arrays).
+        :return: list of dicts
+            For each array in the same order as arrays
+            (See return value of method compute_nps).
+        """
+
+        # sort indices of arrays into shape buckets
+        shape_buckets = {}
+        for num_array, array in enumerate(arrays):
+            shape_buckets.setdefault(np.shape(array), []).append(num_array)
+
+        # list of nps dicts in the order of arrays
+        nps_dicts = [None] * len(arrays)
+        for shape_of_bucket, indices in shape_buckets.items():
+            # stack of ROIs with shape (number of ROIs, rows, columns)
+            stack = np.stack([arrays[num_array] for num_array in indices])
+            # maximal size of the arrays (height or width)
+            max_size = max(shape_of_bucket)
+            # if 2d fitting should be used
+            if self.useFitting:
+                # subtract least squares 2d-fit of each ROI (one matrix product for all ROIs)
+                detrended_stack = self.detrender.detrend_stack(stack=stack)
+            else:
+                # subtract mean value of each ROI (background)
+                detrended_stack = stack - np.mean(stack, axis=(1, 2), keepdims=True)
+            # apply FFT to all detrended ROIs and calculate 2d-NPS,
+            # its integral and 1d-NPS (radial average of 2d-NPS)
+            spectrum = ProcessROI.nps_spectrum_stack(detrended_stack=detrended_stack,
+                                                     kernel=self.nps_kernel)
+            nps_stack = spectrum['nps_2d']
+            integrals_of_2d_NPS = spectrum['integral_of_2d_NPS']
+            nps_1d_stack = spectrum['nps_1d']
+            AUCs = np.sum(nps_1d_stack, axis=1)
+            # calculate respective frequencies (line pairs per cm)
+            freqs = ProcessROI.nps_frequencies(max_size=max_size, pixel_spacing=pixel_spacing[0])
+            for num_in_bucket, num_array in enumerate(indices):
+                nps_dicts[num_array] = {'values': nps_1d_stack[num_in_bucket],
+                                        'frequencies': freqs,
+                                        'integral_of_2d_NPS': integrals_of_2d_NPS[num_in_bucket],
+                                        'AUC': AUCs[num_in_bucket],
+                                        'nps_2d': nps_stack[num_in_bucket]}
+        return nps_dicts
+
     @staticmethod
     def drop_part_of_name(name, pattern_of_dropped_part, dropped_from_end):
 
@@ -1092,20 +1625,9 @@ class ProcessROI:
         worksheet_ave.write(1, 0, 'Lp')
         worksheet_ave.write(1, 0 + 1, 'NPS')
 
-        self.worksheet_averaged.write(0, 0, 'Total average')
-        self.worksheet_averaged.write(1, 0, 'Lp')
-        self.worksheet_averaged.write(1, 0 + 1, 'NPS')
-        # worksheet.write(0, 1, 'ROI_%d' % (1 // 2 + 1))
-        # worksheet.write(0, 1 + 1,
-        #                 '%dx%d px' % (self.roi_size_dict[image_key][1 // 2][0],
-        #                               self.roi_size_dict[image_key][1 // 2][1]))
-
         for frequency, value_nps in zip(freq_arr, val_arr):
             worksheet_ave.write(row, col, frequency)
             worksheet_ave.write(row, col + 1, value_nps)
-
-            self.worksheet_averaged.write(row, col, frequency)
-            self.worksheet_averaged.write(row, col + 1, value_nps)
             row += 1  # next row
 
         # additional information about size of cropped image
@@ -1120,39 +1642,17 @@ class ProcessROI:
         worksheet_ave.write(21 - 4, 1 + 4, self.peak_info_dict_ave['left_dev'])
         worksheet_ave.write(22 - 4, 1 + 4, self.peak_info_dict_ave['right_dev'])
 
-        self.worksheet_averaged.write(19 - 4, 1 + 3, 'max_peak_nps')
-        self.worksheet_averaged.write(20 - 4, 1 + 3, 'max_peak_freq')
-        self.worksheet_averaged.write(19 - 4, 1 + 4, self.peak_info_dict_ave['mean_value'])
-        self.worksheet_averaged.write(20 - 4, 1 + 4, self.peak_info_dict_ave['mean_freq'])
-        self.worksheet_averaged.write(21 - 4, 1 + 3, 'left_dev')
-        self.worksheet_averaged.write(22 - 4, 1 + 3, 'right_dev')
-        self.worksheet_averaged.write(21 - 4, 1 + 4, self.peak_info_dict_ave['left_dev'])
-        self.worksheet_averaged.write(22 - 4, 1 + 4, self.peak_info_dict_ave['right_dev'])
-
         # writing info averaged Mean_HU, averaged SD, and area
         worksheet_ave.write(24 - 4, 1 + 3, 'Int of 2d-NPS')
         worksheet_ave.write(26 - 4, 1 + 3, 'averaged Mean_HU')
         worksheet_ave.write(27 - 4, 1 + 3, 'averaged SD')
 
-        worksheet_ave.write(24 - 4, 1 + 4, np.mean(
-            [self.integral_2d_nps_dict[key] for key in self.integral_2d_nps_dict]
-        ))
+        worksheet_ave.write(24 - 4, 1 + 4, self.series_statistics['integral_of_2d_NPS'].mean)
         worksheet_ave.write(26 - 4, 1 + 4, self.total_mean_HU)
         worksheet_ave.write(27 - 4, 1 + 4, self.total_mean_sd)
 
-        self.worksheet_averaged.write(24 - 4, 1 + 3, 'Int of 2d-NPS')
-        self.worksheet_averaged.write(26 - 4, 1 + 3, 'averaged Mean_HU')
-        self.worksheet_averaged.write(27 - 4, 1 + 3, 'averaged SD')
-
-        self.worksheet_averaged.write(24 - 4, 1 + 4, np.mean(
-            [self.integral_2d_nps_dict[key] for key in self.integral_2d_nps_dict]
-        ))
-        self.worksheet_averaged.write(26 - 4, 1 + 4, self.total_mean_HU)
-        self.worksheet_averaged.write(27 - 4, 1 + 4, self.total_mean_sd)
-
         # make column wider
         worksheet_ave.set_column(first_col=4, last_col=4, width=20)
-        self.worksheet_averaged.set_column(first_col=4, last_col=4, width=20)
 
         # info about averaged mean_HU and SD
         worksheet_ave.write(19 - 4, 1 + 7, 'mean_HU')
@@ -1161,15 +1661,8 @@ class ProcessROI:
         worksheet_ave.write(20 - 4, 1 + 7, self.total_mean_HU)
         worksheet_ave.write(20 - 4, 1 + 8, self.total_mean_sd)
 
-        self.worksheet_averaged.write(19 - 4, 1 + 7, 'mean_HU')
-        self.worksheet_averaged.write(19 - 4, 1 + 8, 'SD')
-        self.worksheet_averaged.write(20 - 4, 1 + 6, 'averaged')
-        self.worksheet_averaged.write(20 - 4, 1 + 7, self.total_mean_HU)
-        self.worksheet_averaged.write(20 - 4, 1 + 8, self.total_mean_sd)
-
         # create a new Chart object
         chart_ave = self.workbook_series.add_chart({'type': 'line'})
-        chart_averaged = self.workbook_averaged.add_chart({'type': 'line'})
         # configure the chart
         chart_ave.add_series({'values': '=%s!$%s$3:$%s$%d' % ('averaged',
                                                               'B',
@@ -1192,25 +1685,124 @@ class ProcessROI:
                                             'display_equation': False,
                                             }})
 
+        chart_ave.set_x_axis({'name': 'Line pairs per cm'})
+        chart_ave.set_y_axis({'name': 'NPS_1D_averaged'})
+        # Insert the chart into the worksheet.
+        worksheet_ave.insert_chart('C1', chart_ave)
+
+    def create_xlsx_sheet_ensemble(self, accumulator):
+
+        """
+        Write NPS of the series built from ensemble 2d-NPS (See method
+        reduce_ensemble_nps) and the geometries of ROIs into worksheet
+        'ensemble' of the xlsx-file of the series (instead of worksheets
+        for each image).
+
+        :param accumulator: NPSAccumulator object
+            Sums of 2d-NPS of the series.
+        :return: nothing
+        """
+
+        worksheet = self.workbook_series.add_worksheet('ensemble')
+        # headers of the table
+        worksheet.write(0, 0, 'ensemble')
+        worksheet.write(1, 0, 'Lp')
+        worksheet.write(1, 1, 'NPS')
+        row = 2
+        for frequency, value_nps in zip(self.mean_of_averaged_nps_dict['frequencies'],
+                                        self.mean_of_averaged_nps_dict['values']):
+            worksheet.write(row, 0, frequency)
+            worksheet.write(row, 1, value_nps)
+            row += 1  # next row
+        # geometries of summed ROIs
+        worksheet.write(1, 3, 'ROI size')
+        worksheet.write(1, 4, 'pixel_spacing')
+        worksheet.write(1, 5, 'number_of_ROIs')
+        for num_geometry, geometry in enumerate(accumulator.geometries()):
+            worksheet.write(num_geometry + 2, 3, '%dx%d px' % geometry['shape'])
+            worksheet.write(num_geometry + 2, 4, geometry['pixel_spacing'])
+            worksheet.write(num_geometry + 2, 5, geometry['count'])
+
+    def write_averaged_results(self, series_result):
+
+        """
+        Write averaged results of current series into worksheet_averaged
+        (of workbook_averaged of current study) and into a row of
+        worksheet_summary.
+
+        Executed by the parent process, also if the series have been processed
+        by a pool of worker processes (see method execute_calc_nps_sorted).
+
+        :param series_result: dict
+            (See return value of method execute_nps_comp)
+        :return: nothing
+        """
+
+        mean_of_averaged_nps_dict = series_result['mean_of_averaged_nps_dict']
+        peak_info_dict_ave = series_result['peak_info_dict_ave']
+        val_arr = mean_of_averaged_nps_dict['values']
+        freq_arr = mean_of_averaged_nps_dict['frequencies']
+
+        # initialization of cells in worksheet
+        row = 2
+        col = 0
+
+        # headers of the table
+        self.worksheet_averaged.write(0, 0, 'Total average')
+        self.worksheet_averaged.write(1, 0, 'Lp')
+        self.worksheet_averaged.write(1, 0 + 1, 'NPS')
+
+        for frequency, value_nps in zip(freq_arr, val_arr):
+            self.worksheet_averaged.write(row, col, frequency)
+            self.worksheet_averaged.write(row, col + 1, value_nps)
+            row += 1  # next row
+
+        # characteristics of nps curve
+        self.worksheet_averaged.write(19 - 4, 1 + 3, 'max_peak_nps')
+        self.worksheet_averaged.write(20 - 4, 1 + 3, 'max_peak_freq')
+        self.worksheet_averaged.write(19 - 4, 1 + 4, peak_info_dict_ave['mean_value'])
+        self.worksheet_averaged.write(20 - 4, 1 + 4, peak_info_dict_ave['mean_freq'])
+        self.worksheet_averaged.write(21 - 4, 1 + 3, 'left_dev')
+        self.worksheet_averaged.write(22 - 4, 1 + 3, 'right_dev')
+        self.worksheet_averaged.write(21 - 4, 1 + 4, peak_info_dict_ave['left_dev'])
+        self.worksheet_averaged.write(22 - 4, 1 + 4, peak_info_dict_ave['right_dev'])
+
+        # writing info averaged Mean_HU, averaged SD, and area
+        self.worksheet_averaged.write(24 - 4, 1 + 3, 'Int of 2d-NPS')
+        self.worksheet_averaged.write(26 - 4, 1 + 3, 'averaged Mean_HU')
+        self.worksheet_averaged.write(27 - 4, 1 + 3, 'averaged SD')
+
+        self.worksheet_averaged.write(24 - 4, 1 + 4, series_result['mean_integral_of_2d_NPS'])
+        self.worksheet_averaged.write(26 - 4, 1 + 4, series_result['total_mean_HU'])
+        self.worksheet_averaged.write(27 - 4, 1 + 4, series_result['total_mean_sd'])
+
+        # make column wider
+        self.worksheet_averaged.set_column(first_col=4, last_col=4, width=20)
+
+        # info about averaged mean_HU and SD
+        self.worksheet_averaged.write(19 - 4, 1 + 7, 'mean_HU')
+        self.worksheet_averaged.write(19 - 4, 1 + 8, 'SD')
+        self.worksheet_averaged.write(20 - 4, 1 + 6, 'averaged')
+        self.worksheet_averaged.write(20 - 4, 1 + 7, series_result['total_mean_HU'])
+        self.worksheet_averaged.write(20 - 4, 1 + 8, series_result['total_mean_sd'])
+
+        # create a new Chart object
+        chart_averaged = self.workbook_averaged.add_chart({'type': 'line'})
+        # configure the chart
         chart_averaged.add_series({'values': '=%s!$%s$3:$%s$%d' % (self.serie_part,
                                                                    'B',
                                                                    'B',
-                                                                   len(self.mean_of_averaged_nps_dict['frequencies']) +
+                                                                   len(mean_of_averaged_nps_dict['frequencies']) +
                                                                    2),
                                    'categories': '%s!$%s$3:$%s$%d' % (self.serie_part,
                                                                       'A',
                                                                       'A',
-                                                                      len(self.mean_of_averaged_nps_dict[
+                                                                      len(mean_of_averaged_nps_dict[
                                                                               'frequencies']) + 2),
                                    'name': 'Total Average',
                                    'legend': False,
                                    })
 
-        chart_ave.set_x_axis({'name': 'Line pairs per cm'})
-        chart_ave.set_y_axis({'name': 'NPS_1D_averaged'})
-        # Insert the chart into the worksheet.
-        worksheet_ave.insert_chart('C1', chart_ave)
-
         chart_averaged.set_x_axis({'name': 'Line pairs per cm'})
         chart_averaged.set_y_axis({'name': 'NPS_1D_averaged'})
         # Insert the chart into the worksheet.
@@ -1231,23 +1823,244 @@ class ProcessROI:
         self.worksheet_summary['%s%d' % (self.col_number, row_to_write)] = self.num_folder + 1
         self.worksheet_summary['%s%d' % (self.col_folder, row_to_write)] = name_of_folder
         self.worksheet_summary['%s%d' % (self.col_series, row_to_write)] = name_of_series
-        self.worksheet_summary['%s%d' % (self.col_peak_freq, row_to_write)] = self.peak_info_dict_ave['mean_freq']
-        self.worksheet_summary['%s%d' % (self.col_peak_value, row_to_write)] = self.peak_info_dict_ave['mean_value']
-        self.worksheet_summary['%s%d' % (self.col_left_dev, row_to_write)] = self.peak_info_dict_ave['left_dev']
-        self.worksheet_summary['%s%d' % (self.col_right_dev, row_to_write)] = self.peak_info_dict_ave['right_dev']
-        self.worksheet_summary['%s%d' % (self.col_area, row_to_write)] = np.mean(
-            [self.auc_dict[key] for key in self.auc_dict]
-        )
-        self.worksheet_summary['%s%d' % (self.col_int_2d_nps, row_to_write)] = np.mean(
-            [self.integral_2d_nps_dict[key] for key in self.integral_2d_nps_dict]
-        )
-        self.worksheet_summary['%s%d' % (self.col_ave_m_HU, row_to_write)] = self.total_mean_HU
-        self.worksheet_summary['%s%d' % (self.col_ave_SD, row_to_write)] = self.total_mean_sd
+        self.worksheet_summary['%s%d' % (self.col_peak_freq, row_to_write)] = peak_info_dict_ave['mean_freq']
+        self.worksheet_summary['%s%d' % (self.col_peak_value, row_to_write)] = peak_info_dict_ave['mean_value']
+        self.worksheet_summary['%s%d' % (self.col_left_dev, row_to_write)] = peak_info_dict_ave['left_dev']
+        self.worksheet_summary['%s%d' % (self.col_right_dev, row_to_write)] = peak_info_dict_ave['right_dev']
+        self.worksheet_summary['%s%d' % (self.col_area, row_to_write)] = series_result['mean_AUC']
+        self.worksheet_summary['%s%d' % (self.col_int_2d_nps, row_to_write)] = \
+            series_result['mean_integral_of_2d_NPS']
+        self.worksheet_summary['%s%d' % (self.col_ave_m_HU, row_to_write)] = series_result['total_mean_HU']
+        self.worksheet_summary['%s%d' % (self.col_ave_SD, row_to_write)] = series_result['total_mean_sd']
 
         for num_metadata, (metadata_tag, col_metadata) in enumerate(
                 zip(self.metadata_headers, self.metadata_columns)
         ):
-            self.worksheet_summary['%s%d' % (col_metadata, row_to_write)] = self.metadata[metadata_tag]
+            # tags missing in metadata of the series leave the cell empty
+            self.worksheet_summary['%s%d' % (col_metadata, row_to_write)] = \
+                series_result['metadata'].get(metadata_tag, '')
+
+    @staticmethod
+    def nps_spectrum_stack(detrended_stack, kernel='fft2'):
+
+        """
+        Compute 2d-NPS, its integral and 1d-NPS (radial mean of 2d-NPS)
+        of stack of equally shaped detrended ROIs.
+
+        :param detrended_stack: ndarray (3d)
+            Detrended pixel arrays of ROIs with shape
+            (number of ROIs, rows, columns).
+        :param kernel: string
+            'fft2' - full complex spectrum is computed (shifted, zero frequency
+                in the center);
+            'rfft2' - only the half-plane spectrum (not shifted, columns of non-negative
+                x-frequencies) is computed. As the pixel arrays are real-valued,
+                the omitted half is the mirrored one (Hermitian symmetry), so that
+                the mirrored bins are taken into account by weighting
+                (see static method radial_bins_half).
+        :return: dict
+            Keys : 'nps_2d' - 2d-NPS of each ROI (for kernel 'rfft2' only the half plane,
+                              see static method full_nps_2d),
+                   'integral_of_2d_NPS' - integral of 2d-NPS of each ROI,
+                   'nps_1d' - 1d-NPS of each ROI.
+        """
+
+        roi_rows = detrended_stack.shape[1]
+        roi_columns = detrended_stack.shape[2]
+        if kernel == 'fft2':
+            # apply FFT to detrended ROIs
+            DFT_stack = np.fft.fftshift(np.fft.fft2(detrended_stack, axes=(1, 2)), axes=(1, 2))
+            # calculate 2d-NPS
+            nps_stack = 1 / roi_rows ** 2 / roi_columns ** 2 * np.abs(DFT_stack) ** 2
+            integrals_of_2d_NPS = np.sum(nps_stack, axis=(1, 2))
+            # building 1d-NPS from 2d_NPS using radial average
+            nps_1d_stack = ProcessROI.radial_mean_stack(nps_stack)
+        elif kernel == 'rfft2':
+            # apply FFT for real input to detrended ROIs
+            DFT_stack = np.fft.rfft2(detrended_stack, axes=(1, 2))
+            # calculate half plane of 2d-NPS
+            nps_stack = 1 / roi_rows ** 2 / roi_columns ** 2 * np.abs(DFT_stack) ** 2
+            bins = ProcessROI.cached_radial_bins(shape=(roi_rows, roi_columns), kernel=kernel)
+            # mirrored columns count twice
+            integrals_of_2d_NPS = np.sum(nps_stack * bins['multiplicity'], axis=(1, 2))
+            # building 1d-NPS from half plane of 2d_NPS using weighted radial average
+            nps_1d_stack = ProcessROI.radial_mean_half_stack(nps_stack, shape=(roi_rows, roi_columns))
+        else:
+            raise ValueError('Unknown NPS kernel: %s' % kernel)
+        return {'nps_2d': nps_stack,
+                'integral_of_2d_NPS': integrals_of_2d_NPS,
+                'nps_1d': nps_1d_stack}
+
+    @staticmethod
+    def full_nps_2d(nps_2d, shape, kernel='fft2'):
+
+        """
+        Build shifted 2d-NPS of full plane (zero frequency in the center),
+        e.g. to create image of 2d-NPS.
+
+        :param nps_2d: ndarray (2d)
+            2d-NPS as computed by static method nps_spectrum_stack.
+        :param shape: tuple of two ints
+            Shape of the ROI.
+        :param kernel: string
+            Kernel nps_2d has been computed with ('fft2' or 'rfft2').
+        :return: ndarray (2d)
+            Shifted 2d-NPS of full plane.
+        """
+
+        if kernel == 'fft2':
+            return nps_2d
+        roi_rows = shape[0]
+        roi_columns = shape[1]
+        # indices of the mirrored bins: NPS(ky, kx) = NPS(-ky, -kx)
+        ky = (-np.arange(roi_rows)) % roi_rows
+        kx = (-np.arange(roi_columns)) % roi_columns
+        full_nps = np.empty(shape)
+        full_nps[:, :nps_2d.shape[1]] = nps_2d
+        full_nps[:, nps_2d.shape[1]:] = nps_2d[ky[:, np.newaxis], kx[np.newaxis, nps_2d.shape[1]:]]
+        return np.fft.fftshift(full_nps)
+
+    @staticmethod
+    def radial_bins(shape):
+
+        """
+        Build radius bins of 2d-array with given shape.
+
+        Pixel belongs to radius r, if r - 0.5 <= R < r + 0.5, where R
+        is the distance of the pixel from the center of the array
+        (the zero frequency of the shifted 2d-NPS).
+
+        :param shape: tuple of two ints
+            Shape of 2d-NPS.
+        :return: dict
+            Keys : 'indices' - radius index of each pixel inside the largest radius
+                               (flattened array),
+                   'inside' - boolean mask of these pixels (flattened array),
+                   'counts' - number of pixels in each radius bin,
+                   'num_bins' - number of radii: 0, 1, ..., max(shape) // 2,
+                   'center' - row and column index of the center.
+        """
+
+        image_height = shape[0]
+        image_width = shape[1]
+        center_x = image_width // 2
+        center_y = image_height // 2
+        max_size = max(image_height, image_width)
+        # number of radii: 0, 1, ..., max_size // 2
+        num_bins = max_size // 2 + 1
+        # integer radius index of each pixel
+        y, x = np.ogrid[:image_height, :image_width]
+        R = np.sqrt((x - center_x) ** 2 + (y - center_y) ** 2)
+        radius_idx = np.floor(R + 0.5).astype(np.intp).ravel()
+        # pixels in the corners lie beyond the largest radius
+        inside = radius_idx < num_bins
+        radius_idx = radius_idx[inside]
+        # number of pixels in each radius bin
+        bin_counts = np.bincount(radius_idx, minlength=num_bins)
+        return {'indices': radius_idx,
+                'inside': inside,
+                'counts': bin_counts,
+                'num_bins': num_bins,
+                'center': (center_y, center_x)}
+
+    @staticmethod
+    def radial_bins_half(shape):
+
+        """
+        Build radius bins of not shifted half-plane spectrum
+        (see kernel 'rfft2' of static method nps_spectrum_stack)
+        of 2d-array with given shape.
+
+        Each bin of the half plane gets the radius, it would have in the
+        shifted full plane, and a multiplicity: 2 for columns, whose mirrored
+        column is omitted, 1 for zero frequency column and (for even number
+        of columns) Nyquist frequency column.
+
+        :param shape: tuple of two ints
+            Shape of the ROI (full plane).
+        :return: dict
+            Keys : 'indices', 'inside', 'num_bins' - as for static method radial_bins
+                   (for half plane),
+                   'weights' - multiplicity of each pixel inside the largest radius
+                               (flattened array),
+                   'multiplicity' - multiplicity of each column of half plane,
+                   'counts' - number of pixels of full plane in each radius bin.
+        """
+
+        image_height = shape[0]
+        image_width = shape[1]
+        max_size = max(image_height, image_width)
+        # number of radii: 0, 1, ..., max_size // 2
+        num_bins = max_size // 2 + 1
+        # distances of not shifted bins from the zero frequency
+        # as they are in the shifted full plane
+        ky = np.arange(image_height)
+        kx = np.arange(image_width // 2 + 1)
+        dy = (ky + image_height // 2) % image_height - image_height // 2
+        dx = (kx + image_width // 2) % image_width - image_width // 2
+        R = np.sqrt(dx[np.newaxis, :] ** 2 + dy[:, np.newaxis] ** 2)
+        radius_idx = np.floor(R + 0.5).astype(np.intp).ravel()
+        # pixels in the corners lie beyond the largest radius
+        inside = radius_idx < num_bins
+        radius_idx = radius_idx[inside]
+        # columns, whose mirrored column is not contained in half plane, count twice
+        multiplicity = np.where((kx > 0) & (2 * kx != image_width), 2., 1.)
+        weights = np.broadcast_to(multiplicity, (image_height, kx.size)).ravel()[inside]
+        # number of pixels of full plane in each radius bin
+        bin_counts = np.bincount(radius_idx, weights=weights, minlength=num_bins)
+        return {'indices': radius_idx,
+                'inside': inside,
+                'weights': weights,
+                'multiplicity': multiplicity,
+                'counts': bin_counts,
+                'num_bins': num_bins}
+
+    @staticmethod
+    def cached_radial_bins(shape, kernel):
+
+        """
+        Get radius bins of 2d-NPS of ROIs with given shape from attribute
+        geometry_cache (built once per shape).
+
+        :param shape: tuple of two ints
+            Shape of the ROIs.
+        :param kernel: string
+            'fft2' - bins of shifted full plane (See static method radial_bins);
+            'rfft2' - bins of not shifted half plane (See static method radial_bins_half).
+        :return: dict
+            (See return value of respective static method, arrays are read-only)
+        """
+
+        shape = (int(shape[0]), int(shape[1]))
+        if kernel == 'fft2':
+            build_function = fut.partial(ProcessROI.radial_bins, shape=shape)
+        elif kernel == 'rfft2':
+            build_function = fut.partial(ProcessROI.radial_bins_half, shape=shape)
+        else:
+            raise ValueError('Unknown NPS kernel: %s' % kernel)
+        return ProcessROI.geometry_cache.get(key=('radial_bins', kernel) + shape,
+                                             build_function=build_function)
+
+    @staticmethod
+    def nps_frequencies(max_size, pixel_spacing):
+
+        """
+        Get frequencies (line pairs per cm) of 1d-NPS of ROIs from attribute
+        geometry_cache (built once per size of ROIs and pixel spacing).
+
+        :param max_size: int
+            Maximal size of ROIs (height or width).
+        :param pixel_spacing: float
+            Pixel spacing of dcm-image in y direction in mm.
+        :return: ndarray (1d)
+            Non-negative frequencies of FFT of max_size samples (read-only).
+        """
+
+        max_size = int(max_size)
+        pixel_spacing = float(pixel_spacing)
+        return ProcessROI.geometry_cache.get(key=('frequencies', max_size, pixel_spacing),
+                                             build_function=lambda: np.fft.fftfreq(
+                                                 max_size, pixel_spacing / 10)[:max_size // 2])
 
     @staticmethod
     def radial_mean(array):
@@ -1262,22 +2075,77 @@ class ProcessROI:
             Radial mean of the 2d-NPS.
         """
 
-        image = array
-        image_height = array.shape[0]
-        image_width = array.shape[1]
-        center_x = image_width // 2
-        center_y = image_height // 2
-        max_size = max(image_height, image_width)
-        # create array of radii
-        x, y = np.meshgrid(np.arange(image.shape[1]), np.arange(image.shape[0]))
-        R = np.sqrt((x - center_x) ** 2 + (y - center_y) ** 2)
+        return ProcessROI.radial_mean_stack(np.asarray(array)[np.newaxis])[0]
+
+    @staticmethod
+    def radial_mean_stack(stack):
+
+        """
+        Build radial means of stack of equally shaped 2d-arrays
+        in one binned reduction.
+
+        :param stack: ndarray (3d)
+            Two-dimensional NPS of several ROIs with shape
+            (number of ROIs, rows, columns).
+        :return: ndarray (2d)
+            Radial mean of each 2d-NPS with shape
+            (number of ROIs, number of radii).
+        """
 
-        # calculate the mean
-        f = lambda r: image[(R >= r - .5) & (R < r + .5)].mean()
-        # r = np.linspace(1, 302, num=302)
-        r = np.linspace(0, max_size // 2, num=max_size // 2 + 1)
-        mean = np.vectorize(f)(r)
-        mean = [array[center_y][center_x]] + mean
+        num_rois = stack.shape[0]
+        bins = ProcessROI.cached_radial_bins(shape=stack.shape[1:], kernel='fft2')
+        num_bins = bins['num_bins']
+        center_y, center_x = bins['center']
+        # values inside the largest radius
+        values = stack.reshape(num_rois, -1)[:, bins['inside']]
+        # shift bin indices of each ROI, so that one bincount serves all ROIs
+        stack_idx = bins['indices'] + num_bins * np.arange(num_rois)[:, np.newaxis]
+        # sum of values in each radius bin
+        bin_sums = np.bincount(stack_idx.ravel(), weights=values.ravel(),
+                               minlength=num_rois * num_bins).reshape(num_rois, num_bins)
+        # calculate the mean (empty bins result in nan as before)
+        with np.errstate(invalid='ignore', divide='ignore'):
+            mean = bin_sums / bins['counts']
+        # value in the center (zero frequency) is added to each radius,
+        # as it has been done by the former implementation ([value] + ndarray)
+        mean = mean + stack[:, center_y, center_x][:, np.newaxis]
+        return mean
+
+    @staticmethod
+    def radial_mean_half_stack(stack, shape):
+
+        """
+        Build radial means of stack of half-plane 2d-NPS
+        (see kernel 'rfft2' of static method nps_spectrum_stack).
+        Result is the same as of static method radial_mean_stack for
+        the respective full-plane 2d-NPS.
+
+        :param stack: ndarray (3d)
+            Half planes of 2d-NPS of several ROIs with shape
+            (number of ROIs, rows, columns // 2 + 1).
+        :param shape: tuple of two ints
+            Shape of the ROIs (full plane).
+        :return: ndarray (2d)
+            Radial mean of each 2d-NPS with shape
+            (number of ROIs, number of radii).
+        """
+
+        num_rois = stack.shape[0]
+        bins = ProcessROI.cached_radial_bins(shape=shape, kernel='rfft2')
+        num_bins = bins['num_bins']
+        # values inside the largest radius weighted with their multiplicity
+        values = stack.reshape(num_rois, -1)[:, bins['inside']] * bins['weights']
+        # shift bin indices of each ROI, so that one bincount serves all ROIs
+        stack_idx = bins['indices'] + num_bins * np.arange(num_rois)[:, np.newaxis]
+        # sum of values in each radius bin
+        bin_sums = np.bincount(stack_idx.ravel(), weights=values.ravel(),
+                               minlength=num_rois * num_bins).reshape(num_rois, num_bins)
+        # calculate the mean (empty bins result in nan as before)
+        with np.errstate(invalid='ignore', divide='ignore'):
+            mean = bin_sums / bins['counts']
+        # value at zero frequency is added to each radius
+        # (see static method radial_mean_stack)
+        mean = mean + stack[:, 0, 0][:, np.newaxis]
         return mean
 
     def polyfit2d(self, x, y, z):
@@ -1323,60 +2191,119 @@ class ProcessROI:
         out = i * a + j * b + i * j * c + d
         return out
 
+    def resample_nps_list(self, list_of_dict):
+
+        """
+        Interpolate several not interpolated 1d-NPS onto attribute freq_range.
+
+        1d-NPS with the same frequencies (e.g. of equally shaped ROIs)
+        are interpolated in one call of static method resample_nps.
+
+        :param list_of_dict: list of dicts
+            Keys : 'values', 'frequencies' (See return value of method compute_nps
+            or of method truncate_nps_freq).
+        :return: list of dicts
+            For each dict in list_of_dict in the same order
+            (See return value of static method resample_nps).
+        """
+
+        # group 1d-NPS by their frequencies
+        freq_groups = {}
+        for num_dict, nps_dict in enumerate(list_of_dict):
+            freq_array = np.asarray(nps_dict['frequencies'], dtype=float)
+            freq_groups.setdefault(freq_array.tobytes(), []).append(num_dict)
+
+        ranged_dicts = [None] * len(list_of_dict)
+        for indices in freq_groups.values():
+            freq_array = np.asarray(list_of_dict[indices[0]]['frequencies'], dtype=float)
+            # only values with respective frequencies are interpolated
+            values_stack = np.array([np.asarray(list_of_dict[num_dict]['values'], dtype=float)[:freq_array.size]
+                                     for num_dict in indices]).reshape(len(indices), freq_array.size)
+            ranged = ProcessROI.resample_nps(values_stack=values_stack,
+                                             freq_array=freq_array,
+                                             freq_range=self.freq_range)
+            for num_in_group, num_dict in enumerate(indices):
+                ranged_dicts[num_dict] = {'values': ranged['values'][num_in_group],
+                                          'frequencies': ranged['frequencies']}
+        return ranged_dicts
+
+    @staticmethod
+    def resample_nps(values_stack, freq_array, freq_range):
+
+        """
+        Linearly interpolate 1d-NPS with equal frequencies onto freq_range.
+
+        Frequencies of freq_range coinciding with frequencies of freq_array
+        take the respective values, interpolated negative values are set
+        to zero and freq_range is cut at the first frequency, that is not
+        inside of freq_array (i.e. beyond the Nyquist frequency of the ROI).
+
+        :param values_stack: ndarray (2d)
+            Not interpolated 1d-NPS with shape (number of NPS, size of freq_array).
+        :param freq_array: ndarray (1d)
+            Not interpolated ascending frequencies of the 1d-NPS.
+        :param freq_range: ndarray (1d)
+            Ascending frequencies to interpolate the 1d-NPS onto.
+        :return: dict
+            Keys : 'values' - interpolated 1d-NPS with shape
+                              (number of NPS, number of used frequencies),
+                   'frequencies' - used frequencies of freq_range.
+        """
+
+        # weights depend only on frequencies (e.g. size of ROIs and pixel spacing)
+        weights = ProcessROI.geometry_cache.get(key=('resampling', freq_array.tobytes(), freq_range.tobytes()),
+                                                build_function=fut.partial(ProcessROI.resampling_weights,
+                                                                           freq_array=freq_array,
+                                                                           freq_range=freq_range))
+        lower_values = values_stack[:, weights['lower_idx']]
+        interpolated = lower_values + weights['position'] * (values_stack[:, weights['upper_idx']] - lower_values)
+        interpolated = np.where(weights['is_exact'], lower_values, interpolated)
+        # negative NPS values are set to zero
+        interpolated = np.where(interpolated < 0, 0, interpolated)
+        return {'values': interpolated,
+                'frequencies': weights['frequencies']}
+
     @staticmethod
-    def nps_equation(nps_array):
-        """Input: not ranged nps array (with larger distance between
-        samples). Return list of tuples, containing slope and bias of
-        line connecting each two points of nps array"""
-        line_equations = []
-        for s in range(len(nps_array) - 1):
-            line_equations.append(ProcessROI.determine_line_equation(point_index_1=s,
-                                                                     point_index_2=s + 1,
-                                                                     point_val_1=nps_array[s],
-                                                                     point_val_2=nps_array[s + 1]))
-        return line_equations
-
-    def get_current_nps(self, freq_value, freq_array):
-
-        """
-        Get NPS value respective to frequency in freq range.
-
-        :param freq_value: float
-            Current frequency value of freq_range.
-        :param freq_array: list of floats
-            Not interpolated list of NPS frequencies.
-        :return: float
-            Interpolated value of NPS respective to given freq_value.
-        """
-
-        """
-        using equations of lines between points of unranged NPS array"""
-        # all frequencies, that less than freq_value
-        less_values = [i for i in freq_array if i <= freq_value]
-        # all frequencies, that greater than freq_value
-        greater_values = [i for i in freq_array if i >= freq_value]
-        # lower boundary freq value
-        min_bound_val = max(less_values)
-        # upper boundary freq value
-        max_bound_val = min(greater_values)
-        # lower boundary index
-        min_bound_idx = list(freq_array).index(min_bound_val)
-        max_bound_idx = list(freq_array).index(max_bound_val)
-        line_prop = ProcessROI.determine_line_equation(point_index_1=min_bound_val,
-                                                       point_index_2=max_bound_val,
-                                                       point_val_1=self.new_dict['values'][min_bound_idx],
-                                                       point_val_2=self.new_dict['values'][max_bound_idx])
-        if min_bound_val == max_bound_val:
-            current_nps = self.new_dict['values'][min_bound_idx]
+    def resampling_weights(freq_array, freq_range):
+
+        """
+        Build indices and weights of linear interpolation from freq_array
+        onto freq_range (See static method resample_nps).
+
+        :param freq_array: ndarray (1d)
+            Not interpolated ascending frequencies of the 1d-NPS.
+        :param freq_range: ndarray (1d)
+            Ascending frequencies to interpolate the 1d-NPS onto.
+        :return: dict
+            Keys : 'frequencies' - used frequencies of freq_range,
+                   'lower_idx', 'upper_idx' - indices of lower and upper boundary
+                                              frequencies in freq_array,
+                   'position' - relative position between boundary frequencies,
+                   'is_exact' - whether frequency coincides with frequency of freq_array.
+        """
+
+        # number of frequencies of freq_range inside of freq_array
+        if freq_array.size == 0 or freq_range[0] < freq_array[0]:
+            num_freqs = 0
         else:
-            current_nps = line_prop[0] * freq_value + line_prop[1]
-        # print('min bound value: ', self.new_dict['values'][min_bound_idx],
-        #       '  freq_value:  ', self.new_dict['values'][max_bound_idx],
-        #       'min bound index: ', min_bound_idx, '\n',
-        #       'max bound value: ', max_bound_val, 'max bound index:  ', max_bound_idx)
-        if current_nps < 0:
-            current_nps = 0
-        return current_nps
+            num_freqs = np.searchsorted(freq_range, freq_array[-1], side='right')
+        freqs = freq_range[:num_freqs]
+        # indices of lower and upper boundary frequencies
+        lower_idx = np.clip(np.searchsorted(freq_array, freqs, side='right') - 1, 0, freq_array.size - 1)
+        upper_idx = np.minimum(lower_idx + 1, freq_array.size - 1)
+        lower_freq = freq_array[lower_idx]
+        # frequencies of freq_range coinciding with frequencies of freq_array
+        is_exact = lower_freq == freqs
+        # relative position between boundary frequencies
+        freq_distance = freq_array[upper_idx] - lower_freq
+        with np.errstate(invalid='ignore', divide='ignore'):
+            position = np.where(is_exact, 0., (freqs - lower_freq) / freq_distance)
+        # copy of used frequencies (cached arrays are read-only)
+        return {'frequencies': np.array(freqs),
+                'lower_idx': lower_idx,
+                'upper_idx': upper_idx,
+                'position': position,
+                'is_exact': is_exact}
 
     def prepare_f_2(self, xy, a, b, c, d, e, f, g, h, k):
         """Auxiliar function for 2d-fitting"""
@@ -1390,7 +2317,8 @@ class ProcessROI:
     def create_pol_fit(self, array):
 
         """
-        Create 2d fit of current ROI, either of first or of second order.
+        Create 2d fit of current ROI, either of first or of second order
+        (linear least squares, see class PolynomialDetrender).
 
         :param array: ndarray (2d)
             Pixel array of current ROI.
@@ -1398,23 +2326,11 @@ class ProcessROI:
             Fitted pixel array.
         """
 
-        self.pol_fit = []
+        if self.detrender is None:
+            self.detrender = PolynomialDetrender(order=self.fit_order, cache=ProcessROI.geometry_cache)
         self.image_width_1 = array.shape[1]
         self.image_height_1 = array.shape[0]
-        x = np.linspace(0, self.image_width_1 - 1, num=self.image_width_1)
-        y = np.linspace(0, self.image_height_1 - 1, num=self.image_height_1)
-        z = array[0: self.image_height_1, 0: self.image_width_1]
-        xy = np.arange(z.size)
-        if self.fit_order == 1:
-            mvfs = np.ravel(z)
-            res = opt.curve_fit(self.prepare_f_1, xy, np.ravel(z))
-            z_est = self.prepare_f_1(xy, *res[0])
-        else:
-            mvfs = np.ravel(z)
-            res = opt.curve_fit(self.prepare_f_2, xy, np.ravel(z))
-            z_est = self.prepare_f_2(xy, *res[0])
-
-        self.pol_fit = z_est.reshape(self.image_height_1, self.image_width_1)
+        self.pol_fit = self.detrender.fit_stack(stack=array[np.newaxis])[0]
         # self.fitting = np.array(self.polyfit2d(x, y, z))
         # for item_fit_ind in range(self.fitting.shape[1]):
         #     self.pol_fit_sub = self.polyval2d(x, y, self.fitting[:, item_fit_ind])
@@ -1452,39 +2368,6 @@ class ProcessROI:
                     'frequencies': truncated_freqs}
         return new_dict
 
-    @staticmethod
-    def determine_line_equation(*,
-                                point_val_1,
-                                point_index_1,
-                                point_val_2,
-                                point_index_2):
-
-        """
-        Find slope and bias (shift) of the line containing two passed points.
-
-        :param point_val_1: float
-            y value of first point.
-        :param point_index_1: float
-            x value of first point.
-        :param point_val_2: float
-            y value of second point.
-        :param point_index_2: float
-            x value of second point.
-        :return: tuple of floats
-            Slope and bias of the aforementioned line.
-        """
-
-        # determination of line equation
-        # based on two points of the line
-        if point_index_1 == point_index_2:
-            slope = 1
-            shift = 0
-        else:
-            slope = (point_val_2 - point_val_1) / (point_index_2 - point_index_1)
-            shift = point_val_1 - slope * point_index_1
-
-        return slope, shift
-
     @staticmethod
     def collect_all_max_peaks_nps(dict):
 
@@ -1541,7 +2424,7 @@ class ProcessROI:
                 'indices': max_ind_array,  # [1:],
                 'frequencies': resp_freq_max}  # [1:]}
 
-    def handle_peak_info(self, peak_dict, all_val_arr, all_freq_arr):
+    def handle_peak_info(self, peak_dict, all_val_arr, all_freq_arr, basename):
 
         """
         Extract peak information from peak_dict.
@@ -1552,6 +2435,8 @@ class ProcessROI:
             List of values from which peak_dict has been built.
         :param all_freq_arr: list
             List of respective frequencies.
+        :param basename: string
+            Name of image file or series printed, if peak cannot be handled.
         :return: dict
          Dict with peak information:
             Keys : 'mean_value' - peak NPS value,
@@ -1593,7 +2478,7 @@ class ProcessROI:
             except ValueError:
                 print('peak dict: ', peak_dict)
                 print('all values: ', all_val_arr)
-                print('file: ', self.basename)
+                print('file: ', basename)
         else:
             mean_distr = max(all_val_arr)
             index_max = list(all_val_arr).index(mean_distr)
@@ -1606,7 +2491,7 @@ class ProcessROI:
                 # index_max_peak = peak_val_arr.index(mean_distr)
                 mean_freq = all_freq_arr[list(all_val_arr).index(mean_distr)]
             except ValueError:
-                print('file:  ', self.basename)
+                print('file:  ', basename)
                 print('peak dict: ', peak_dict)
                 print('mean:   ', mean_distr)
         else:
@@ -0,0 +1,236 @@
+from imports_nps import *
+
+
+class ROITemplate:
+
+    """
+    Compact storage of ROIs of all images to be analyzed.
+
+    ROIs are stored once as integer array of shape (number of ROIs, 4)
+    for the whole data set; series folders or single images, whose ROIs differ,
+    get their own arrays (overrides). All images without override share the
+    same read-only array, no coordinates are copied per image.
+
+    Read access is the same as to a dict mapping paths of images to their ROIs
+    (keys, iteration, len, in, [], items), so that an object of this class
+    is used as attribute all_roi_dict of class GUI (See class ProcessROI).
+
+    Attributes
+    ----------
+    files : dict
+        Keys : absolute paths to images to be analyzed (in the order of filelist);
+        Values : None.
+
+    rois : ndarray (2d, int64)
+        ROIs of the whole data set: x and y coordinates of left upper
+        and of right lower corner of each ROI (one row for each ROI).
+
+    series_rois : dict of ndarrays
+        Keys : absolute paths to series folders;
+        Values : ROIs of the series (as attribute rois).
+
+    image_rois : dict of ndarrays
+        Keys : absolute paths to images;
+        Values : ROIs of the image (as attribute rois).
+
+    Methods
+    -------
+    append(self, coord)
+        Append ROI to ROIs of the whole data set.
+
+    remove_last(self)
+        Remove last ROI of the whole data set.
+
+    set_series_rois(self, series_folder, rois)
+        Specify ROIs of one series folder.
+
+    set_image_rois(self, image_file, rois)
+        Specify ROIs of one image.
+
+    rois_of_image(self, image_file)
+        Get ROIs of image.
+
+    update(self, roi_dict)
+        Specify ROIs of several images (as dict.update).
+
+    @staticmethod
+    roi_array(rois)
+        Convert ROIs into read-only integer array.
+    """
+
+    def __init__(self, files, rois=()):
+
+        """
+        :param files: iterable of strings
+            Absolute paths to images to be analyzed.
+        :param rois: iterable of tuples of four ints
+            ROIs of the whole data set (See attribute rois).
+        """
+
+        self.files = dict.fromkeys(files)
+        self.rois = ROITemplate.roi_array(rois)
+        self.series_rois = {}
+        self.image_rois = {}
+
+    @staticmethod
+    def roi_array(rois):
+
+        """
+        Convert ROIs into read-only integer array of shape (number of ROIs, 4).
+
+        :param rois: iterable of tuples of four ints or ndarray
+            Coordinates of ROIs.
+        :return: ndarray (2d, int64)
+        """
+
+        array = np.array(rois, dtype=np.int64).reshape(-1, 4)
+        # arrays are shared by all images
+        array.flags.writeable = False
+        return array
+
+    def append(self, coord):
+
+        """
+        Append ROI to ROIs of the whole data set.
+
+        :param coord: tuple of four ints
+            (See attribute rois)
+        :return: nothing
+        """
+
+        self.rois = ROITemplate.roi_array(np.vstack([self.rois, ROITemplate.roi_array(coord)]))
+
+    def remove_last(self):
+
+        """
+        Remove last ROI of the whole data set.
+
+        :return: nothing
+        :raises IndexError: if there are no ROIs
+        """
+
+        if len(self.rois) == 0:
+            raise IndexError('There are no ROIs to be removed')
+        self.rois = self.rois[:-1]
+
+    def set_series_rois(self, series_folder, rois):
+
+        """
+        Specify ROIs of one series folder (override of ROIs of the whole data set).
+
+        :param series_folder: string
+            Absolute path to series folder.
+        :param rois: iterable of tuples of four ints
+            (See attribute rois)
+        :return: nothing
+        """
+
+        self.series_rois.update({series_folder: ROITemplate.roi_array(rois)})
+
+    def set_image_rois(self, image_file, rois):
+
+        """
+        Specify ROIs of one image (override of ROIs of its series and the whole data set).
+        The image is added to the images to be analyzed.
+
+        :param image_file: string
+            Absolute path to image.
+        :param rois: iterable of tuples of four ints
+            (See attribute rois)
+        :return: nothing
+        """
+
+        self.files.setdefault(image_file)
+        self.image_rois.update({image_file: ROITemplate.roi_array(rois)})
+
+    def rois_of_image(self, image_file):
+
+        """
+        Get ROIs of image: its own ROIs, ROIs of its series folder
+        or ROIs of the whole data set.
+
+        :param image_file: string
+            Absolute path to image.
+        :return: ndarray (2d, int64)
+            Read-only array of ROIs (See attribute rois).
+        """
+
+        rois = self.image_rois.get(image_file)
+        if rois is None:
+            rois = self.series_rois.get(os.path.dirname(image_file), self.rois)
+        return rois
+
+    def update(self, roi_dict):
+
+        """
+        Specify ROIs of several images (See method set_image_rois).
+
+        :param roi_dict: dict
+            Keys : absolute paths to images;
+            Values : ROIs of the images.
+        :return: nothing
+        """
+
+        for image_file in roi_dict:
+            self.set_image_rois(image_file=image_file, rois=roi_dict[image_file])
+
+    def keys(self):
+
+        """
+        :return: dict_keys
+            Absolute paths to images to be analyzed (in the order of filelist).
+        """
+
+        return self.files.keys()
+
+    def items(self):
+
+        """
+        :return: generator of tuples
+            Absolute path to each image and its ROIs (See method rois_of_image).
+        """
+
+        return ((image_file, self.rois_of_image(image_file)) for image_file in self.files)
+
+    def __iter__(self):
+
+        """
+        :return: iterator of strings
+            Absolute paths to images to be analyzed.
+        """
+
+        return iter(self.files)
+
+    def __len__(self):
+
+        """
+        :return: int
+            Number of images to be analyzed.
+        """
+
+        return len(self.files)
+
+    def __contains__(self, image_file):
+
+        """
+        :param image_file: string
+            Absolute path to image.
+        :return: boolean
+            Whether the image is analyzed.
+        """
+
+        return image_file in self.files
+
+    def __getitem__(self, image_file):
+
+        """
+        :param image_file: string
+            Absolute path to image.
+        :return: ndarray (2d, int64)
+            ROIs of the image (See method rois_of_image).
+        :raises KeyError: if the image is not analyzed
+        """
+
+        if image_file not in self.files:
+            raise KeyError(image_file)
+        return self.rois_of_image(image_file)
@@ -0,0 +1,142 @@
+from imports_nps import *
+
+
+class RunningStatistics:
+
+    """
+    Running mean and variance of a stream of values (Welford's algorithm).
+
+    Values are added one by one or in batches (e.g. values of all ROIs
+    of one image) as soon as they are computed, so that memory does not
+    depend on the number of values. Batches are merged by the parallel
+    form of the algorithm (Chan et al.): mean and sum of squared deviations
+    of the batch are computed by numpy and combined with the running ones.
+
+    Values may be scalars or equally shaped arrays (e.g. resampled NPS),
+    statistics of arrays are element-wise.
+
+    Attributes
+    ----------
+    count : int
+        Number of added values.
+
+    mean : float or ndarray
+        Mean of added values (nan, if no value is added).
+
+    m2 : float or ndarray
+        Sum of squared deviations of added values from their mean.
+
+    Methods
+    -------
+    update(self, value)
+        Add one value.
+
+    update_batch(self, values)
+        Add several values.
+
+    variance(self)
+        Get population variance of added values.
+
+    sd(self)
+        Get population SD of added values.
+
+    @staticmethod
+    from_values(values)
+        Build statistics of given values.
+    """
+
+    def __init__(self):
+
+        """
+        Create statistics without values.
+        """
+
+        self.count = 0
+        self.mean = np.nan
+        self.m2 = 0.0
+
+    @staticmethod
+    def from_values(values):
+
+        """
+        Build statistics of given values.
+
+        :param values: list or ndarray
+            Values (first axis: values).
+        :return: RunningStatistics object
+        """
+
+        statistics = RunningStatistics()
+        statistics.update_batch(values=values)
+        return statistics
+
+    def update(self, value):
+
+        """
+        Add one value.
+
+        :param value: float or ndarray
+            Value (arrays must have the shape of previous values).
+        :return: nothing
+        """
+
+        self.count += 1
+        if self.count == 1:
+            # the first value is the mean (not rounded)
+            self.mean = np.array(value, dtype=np.float64) if np.ndim(value) > 0 else float(value)
+            self.m2 = np.zeros_like(self.mean) if np.ndim(value) > 0 else 0.0
+            return
+        delta = value - self.mean
+        self.mean = self.mean + delta / self.count
+        self.m2 = self.m2 + delta * (value - self.mean)
+
+    def update_batch(self, values):
+
+        """
+        Add several values.
+
+        :param values: list or ndarray
+            Values (first axis: values).
+        :return: nothing
+        """
+
+        values = np.asarray(values, dtype=np.float64)
+        count_of_batch = len(values)
+        if count_of_batch == 0:
+            return
+        mean_of_batch = np.mean(values, axis=0)
+        m2_of_batch = np.sum((values - mean_of_batch) ** 2, axis=0)
+        if self.count == 0:
+            self.count = count_of_batch
+            self.mean = mean_of_batch
+            self.m2 = m2_of_batch
+            return
+        count = self.count + count_of_batch
+        delta = mean_of_batch - self.mean
+        self.mean = self.mean + delta * count_of_batch / count
+        self.m2 = self.m2 + m2_of_batch + delta ** 2 * self.count * count_of_batch / count
+        self.count = count
+
+    def variance(self):
+
+        """
+        Get population variance (as np.var) of added values.
+
+        :return: float or ndarray
+            Variance (nan, if no value is added).
+        """
+
+        if self.count == 0:
+            return np.nan
+        return self.m2 / self.count
+
+    def sd(self):
+
+        """
+        Get population SD (as np.std) of added values.
+
+        :return: float or ndarray
+            SD (nan, if no value is added).
+        """
+
+        return np.sqrt(self.variance())
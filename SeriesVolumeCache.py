@@ -0,0 +1,334 @@
+from imports_nps import *
+from DatasetCatalog import DatasetCatalog
+from PixelImage import PixelImage
+
+
+class SeriesVolumeCache:
+
+    """
+    On-disk cache of series as contiguous volumes.
+
+    The images of each series folder of attribute filedict of class StartClass
+    are stored as one .npy-file (shape: number of images, rows, columns;
+    native data type of the images) together with a sidecar JSON containing
+    paths, sizes and modification times of the images (slice order), their pixel
+    spacing, Rescale Slope and Intercept and the metadata of the series.
+    In later runs the volume is memory-mapped and images are sliced out of it
+    without opening and parsing the image files. A volume is built again, if
+    any image of the series has been changed, added or removed.
+
+    Attributes
+    ----------
+    folder_of_volumes : string
+        Absolute path to folder with volumes and sidecars.
+
+    series_files : dict of lists of strings
+        Keys : absolute paths to series folders;
+        Values : absolute paths to images of the series (slice order).
+
+    file_index : dict of tuples
+        Keys : absolute paths to images;
+        Values : path to series folder and index of the image in the volume.
+
+    volumes : dict of dicts
+        Keys : absolute paths to opened series folders;
+        Values : dicts
+            Keys : 'volume' - memory-mapped volume (read-only),
+                   'sidecar' - content of sidecar JSON;
+            or None, if the series cannot be stored as volume (e.g. images of different size
+            or type, or unreadable images).
+
+    series_locks : dict of threading.Lock
+        Keys : absolute paths to series folders;
+        Values : locks held while the volume of the series is loaded or built,
+            so that other series are not blocked meanwhile.
+
+    lock : threading.Lock
+        Lock of attributes volumes and series_locks (images are read by several threads).
+
+    Methods
+    -------
+    get_image(self, image_file, read_function)
+        Get image from the volume of its series.
+
+    open_volume(self, series_folder, read_function, first_file)
+        Open volume of series, build it if necessary.
+
+    load_volume(self, series_folder)
+        Memory-map stored volume, if it is up to date.
+
+    build_volume(self, series_folder, read_function, first_file)
+        Read all images of series and store them as volume.
+
+    volume_paths(self, series_folder)
+        Get paths to volume and sidecar of series.
+
+    @staticmethod
+    stat_files(files)
+        Get sizes and modification times of files.
+    """
+
+    def __init__(self, folder_of_volumes, file_dict):
+
+        """
+        :param folder_of_volumes: string
+            Absolute path to folder with volumes and sidecars.
+        :param file_dict: dict of dicts
+            (See attribute filedict of class StartClass)
+        """
+
+        self.folder_of_volumes = folder_of_volumes
+        self.series_files = {}
+        self.file_index = {}
+        for study in file_dict:
+            for series in file_dict[study]:
+                files = list(file_dict[study][series])
+                if len(files) == 0:
+                    continue
+                series_folder = os.path.dirname(files[0])
+                self.series_files.update({series_folder: files})
+                for index, path_to_file in enumerate(files):
+                    self.file_index.update({path_to_file: (series_folder, index)})
+        self.volumes = {}
+        self.series_locks = {}
+        self.lock = threading.Lock()
+
+    def __getstate__(self):
+
+        """
+        Drop the locks and opened volumes, that are not passed to worker processes.
+
+        :return: dict
+            Attributes of the object.
+        """
+
+        state = self.__dict__.copy()
+        state.pop('lock')
+        state.update({'volumes': {}, 'series_locks': {}})
+        return state
+
+    def __setstate__(self, state):
+
+        """
+        Restore attributes and create new lock in worker process.
+
+        :param state: dict
+            (See return value of method __getstate__)
+        :return: nothing
+        """
+
+        self.__dict__.update(state)
+        self.lock = threading.Lock()
+
+    def get_image(self, image_file, read_function):
+
+        """
+        Get image from the volume of its series.
+
+        :param image_file: string
+            Absolute path to image file.
+        :param read_function: callable
+            Function reading one image file (See method read_image of class StartClass).
+        :return: dict or None
+            (See return value of method read_image of class StartClass)
+            'base_array' is a read-only view of the memory-mapped volume,
+            'whole_dcm' contains only the pixel spacing and the rescale parameters.
+            None, if the image is not part of a volume.
+        """
+
+        location = self.file_index.get(image_file)
+        if location is None:
+            return None
+        series_folder, index = location
+        volume_dict = self.open_volume(series_folder=series_folder, read_function=read_function,
+                                       first_file=image_file)
+        if volume_dict is None:
+            return None
+        sidecar = volume_dict['sidecar']
+        if os.path.basename(image_file)[-4:] == '.dcm':
+            # header containing only the pixel spacing and the rescale parameters
+            whole_dcm = pydicom.Dataset()
+            if sidecar['pixel_spacing'][index] is not None:
+                whole_dcm.PixelSpacing = sidecar['pixel_spacing'][index]
+            whole_dcm.RescaleSlope, whole_dcm.RescaleIntercept = sidecar['rescale'][index]
+        else:
+            whole_dcm = ''
+        return {'base_array': volume_dict['volume'][index],
+                'metadata_subdict': sidecar['metadata_subdict'],
+                'whole_dcm': whole_dcm}
+
+    def open_volume(self, series_folder, read_function, first_file):
+
+        """
+        Open volume of series; build it, if it is not stored or not up to date.
+        Only threads requesting images of the same series wait, while
+        the volume is loaded or built.
+
+        :param series_folder: string
+            Absolute path to series folder.
+        :param read_function: callable
+            (See parameter read_function of method get_image)
+        :param first_file: string
+            (See parameter first_file of method build_volume)
+        :return: dict or None
+            (See attribute volumes)
+        """
+
+        with self.lock:
+            if series_folder in self.volumes:
+                return self.volumes[series_folder]
+            series_lock = self.series_locks.setdefault(series_folder, threading.Lock())
+        with series_lock:
+            # another thread may have opened the volume meanwhile
+            with self.lock:
+                if series_folder in self.volumes:
+                    return self.volumes[series_folder]
+            volume_dict = self.load_volume(series_folder=series_folder)
+            if volume_dict is None:
+                volume_dict = self.build_volume(series_folder=series_folder,
+                                                read_function=read_function,
+                                                first_file=first_file)
+            with self.lock:
+                self.volumes.update({series_folder: volume_dict})
+            return volume_dict
+
+    def load_volume(self, series_folder):
+
+        """
+        Memory-map stored volume of series, if its images are unchanged.
+
+        :param series_folder: string
+            Absolute path to series folder.
+        :return: dict or None
+            (See attribute volumes)
+            None, if there is no up to date volume.
+        """
+
+        path_to_volume, path_to_sidecar = self.volume_paths(series_folder=series_folder)
+        files = self.series_files[series_folder]
+        try:
+            with open(path_to_sidecar, 'r') as file_to_read_info:
+                sidecar = json.load(file_to_read_info)
+            if sidecar['slice_order'] != files or \
+                    sidecar['file_stats'] != SeriesVolumeCache.stat_files(files) or \
+                    len(sidecar['rescale']) != len(files):
+                return None
+            volume = np.load(path_to_volume, mmap_mode='r')
+        except (OSError, ValueError, KeyError):
+            return None
+        if volume.shape[0] != len(files):
+            return None
+        print('Volume of series %s is used' % series_folder)
+        return {'volume': volume,
+                'sidecar': sidecar}
+
+    def build_volume(self, series_folder, read_function, first_file):
+
+        """
+        Read all images of series and store them as volume and sidecar.
+
+        :param series_folder: string
+            Absolute path to series folder.
+        :param read_function: callable
+            (See parameter read_function of method get_image)
+        :param first_file: string
+            Absolute path to the requested image. It is read first, so that
+            the metadata of the series is extracted from the same image
+            as without volume (See method get_series_metadata of class StartClass).
+        :return: dict or None
+            (See attribute volumes)
+            None, if the images have different size or data type
+            or an image cannot be read.
+        """
+
+        print('build_volume is being executed')
+
+        path_to_volume, path_to_sidecar = self.volume_paths(series_folder=series_folder)
+        files = self.series_files[series_folder]
+        # sizes and modification times before reading
+        file_stats = SeriesVolumeCache.stat_files(files)
+        first_index = files.index(first_file)
+        try:
+            image_dict = read_function(first_file)
+        except Exception as error:
+            print('Image %s cannot be read (%s), volume of series %s is not used' %
+                  (first_file, error, series_folder))
+            return None
+        shape_of_image = image_dict['base_array'].shape
+        type_of_image = image_dict['base_array'].dtype
+        metadata_subdict = image_dict['metadata_subdict']
+
+        # volume is written into temporary file first
+        volume = np.lib.format.open_memmap(path_to_volume + '.tmp', mode='w+', dtype=type_of_image,
+                                           shape=(len(files),) + shape_of_image)
+        pixel_spacing = [None] * len(files)
+        rescale = [None] * len(files)
+        for index in [first_index] + [i for i in range(len(files)) if i != first_index]:
+            if index != first_index:
+                try:
+                    image_dict = read_function(files[index])
+                except Exception as error:
+                    print('Image %s cannot be read (%s), volume of series %s is not used' %
+                          (files[index], error, series_folder))
+                    image_dict = None
+            if image_dict is None or image_dict['base_array'].shape != shape_of_image or \
+                    image_dict['base_array'].dtype != type_of_image:
+                if image_dict is not None:
+                    print('Images of series %s have different size or type, volume is not used' % series_folder)
+                del volume
+                os.remove(path_to_volume + '.tmp')
+                return None
+            volume[index] = image_dict['base_array']
+            rescale[index] = list(PixelImage.rescale_parameters(image_dict['whole_dcm']))
+            try:
+                pixel_spacing[index] = [float(i) for i in image_dict['whole_dcm']['0x0028', '0x0030'].value]
+            except (KeyError, TypeError, ValueError):
+                pass
+        volume.flush()
+        del volume
+        os.replace(path_to_volume + '.tmp', path_to_volume)
+
+        sidecar = {'series_folder': series_folder,
+                   'slice_order': files,
+                   'file_stats': file_stats,
+                   'shape': [len(files)] + list(shape_of_image),
+                   'pixel_spacing': pixel_spacing,
+                   'rescale': rescale,
+                   'metadata_subdict': json.loads(DatasetCatalog.metadata_to_json(metadata_subdict))}
+        with open(path_to_sidecar + '.tmp', 'w') as file_to_store_info:
+            json.dump(sidecar, file_to_store_info)
+        os.replace(path_to_sidecar + '.tmp', path_to_sidecar)
+
+        print('build_volume is done')
+
+        return {'volume': np.load(path_to_volume, mmap_mode='r'),
+                'sidecar': sidecar}
+
+    def volume_paths(self, series_folder):
+
+        """
+        Get paths to volume and sidecar of series.
+
+        :param series_folder: string
+            Absolute path to series folder.
+        :return: tuple of strings
+            Paths to .npy-file and sidecar JSON.
+        """
+
+        name_of_volume = hashlib.sha1(series_folder.encode('utf-8')).hexdigest()
+        return (os.path.join(self.folder_of_volumes, name_of_volume + '.npy'),
+                os.path.join(self.folder_of_volumes, name_of_volume + '.json'))
+
+    @staticmethod
+    def stat_files(files):
+
+        """
+        Get sizes and modification times of files.
+
+        :param files: list of strings
+            Absolute paths to files.
+        :return: list of lists of ints
+            (See return value of static method stat_file of class DatasetCatalog)
+        """
+
+        return [list(DatasetCatalog.stat_file(path_to_file)) for path_to_file in files]
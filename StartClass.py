@@ -1,4 +1,8 @@
 from imports_nps import *
+from DatasetCatalog import DatasetCatalog
+from SeriesVolumeCache import SeriesVolumeCache
+from PartialPixelReader import PartialPixelReader
+from PixelImage import PixelImage
 
 
 class StartClass:
@@ -28,7 +32,8 @@ class StartClass:
 
         aux_folder_names : list of strings
             Names of auxiliary folders to be created at the start of the program:
-                '01.2d_NPS_images': folder with 2d_NPS images (.png) of the last calculated ROIs;
+                '01.2d_NPS_images': folder with 2d_NPS images (.jpg) of ROIs
+                    (See class NPSImageWriter);
                 '02.One_D_NPS': matplotlib charts of 1d-NPS profiles saved as .png;
                 '03.PNG_images': Dicoms that are transformed in .png-format, to be shown in GUI.
 
@@ -61,6 +66,14 @@ class StartClass:
             Keys : absolute paths to dcm_images;
             Values : respective metadata_subdict.
 
+        metadata_header_tags : list of pydicom.tag.BaseTag
+            Tags read from DICOM headers to extract metadata
+            (See static method header_tags).
+
+        series_metadata_dict : dict of dicts
+            Keys : absolute paths to series folders;
+            Values : metadata_subdict of the series (See method get_series_metadata).
+
         folder_with_images : string
             Absolute path to folder with all dicoms to be analyzed.
 
@@ -76,6 +89,40 @@ class StartClass:
                 Keys : absolute paths to series' folders;
                 Values : list of files that are in respective series' folder.
 
+        discovery_info : dict
+            Result of the search for files (See method discover_files).
+            Keys : 'file_list' - see attribute filelist;
+                   'file_dict' - see attribute filedict;
+                   'num_directories' - number of scanned directories;
+                   'num_files_scanned' - number of all files in scanned directories;
+                   'num_files_found' - number of files with specified extensions;
+                   'num_reused_directories' - number of listings taken from catalog;
+                   'duration_scan' - time of scanning directories in seconds;
+                   'duration_total' - time of whole search in seconds.
+
+        pixel_cache : OrderedDict of dicts
+            Cache of decoded images in least recently used order.
+            Keys : tuples of path, modification time (ns) and size of image files;
+            Values : dicts (See return value of method read_image).
+
+        pixel_cache_budget : float
+            Maximal size of cached pixel arrays in bytes.
+
+        pixel_cache_statistics : dict
+            Keys : 'hits', 'misses' - numbers of found and not found images,
+                   'evictions' - number of evicted images,
+                   'entries' - number of cached images,
+                   'bytes' - size of cached pixel arrays.
+
+        catalog : instance of class DatasetCatalog or None
+            Catalog of files in folder_with_images (None, if not used).
+
+        volume_cache : instance of class SeriesVolumeCache or None
+            Memory-mapped volumes of the series of filedict (None, if not used).
+
+        partial_reader : instance of class PartialPixelReader or None
+            Reader of rows covered by ROIs of uncompressed dicoms (None, if not used).
+
         new_files : dict of dicts
             Dict containing filelist and filedict attributes.
 
@@ -85,6 +132,10 @@ class StartClass:
         num_files_to_exclude_end : int
             Number of files to be excluded from the end of each series' folder.
 
+        exclusion_order : string
+            Order of files, in which they are excluded ('file_order',
+            'InstanceNumber' or 'SliceLocation'; See method exclude_files).
+
         all_images : list of strings
             Absolute paths to all png-images of dicoms.
 
@@ -104,6 +155,20 @@ class StartClass:
             Search for files with specified extensions and build
             sorting dict of files to be analyzed.
 
+        discover_files(self, pathtoFiles, suffix_array)
+            Search for files with specified extensions in one pass
+            and build both list and sorting dict of files.
+
+        @staticmethod
+        scan_directory(dir_name)
+            List files and subdirectories of one directory.
+
+        scan_directory_with_catalog(self, dir_name)
+            List directory or take its listing from catalog.
+
+        save_catalog(self)
+            Store metadata extracted since the last call in catalog.
+
         exclude_files(self, file_dict, file_list,
                       num_files_to_exclude_start,
                       num_files_to_exclude_end)
@@ -111,10 +176,36 @@ class StartClass:
             and perform changes in filedict and filelist attributes
             of class StartClass.
 
-        create_base_array(self, image_file)
+        read_header_positions(self, file_dict, keyword)
+            Read position of each file in its series from DICOM headers.
+
+        @staticmethod
+        header_tags(list_of_indices)
+            Build tags of DICOM header to be read for metadata extraction.
+
+        read_header(self, image_file)
+            Read header of dicom-file without pixel data.
+
+        get_series_metadata(self, image_file, dataset_dicom=None)
+            Get metadata of the series of image_file (extracted once per series).
+
+        create_base_array(self, image_file, row_range=None)
             Read current dicom file and retrieve pixel array.
             Retrieve part of meta data and update attribute metadata_dict.
 
+        read_image(self, image_file)
+            Read and decode image file.
+
+        @staticmethod
+        pixel_cache_key(image_file)
+            Build key of pixel cache for image file.
+
+        get_cached_image(self, cache_key)
+            Get decoded image from pixel cache.
+
+        cache_image(self, cache_key, image_dict)
+            Store decoded image in pixel cache.
+
         rgb2gray(self, rgb)
             If we handle with RGB-image, convert it to grayscale.
 
@@ -141,7 +232,11 @@ class StartClass:
 
        """
 
-    def __init__(self, suffixes, list_of_indices_raw):
+    def __init__(self, suffixes, list_of_indices_raw, folder_with_images=None,
+                 metadata_settings=None, files_to_exclude=None, createPNGImages=True,
+                 num_discovery_threads=8, useCatalog=True, catalog_name='nps_catalog.sqlite', catalog_folder=None,
+                 pixel_cache_mb=512, useVolumeCache=False, usePartialReads=True, useRescale=False,
+                 exclusion_order='file_order'):
         """
         :param suffixes: list of strings
             Suffixes of files to be found in selected directory
@@ -149,7 +244,52 @@ class StartClass:
         :param list_of_indices_raw: list of strings
             Default list of tags of metadata to be extracted from DICOMs
             Specified in init_dict
-
+        :param folder_with_images: string or None
+            Path to folder with all images to be analyzed.
+            If None (by default), the folder is selected in dialog window.
+        :param metadata_settings: string or None
+            Tag numbers of metadata as entered in dialog window 'Tag Numbers'
+            (e.g. '0x0008, 0x1030\n0x0018, 0x0050').
+            If None (by default), the dialog window is shown.
+        :param files_to_exclude: tuple of two ints or None
+            Numbers of files to be excluded from the beginning and
+            the end of each series folder.
+            If None (by default), the dialog window is shown.
+        :param createPNGImages: boolean
+            Whether png-images of the first dicoms are created
+            to be shown in GUI.
+        :param num_discovery_threads: int
+            Number of threads scanning directories of selected folder.
+            Specified in init_dict.
+        :param useCatalog: boolean
+            Whether listings of directories and metadata of files are stored
+            in a catalog of selected folder and reused in next runs
+            (See class DatasetCatalog). Specified in init_dict.
+        :param catalog_name: string
+            Name of catalog's SQLite file. Specified in init_dict.
+        :param catalog_folder: string or None
+            Folder of catalog's SQLite file; None: cache folder of the user
+            (selected folder is not written to). Specified in init_dict.
+        :param pixel_cache_mb: float
+            Maximal size of decoded pixel arrays in pixel cache in MB.
+            0: images are not cached. Specified in init_dict.
+        :param useVolumeCache: boolean
+            Whether each series is stored as memory-mapped volume in auxiliary folder
+            '04.Series_volumes' and images are taken from it in next runs
+            (See class SeriesVolumeCache). Specified in init_dict.
+        :param usePartialReads: boolean
+            Whether only rows covered by ROIs are read from uncompressed dicoms
+            (See class PartialPixelReader). Specified in init_dict.
+        :param useRescale: boolean
+            Whether Rescale Slope and Intercept of dicoms are applied
+            to pixel values of ROIs (See class PixelImage). Specified in init_dict.
+        :param exclusion_order: string
+            Order of files in series folders, in which files are excluded
+            from their beginning and end (See method exclude_files):
+            'file_order' - order of files in filedict;
+            'InstanceNumber', 'SliceLocation' - position in DICOM header
+            (files without the element are ranked last).
+            Specified in init_dict.
 
         """
 
@@ -158,6 +298,25 @@ class StartClass:
         self.suffixes = suffixes
         # default list of tags for metadata
         self.list_of_indices_raw = list_of_indices_raw
+        # number of threads for search of files
+        self.num_discovery_threads = num_discovery_threads
+        # order of files for exclusion
+        if exclusion_order not in ('file_order', 'InstanceNumber', 'SliceLocation'):
+            raise ValueError('Unknown exclusion order: %s' % exclusion_order)
+        self.exclusion_order = exclusion_order
+        # cache of decoded images (least recently used at the beginning)
+        self.pixel_cache = OrderedDict()
+        self.pixel_cache_budget = pixel_cache_mb * 1024 ** 2
+        self.pixel_cache_lock = threading.Lock()
+        self.pixel_cache_statistics = {'hits': 0, 'misses': 0, 'evictions': 0,
+                                       'entries': 0, 'bytes': 0}
+        # whether pixel values of ROIs are rescaled
+        self.useRescale = useRescale
+        # reader of rows covered by ROIs
+        if usePartialReads:
+            self.partial_reader = PartialPixelReader()
+        else:
+            self.partial_reader = None
 
         # auxiliary booleans
         # global acceptButtonIsAlreadyUsed
@@ -180,53 +339,70 @@ class StartClass:
         # keys: paths to dicoms
         # values: part dictionaries with meta data
         self.metadata_dict = {}
+        # metadata of each series folder
+        self.series_metadata_dict = {}
         # collect all images in png-format
         self.all_images = []
 
         # create dialog window to specify part of meta data to be retrieved
-        # creating dialog window for entering tag numbers
-        dialog_window = tk.Tk()
-        dialog_window.geometry('%dx%d+%d+%d' % (init_dict['main_window_width_md'],
-                                                init_dict['main_window_height_md'],
-                                                init_dict['left_upper_corner_x_md'],
-                                                init_dict['left_upper_corner_y_md']
-                                                ))
-        # instantiate object of class CreateFormMetaData
-        obj_create_form = CreateFormMetaData(title='Tag Numbers',
-                                             value=init_dict['list_of_indices_raw'],
-                                             master_main_window=dialog_window)
-        dialog_window.mainloop()
+        if metadata_settings is None:
+            # creating dialog window for entering tag numbers
+            dialog_window = tk.Tk()
+            dialog_window.geometry('%dx%d+%d+%d' % (init_dict['main_window_width_md'],
+                                                    init_dict['main_window_height_md'],
+                                                    init_dict['left_upper_corner_x_md'],
+                                                    init_dict['left_upper_corner_y_md']
+                                                    ))
+            # instantiate object of class CreateFormMetaData
+            obj_create_form = CreateFormMetaData(title='Tag Numbers',
+                                                 value=init_dict['list_of_indices_raw'],
+                                                 master_main_window=dialog_window)
+            dialog_window.mainloop()
+            metadata_settings = obj_create_form.settings_string
 
         # recognize tag numbers
         self.metadata_tags_list = StartClass.recognize_hex_numbers_in_string(
-            settings_string=obj_create_form.settings_string)
+            settings_string=metadata_settings)
+        # tags read from DICOM headers
+        self.metadata_header_tags = StartClass.header_tags(list_of_indices=self.metadata_tags_list)
 
         # select folder with images
-        self.folder_with_images = self.select_folder(
-            title='Select folder with images')
-        # create list of found images
-        self.filelist = self.create_filelist(pathtoFiles=self.folder_with_images,
-                                             suffix_array=self.suffixes)
-
-        self.filedict = self.create_filedict(pathtoFiles=self.folder_with_images,
+        if folder_with_images is None:
+            folder_with_images = self.select_folder(
+                title='Select folder with images')
+        self.folder_with_images = folder_with_images
+        # open catalog of files found in previous runs
+        if useCatalog:
+            self.catalog = DatasetCatalog(folder_with_images=self.folder_with_images,
+                                          catalog_name=catalog_name,
+                                          catalog_folder=catalog_folder)
+        else:
+            self.catalog = None
+        # create list and dict of found images
+        discovery_info = self.discover_files(pathtoFiles=self.folder_with_images,
                                              suffix_array=self.suffixes)
+        self.filelist = discovery_info['file_list']
+        self.filedict = discovery_info['file_dict']
 
         # create dialog window to exclude some files from folders
-        fields = ['remove_begin', 'remove_end']
-        values = [3, 3]
-        if os.path.isfile(os.path.join(os.getcwd(), self.file_exclusion_json)):
-            with open(self.file_exclusion_json, 'r') as file_to_read_info:
-                read_dict = json.load(file_to_read_info)
-            list_of_variables = [read_dict[key] for key in read_dict]
-            values = list_of_variables
-
-        main_window = tk.Tk()
-        obj_exclude = CreateForm(master_main_window=main_window, object_gui=None,
-                                 object_arrays=None, fields=fields,
-                                 values=values, program_start=self.program_start)
-        main_window.mainloop()
-        self.num_files_to_exclude_start = obj_exclude.num_files_to_exclude_start
-        self.num_files_to_exclude_end = obj_exclude.num_files_to_exclude_end
+        if files_to_exclude is None:
+            fields = ['remove_begin', 'remove_end']
+            values = [3, 3]
+            if os.path.isfile(os.path.join(os.getcwd(), self.file_exclusion_json)):
+                with open(self.file_exclusion_json, 'r') as file_to_read_info:
+                    read_dict = json.load(file_to_read_info)
+                list_of_variables = [read_dict[key] for key in read_dict]
+                values = list_of_variables
+
+            main_window = tk.Tk()
+            obj_exclude = CreateForm(master_main_window=main_window, object_gui=None,
+                                     object_arrays=None, fields=fields,
+                                     values=values, program_start=self.program_start)
+            main_window.mainloop()
+            files_to_exclude = (obj_exclude.num_files_to_exclude_start,
+                                obj_exclude.num_files_to_exclude_end)
+        self.num_files_to_exclude_start = files_to_exclude[0]
+        self.num_files_to_exclude_end = files_to_exclude[1]
         self.program_start = False
 
         # exclude files from folders
@@ -237,12 +413,21 @@ class StartClass:
         self.filelist = self.new_files['file_list']
         self.filedict = self.new_files['file_dict']
 
+        # volumes of series are built at the first access to their images
+        if useVolumeCache:
+            self.volume_cache = SeriesVolumeCache(
+                folder_of_volumes=StartClass.create_aux_folder('04.Series_volumes'),
+                file_dict=self.filedict)
+        else:
+            self.volume_cache = None
+
         # self.create_image_arrays(filelist=self.filelist)
         # create png-images
-        for num, key in enumerate(self.filelist):
-            if num > 1:
-                break
-            self.all_images.append(self.create_png_image(key=key))
+        if createPNGImages:
+            for num, key in enumerate(self.filelist):
+                if num > 1:
+                    break
+                self.all_images.append(self.create_png_image(key=key))
 
         print('Constructor of the class StartClass is done')
 
@@ -334,6 +519,7 @@ class StartClass:
     def create_filelist(self, pathtoFiles, suffix_array):
         """
         Search for files with specified extensions and build list of files to be analyzed.
+        (See method discover_files)
         :param pathtoFiles: string
             Path to folder with all images to be analyzed
         :param suffix_array: list of strings
@@ -342,65 +528,15 @@ class StartClass:
             List of paths to all found images
         """
 
-        print('create_filelist is being executed')
-        # list of paths to all found files
-        lstFiles = []
-        # find out how many files found
-        counter_files = 0
-        sorted_file_names = []
-        # list of all directories with found files
-        all_dir_names = []
-        # empty dict to sort files in directories
-        directories_dict = {}
-        # subdict = {}
-        # search for files with certain extensions
-        for dirName, subdirList, fileList in os.walk(pathtoFiles):
-            for filename in fileList:
-                # if any of extensions are present in filename
-                if any(suffix.lower() in filename.lower() for suffix in suffix_array):
-                    lstFiles.append(os.path.join(dirName, filename))
-                    filepath = os.path.join(dirName, filename)
-                    # base name of current directory with file
-                    basedirname = os.path.basename(dirName)
-                    classdirname = os.path.dirname(os.path.dirname(dirName))
-                    try:  # update dict if the key-value-pair already exists
-                        temp_dict = directories_dict[classdirname]
-                    except KeyError:
-                        sub_dict = {}
-                        directories_dict.update({classdirname: sub_dict})
-                        temp_dict = directories_dict[classdirname]
-                    try:
-                        temp_list = temp_dict[basedirname]
-                        temp_list.append(filepath)
-                        temp_dict.update({basedirname: temp_list})
-                        directories_dict.update({classdirname: temp_dict})
-                    except KeyError:
-                        # or create key-value pair
-
-                        # get subdict
-                        temp_subdict = directories_dict[classdirname]
-                        temp_subdict.update({basedirname: [filepath]})
-                        directories_dict.update({classdirname: temp_subdict})
-
-        # create array of only file names, sorted generally (based on whole path)
-        for fnamepath in natsorted(lstFiles, alg=ns.IGNORECASE):
-            sorted_file_names.append(os.path.basename(fnamepath))
-        # create array of only folder names, sorted generally (based on whole path)
-        for fdir in natsorted(lstFiles, alg=ns.IGNORECASE):
-            all_dir_names.append(os.path.basename(os.path.dirname(fdir)))
-        # print base names of found files
-        for q in natsorted(lstFiles, alg=ns.IGNORECASE):
-            print(os.path.basename(q))
-        # print the number of found files
-        print('%d files have been found' % len(lstFiles))
-        print('create_filelist is done')
-        return natsorted(lstFiles, alg=ns.IGNORECASE, key=lambda x: x.split('_')[-1])
+        return self.discover_files(pathtoFiles=pathtoFiles,
+                                   suffix_array=suffix_array)['file_list']
 
     def create_filedict(self, pathtoFiles, suffix_array):
 
         """
         Search for files with specified extensions and build
         sorting dict of files to be analyzed.
+        (See method discover_files)
         :param pathtoFiles: string
             Path to folder with all images to be analyzed
         :param suffix_array: list of strings
@@ -409,65 +545,160 @@ class StartClass:
             (See attribute filedict of class StartClass)
         """
 
-        print('create_filedict is being executed')
+        return self.discover_files(pathtoFiles=pathtoFiles,
+                                   suffix_array=suffix_array)['file_dict']
+
+    def discover_files(self, pathtoFiles, suffix_array):
+
+        """
+        Search for files with specified extensions in one pass
+        and build both list and sorting dict of files to be analyzed.
+
+        Directories of the same depth are scanned in parallel by
+        num_discovery_threads threads. Files are collected in the same order
+        as os.walk (top-down) yields them, so that list and dict are
+        the same as if the tree was walked sequentially.
+        :param pathtoFiles: string
+            Path to folder with all images to be analyzed
+        :param suffix_array: list of strings
+            Extensions of files to be searched for.
+        :return: dict
+            (See attribute discovery_info of class StartClass)
+        """
+
+        print('discover_files is being executed')
+        start_time_discovery = time.time()
+
+        # scan tree level by level, results of directories
+        # are stored as tuples (file names, subdirectories)
+        scanned_directories = {}
+        current_level = [pathtoFiles]
+        # listings of unchanged directories are taken from catalog
+        if self.catalog is None:
+            scan_function = StartClass.scan_directory
+        else:
+            scan_function = self.scan_directory_with_catalog
+        with ThreadPoolExecutor(max_workers=self.num_discovery_threads) as executor:
+            while current_level:
+                next_level = []
+                for dir_name, scan_result in zip(current_level,
+                                                 executor.map(scan_function, current_level)):
+                    scanned_directories.update({dir_name: scan_result})
+                    next_level += scan_result[1]
+                current_level = next_level
+        duration_scan = time.time() - start_time_discovery
 
         # list of paths to all found files
         lstFiles = []
-        # find out how many files found
-        counter_files = 0
-        sorted_file_names = []
-        # list of all directories with found files
-        all_dir_names = []
         # empty dict to sort files in directories
         directories_dict = {}
-        # subdict = {}
-        # search for files with certain extensions
-        for dirName, subdirList, fileList in os.walk(pathtoFiles):
+        num_files_scanned = 0
+        # collect files in the order of os.walk (depth first, top-down)
+        dirs_to_visit = [pathtoFiles]
+        while dirs_to_visit:
+            dirName = dirs_to_visit.pop()
+            fileList, subdirList = scanned_directories[dirName]
+            num_files_scanned += len(fileList)
             for filename in fileList:
-                # # counter used to exclude files from the start of the list
-                # counter_exclude_start = 1
-                # # counter used to exclude file from the end of the list
-                # counter_exclude_end = len(fileList)
                 # if any of extensions are present in filename
                 if any(suffix.lower() in filename.lower() for suffix in suffix_array):
-                    lstFiles.append(os.path.join(dirName, filename))
                     filepath = os.path.join(dirName, filename)
-                    # base name of current directory with file
-                    basedirname = os.path.basename(dirName)
-                    classdirname = os.path.dirname(dirName)
-                    try:  # update dict if the key-value-pair already exists
-                        temp_dict = directories_dict[classdirname]
-                    except KeyError:
-                        sub_dict = {}
-                        directories_dict.update({classdirname: sub_dict})
-                        temp_dict = directories_dict[classdirname]
+                    lstFiles.append(filepath)
+                    # study folder: sub dict, series folder: list of files
+                    series_dict = directories_dict.setdefault(os.path.dirname(dirName), {})
+                    series_dict.setdefault(os.path.basename(dirName), []).append(filepath)
+            dirs_to_visit += reversed(subdirList)
+
+        sorted_files = natsorted(lstFiles, alg=ns.IGNORECASE, key=lambda x: x.split('_')[-1])
+        num_reused_directories = 0
+        if self.catalog is not None:
+            # check new and changed files and store the catalog
+            self.catalog.update_files(file_dict=directories_dict,
+                                      scanned_directories=list(scanned_directories),
+                                      num_threads=self.num_discovery_threads)
+            self.catalog.save()
+            num_reused_directories = self.catalog.num_reused_directories
+        duration_total = time.time() - start_time_discovery
+
+        self.discovery_info = {'file_list': sorted_files,
+                               'file_dict': directories_dict,
+                               'num_directories': len(scanned_directories),
+                               'num_files_scanned': num_files_scanned,
+                               'num_files_found': len(lstFiles),
+                               'num_reused_directories': num_reused_directories,
+                               'duration_scan': duration_scan,
+                               'duration_total': duration_total}
+        # print the number of found files
+        print('%d files have been found (%d files in %d directories scanned, '
+              '%d listings taken from catalog)' % (len(lstFiles), num_files_scanned,
+                                                   len(scanned_directories), num_reused_directories))
+        print('scan: %f seconds, total: %f seconds' % (duration_scan, duration_total))
+        print('discover_files is done')
+        return self.discovery_info
+
+    @staticmethod
+    def scan_directory(dir_name):
+
+        """
+        List files and subdirectories of one directory.
+        As os.walk, symbolic links to directories are not followed
+        and unreadable directories are skipped.
+        :param dir_name: string
+            Path to directory.
+        :return: tuple of lists
+            Names of files and paths to subdirectories
+            in the order of os.scandir.
+        """
+
+        file_names = []
+        subdirs = []
+        try:
+            with os.scandir(dir_name) as entries:
+                for entry in entries:
                     try:
-                        temp_list = temp_dict[basedirname]
-                        temp_list.append(filepath)
-                        temp_dict.update({basedirname: temp_list})
-                        directories_dict.update({classdirname: temp_dict})
-                    except KeyError:
-                        # or create key-value-pair
-
-                        # get subdict
-                        temp_subdict = directories_dict[classdirname]
-                        temp_subdict.update({basedirname: [filepath]})
-                        directories_dict.update({classdirname: temp_subdict})
-
-        # create array of only file names, sorted generally (based on whole path)
-        for fnamepath in natsorted(lstFiles, alg=ns.IGNORECASE):
-            sorted_file_names.append(os.path.basename(fnamepath))
-        # create array of only folder names, sorted generally (based on whole path)
-        for fdir in natsorted(lstFiles, alg=ns.IGNORECASE):
-            all_dir_names.append(os.path.basename(os.path.dirname(fdir)))
-        # print base names of found files
-        # for q in natsorted(lstFiles, alg=ns.IGNORECASE):
-        #     print(os.path.basename(q))
-        # # print the number of found files
-        # print('%d files have been found' % len(lstFiles))
-        print('create_filedict is done')
-
-        return directories_dict
+                        is_dir = entry.is_dir()
+                    except OSError:
+                        is_dir = False
+                    if not is_dir:
+                        file_names.append(entry.name)
+                    elif not entry.is_symlink():
+                        subdirs.append(entry.path)
+        except OSError:
+            pass
+        return file_names, subdirs
+
+    def scan_directory_with_catalog(self, dir_name):
+
+        """
+        List files and subdirectories of one directory or take
+        the listing from catalog, if the directory has not been changed.
+        :param dir_name: string
+            Path to directory.
+        :return: tuple of lists
+            (See return value of static method scan_directory)
+        """
+
+        try:
+            # modification time is got before listing, so that changes
+            # during listing are recognized in the next run
+            mtime_ns = os.stat(dir_name).st_mtime_ns
+        except OSError:
+            return [], []
+        listing = self.catalog.get_directory(dir_name=dir_name, mtime_ns=mtime_ns)
+        if listing is None:
+            listing = StartClass.scan_directory(dir_name)
+            self.catalog.update_directory(dir_name=dir_name, mtime_ns=mtime_ns, listing=listing)
+        return listing
+
+    def save_catalog(self):
+
+        """
+        Store metadata extracted since the last call in catalog.
+        :return: nothing
+        """
+
+        if self.catalog is not None:
+            self.catalog.save()
 
     def exclude_files(self, file_dict, file_list,
                       num_files_to_exclude_start,
@@ -477,6 +708,9 @@ class StartClass:
         Exclude specified number of files from each series folder
         and perform changes in filedict and filelist attributes
         of class StartClass.
+        Files are excluded from the beginning and the end of each series
+        in the order specified by attribute exclusion_order
+        (order of files in filedict or position in DICOM header).
         :param file_dict: dict of dict
             Attribute filedict before the exclusion of files.
         :param file_list: list of strings
@@ -499,8 +733,13 @@ class StartClass:
 
             return ret_dict
 
-        # empty list for files to exclude
-        files_to_exclude = []
+        # positions of files in series from DICOM headers
+        if self.exclusion_order != 'file_order':
+            header_positions = self.read_header_positions(file_dict=file_dict,
+                                                          keyword=self.exclusion_order)
+
+        # set of files to exclude
+        files_to_exclude = set()
 
         # drop files in file_dict
 
@@ -511,22 +750,29 @@ class StartClass:
             for series in natsorted(temp_dict.keys(), key=lambda f: f.split('_')[-1]):
                 # get list of files in series
                 temp_list = temp_dict[series]
-                # drop files
-                try:
-                    new_temp_list = temp_list[num_files_to_exclude_start: -num_files_to_exclude_end]
-                    files_to_exclude += temp_list[:num_files_to_exclude_start]
-                    files_to_exclude += temp_list[-num_files_to_exclude_end:]
-                    temp_dict.update({series: new_temp_list})
-                except IndexError:
+                num_files = len(temp_list)
+                if num_files_to_exclude_start + num_files_to_exclude_end > num_files:
                     print('There less files in the folder %s/%s, than attempted to exclude' % (folder, series))
+                # indices of files in the order of exclusion
+                if self.exclusion_order == 'file_order':
+                    ranked_indices = range(num_files)
+                else:
+                    # files without position are ranked last, equal positions keep order of files
+                    ranked_indices = sorted(range(num_files),
+                                            key=lambda i: (header_positions[temp_list[i]] is None,
+                                                           header_positions[temp_list[i]] or 0.0,
+                                                           i))
+                # excluded ranks: [0, start) and [num_files - end, num_files)
+                excluded_indices = set(ranked_indices[:num_files_to_exclude_start])
+                excluded_indices.update(ranked_indices[max(num_files - num_files_to_exclude_end, 0):])
+                # remaining files keep their order
+                new_temp_list = [path_to_file for i, path_to_file in enumerate(temp_list)
+                                 if i not in excluded_indices]
+                files_to_exclude.update(temp_list[i] for i in excluded_indices)
+                temp_dict.update({series: new_temp_list})
             file_dict.update({folder: temp_dict})
 
-        # get rid of repeated file names
-        files_to_exclude = set(files_to_exclude)
-        files_to_exclude = list(files_to_exclude)
-
-        for file_to_remove in files_to_exclude:
-            file_list.remove(file_to_remove)
+        file_list = [path_to_file for path_to_file in file_list if path_to_file not in files_to_exclude]
 
         file_list = natsorted(file_list, alg=ns.IGNORECASE)
 
@@ -537,22 +783,239 @@ class StartClass:
 
         return ret_dict
 
-    def create_base_array(self, image_file):
+    def read_header_positions(self, file_dict, keyword):
+
+        """
+        Read position of each file in its series from DICOM headers
+        (used for exclusion of files, See method exclude_files).
+        Headers are read by num_discovery_threads threads.
+        :param file_dict: dict of dict
+            (See attribute filedict)
+        :param keyword: string
+            Keyword of DICOM element with position: 'InstanceNumber' or 'SliceLocation'.
+        :return: dict
+            Keys : absolute paths to files;
+            Values : positions (float) or None, if not available.
+        """
+
+        def read_position(path_to_file):
+            # position is not available for other image files
+            if os.path.basename(path_to_file)[-4:] != '.dcm':
+                return None
+            try:
+                value = pydicom.dcmread(path_to_file, force=True, stop_before_pixels=True,
+                                        specific_tags=[keyword]).get(keyword)
+                return float(value)
+            except (OSError, TypeError, ValueError, pydicom.errors.InvalidDicomError):
+                return None
+
+        all_files = [path_to_file for folder in file_dict for series in file_dict[folder]
+                     for path_to_file in file_dict[folder][series]]
+        with ThreadPoolExecutor(max_workers=max(self.num_discovery_threads, 1)) as executor:
+            positions = list(executor.map(read_position, all_files))
+        return dict(zip(all_files, positions))
+
+    @staticmethod
+    def header_tags(list_of_indices):
+        """
+        Build tags of DICOM header to be read for metadata extraction:
+        top level tags of metadata tags, tag 'Pixel Spacing', tags
+        of the image format (See class PartialPixelReader) and
+        tags 'Rescale Intercept' and 'Rescale Slope' (See class PixelImage).
+        Nested tags are read as part of their top level sequence.
+        For private tags (odd group) all private creator elements
+        (gggg,0010) - (gggg,00FF) of the group are read as well, otherwise
+        pydicom cannot name the private elements (as if the whole file is read).
+        :param list_of_indices: list of lists of hexstrings
+            (See attribute metadata_tags_list)
+        :return: list of pydicom.tag.BaseTag
+        """
+
+        tags = [pydicom.tag.Tag(0x0028, 0x0030)]
+        tags += [pydicom.tag.Tag(keyword) for keyword in PartialPixelReader.header_keywords]
+        tags += [pydicom.tag.Tag(0x0028, 0x1052), pydicom.tag.Tag(0x0028, 0x1053)]
+        for prop_index in list_of_indices:
+            if len(prop_index) < 2:
+                continue
+            try:
+                tag = pydicom.tag.Tag(int(prop_index[0], 16), int(prop_index[1], 16))
+            except ValueError:
+                continue
+            if tag not in tags:
+                tags.append(tag)
+            if tag.is_private:
+                # private creators reserving blocks of the group
+                for element in range(0x0010, 0x0100):
+                    creator_tag = pydicom.tag.Tag(tag.group, element)
+                    if creator_tag not in tags:
+                        tags.append(creator_tag)
+        return tags
+
+    def read_header(self, image_file):
+        """
+        Read header of dicom-file without pixel data.
+        Only the tags of attribute metadata_header_tags are read.
+        Reading stops before Pixel Data, so that the position of an opened
+        file is the position of Pixel Data afterwards (See method create_base_array).
+        :param image_file: string or file object
+            Absolute path to dicom-file or dicom-file opened in binary mode.
+        :return: Dataset object
+            Dataset object containing only the read tags.
+        """
+
+        return pydicom.dcmread(image_file, force=True, stop_before_pixels=True,
+                               specific_tags=self.metadata_header_tags)
+
+    def get_series_metadata(self, image_file, dataset_dicom=None):
+        """
+        Get metadata of the series of image_file.
+
+        Metadata is extracted once per series folder (from the first
+        requested image) and cached in attribute series_metadata_dict.
+        Metadata stored in catalog is reused; otherwise only the
+        header of the file is read (or dataset_dicom is used, if passed).
+        :param image_file: string
+            Absolute path to image file.
+        :param dataset_dicom: Dataset object or None
+            Already read Dataset object of image_file.
+        :return: dict
+            (See attribute metadata_subdict)
+        """
+
+        series_folder = os.path.dirname(image_file)
+        metadata_subdict = self.series_metadata_dict.get(series_folder)
+        if metadata_subdict is not None:
+            return metadata_subdict
+
+        # if the image is not a dicom
+        if os.path.basename(image_file)[-4:] != '.dcm':
+            metadata_subdict = {'undefined': 'undefined'}
+        else:
+            if self.catalog is not None:
+                metadata_subdict = self.catalog.get_metadata(image_file=image_file,
+                                                             metadata_tags=self.metadata_tags_list)
+            if metadata_subdict is None:
+                if dataset_dicom is None:
+                    dataset_dicom = self.read_header(image_file)
+                metadata_subdict = StartClass.create_dataset_dictionary(
+                    list_of_indices=self.metadata_tags_list,
+                    dataset_dicom=dataset_dicom
+                )
+                if self.catalog is not None:
+                    self.catalog.update_metadata(image_file=image_file,
+                                                 metadata_tags=self.metadata_tags_list,
+                                                 metadata_subdict=metadata_subdict)
+        # if several threads extract metadata of the same series,
+        # the metadata stored first is used
+        return self.series_metadata_dict.setdefault(series_folder, metadata_subdict)
+
+    def create_base_array(self, image_file, row_range=None):
 
         """
         Read current dicom file and retrieve pixel array.
-        Retrieve part of meta data
-        and update attribute metadata_dict
+        Retrieve part of meta data of the series (See method get_series_metadata)
+        and update attribute metadata_dict.
+        Images are taken from the volume of their series (See attribute volume_cache)
+        or decoded and cached (See attribute pixel_cache).
+        If row_range is passed and the image is not cached, only these rows
+        are read from uncompressed dicoms (See attribute partial_reader).
         :param image_file: string
             Absolute path to current image.
+        :param row_range: tuple of two ints or None
+            First row and row after the last row, that are needed.
+            None (by default): the whole image is needed.
         :return: dict
-            Key: 'base_array' : Value: pixel array of current image;
+            Key: 'base_array' : Value: read-only pixel array of current image (See method read_image)
+                                       (or of rows starting at row_offset);
             Key: 'meatdata_subdict' : Value: dict of specified metadata;
-            Key: 'whole_dcm' : Value: Dataset object of current dicom.
+            Key: 'whole_dcm' : Value: Dataset object of current dicom without pixel data;
+            Key: 'row_offset' : Value: index of the first row of base_array in the image;
+            Key: 'pixel_image' : Value: instance of class PixelImage
+                                        (base_array, rescaled if useRescale is True).
         """
 
         print('create_base_array is being executed')
 
+        image_dict = None
+        row_offset = 0
+        # images of series stored as volume are sliced out of the memory-mapped volume
+        if self.volume_cache is not None:
+            image_dict = self.volume_cache.get_image(image_file=image_file,
+                                                     read_function=self.read_image)
+        if image_dict is None:
+            # decoded images are taken from pixel cache, if the file is unchanged
+            cache_key = StartClass.pixel_cache_key(image_file)
+            image_dict = self.get_cached_image(cache_key)
+            # only needed rows are read, if the image is not cached
+            if image_dict is None and row_range is not None and self.partial_reader is not None \
+                    and os.path.basename(image_file)[-4:] == '.dcm':
+                with open(image_file, 'rb') as file_to_read:
+                    header_dcm = self.read_header(file_to_read)
+                    # position of Pixel Data of this file (headers differ in length within a series)
+                    pixel_data_position = file_to_read.tell()
+                band = self.partial_reader.read_rows(image_file=image_file,
+                                                     dataset_dicom=header_dcm,
+                                                     pixel_data_position=pixel_data_position,
+                                                     row_start=row_range[0],
+                                                     row_end=row_range[1])
+                if band is not None:
+                    band.flags.writeable = False
+                    image_dict = {'base_array': band,
+                                  'metadata_subdict': self.get_series_metadata(image_file=image_file,
+                                                                               dataset_dicom=header_dcm),
+                                  'whole_dcm': header_dcm}
+                    row_offset = row_range[0]
+            if image_dict is None:
+                image_dict = self.read_image(image_file)
+                self.cache_image(cache_key, image_dict)
+        array = image_dict['base_array']
+        metadata_subdict = image_dict['metadata_subdict']
+
+        self.metadata_subdict = metadata_subdict
+        # if the image is not a dicom, store 'undefined' in metadata_dict
+        if os.path.basename(image_file)[-4:] == '.dcm':
+            self.metadata_dict.update({image_file: metadata_subdict})
+        else:
+            self.metadata_dict.update({image_file: {'undefined_tag': 'undefined'}})
+        self.array = array
+        # image measurements
+        self.px_height = array.shape[0]
+        self.px_width = array.shape[1]
+        # image file base name without extension
+        self.basename = os.path.basename(image_file)[:-4]
+        # image file base name with extension
+        self.basename_w_ext = os.path.basename(image_file)
+        # Rescale Slope and Intercept applied to ROIs
+        if self.useRescale:
+            rescale_slope, rescale_intercept = PixelImage.rescale_parameters(image_dict['whole_dcm'])
+        else:
+            rescale_slope, rescale_intercept = 1.0, 0.0
+
+        ret_dict = {'base_array': array,
+                    'metadata_subdict': metadata_subdict,
+                    'whole_dcm': image_dict['whole_dcm'],
+                    'row_offset': row_offset,
+                    'pixel_image': PixelImage(pixels=array, row_offset=row_offset,
+                                              rescale_slope=rescale_slope,
+                                              rescale_intercept=rescale_intercept)}
+
+        print('create_base_array is done')
+
+        return ret_dict
+
+    def read_image(self, image_file):
+
+        """
+        Read and decode image file (See method create_base_array).
+        :param image_file: string
+            Absolute path to current image.
+        :return: dict
+            Key: 'base_array' : Value: read-only pixel array of current image
+                                       (native data type of dicoms, int16 of other images);
+            Key: 'metadata_subdict' : Value: dict of specified metadata;
+            Key: 'whole_dcm' : Value: Dataset object of current dicom without pixel data.
+        """
+
         # if we handle with dicom-file
         if os.path.basename(image_file)[-4:] == '.dcm':
             try:
@@ -562,44 +1025,129 @@ class StartClass:
                 print('\n\n\nThere is a problem with the file: ')
                 print(image_file)
             gc.collect()
-            self.array = image_dcm.pixel_array
-            self.metadata_subdict = StartClass.create_dataset_dictionary(
-                list_of_indices=self.metadata_tags_list,
-                dataset_dicom=image_dcm
-            )
-            metadata_subdict = self.metadata_subdict
-            self.metadata_dict.update({image_file: self.metadata_subdict})
+            # local variables are used, so that several threads
+            # can read images simultaneously (see ProcessROI.process_image)
+            array = image_dcm.pixel_array
+            # metadata is extracted once per series
+            metadata_subdict = self.get_series_metadata(image_file=image_file,
+                                                        dataset_dicom=image_dcm)
+            # drop raw and decoded pixel data from Dataset object
+            # (only the header is kept in pixel cache)
+            del image_dcm.PixelData
 
         # if we handle file with another file-extension
         else:
             # read image as list with PIL-library
             img = Image.open(image_file)
             # convert list into numpy-array
-            self.array = np.array(img)
+            array = np.array(img)
             # if we have colored image
-            if len(self.array.shape) > 2:
-                self.array = self.rgb2gray(self.array)
-            self.metadata_subdict = {'undefined': 'undefined'}
+            if len(array.shape) > 2:
+                array = self.rgb2gray(array)
+            # pixel values of other images are truncated to int16 as they have
+            # always been (only dicoms are kept in their native data type)
+            array = array.astype(np.int16)
             metadata_subdict = {'undefined': 'undefined'}
-
-            # if the image is not a dicom, store 'undefined' in metadata_dict
-            self.metadata_dict.update({image_file: {'undefined_tag': 'undefined'}})
             image_dcm = ''
-        # image measurements
-        self.px_height = self.array.shape[0]
-        self.px_width = self.array.shape[1]
-        # image file base name without extension
-        self.basename = os.path.basename(image_file)[:-4]
-        # image file base name with extension
-        self.basename_w_ext = os.path.basename(image_file)
 
-        ret_dict = {'base_array': self.array.astype(np.int16),
-                    'metadata_subdict': metadata_subdict,
-                    'whole_dcm': image_dcm}
+        # decoded array is used in its native data type without copy
+        base_array = array
+        # cached arrays are shared by all callers
+        base_array.flags.writeable = False
+        return {'base_array': base_array,
+                'metadata_subdict': metadata_subdict,
+                'whole_dcm': image_dcm}
 
-        print('create_base_array is done')
+    @staticmethod
+    def pixel_cache_key(image_file):
 
-        return ret_dict
+        """
+        Build key of pixel cache for image file.
+        :param image_file: string
+            Absolute path to image file.
+        :return: tuple or None
+            Path, modification time (ns) and size of the file;
+            None, if the file cannot be accessed.
+        """
+
+        try:
+            file_stat = os.stat(image_file)
+        except OSError:
+            return None
+        return image_file, file_stat.st_mtime_ns, file_stat.st_size
+
+    def get_cached_image(self, cache_key):
+
+        """
+        Get decoded image from pixel cache and mark it as recently used.
+        :param cache_key: tuple or None
+            (See return value of static method pixel_cache_key)
+        :return: dict or None
+            (See return value of method read_image)
+            None, if the image is not cached.
+        """
+
+        with self.pixel_cache_lock:
+            image_dict = self.pixel_cache.get(cache_key)
+            if image_dict is None:
+                self.pixel_cache_statistics['misses'] += 1
+                return None
+            self.pixel_cache.move_to_end(cache_key)
+            self.pixel_cache_statistics['hits'] += 1
+        return image_dict
+
+    def cache_image(self, cache_key, image_dict):
+
+        """
+        Store decoded image in pixel cache. Least recently used images
+        are evicted, if the size of cached arrays exceeds pixel_cache_budget.
+        :param cache_key: tuple or None
+            (See return value of static method pixel_cache_key)
+        :param image_dict: dict
+            (See return value of method read_image)
+        :return: nothing
+        """
+
+        nbytes = image_dict['base_array'].nbytes
+        if cache_key is None or nbytes > self.pixel_cache_budget:
+            return
+        with self.pixel_cache_lock:
+            if cache_key in self.pixel_cache:
+                return
+            self.pixel_cache.update({cache_key: image_dict})
+            self.pixel_cache_statistics['bytes'] += nbytes
+            while self.pixel_cache_statistics['bytes'] > self.pixel_cache_budget:
+                evicted_key, evicted_dict = self.pixel_cache.popitem(last=False)
+                self.pixel_cache_statistics['bytes'] -= evicted_dict['base_array'].nbytes
+                self.pixel_cache_statistics['evictions'] += 1
+            self.pixel_cache_statistics['entries'] = len(self.pixel_cache)
+
+    def __getstate__(self):
+
+        """
+        Drop pixel cache and its lock, that are not passed to worker processes.
+        :return: dict
+            Attributes of the object.
+        """
+
+        state = self.__dict__.copy()
+        state.pop('pixel_cache_lock')
+        state.update({'pixel_cache': OrderedDict(),
+                      'pixel_cache_statistics': {'hits': 0, 'misses': 0, 'evictions': 0,
+                                                 'entries': 0, 'bytes': 0}})
+        return state
+
+    def __setstate__(self, state):
+
+        """
+        Restore attributes and create new lock of pixel cache in worker process.
+        :param state: dict
+            (See return value of method __getstate__)
+        :return: nothing
+        """
+
+        self.__dict__.update(state)
+        self.pixel_cache_lock = threading.Lock()
 
     def rgb2gray(self, rgb):
 
@@ -0,0 +1,130 @@
+"""
+Micro-benchmarks of the NPS computation steps.
+
+Each benchmark compares two implementations of a step in class ProcessROI
+(e.g. the current one with the former one kept here as reference)
+on random arrays and checks, that both yield the same result.
+
+Usage:
+    python benchmark_nps.py
+"""
+
+from imports_nps import *
+from ProcessROI import ProcessROI
+
+
+def radial_mean_legacy(array):
+
+    """
+    Former implementation of ProcessROI.radial_mean (meshgrid and
+    np.vectorize over all radii). Used as reference.
+
+    :param array: ndarray (2d)
+        Two-dimensional NPS of current ROI.
+    :return: ndarray (1d)
+        Radial mean of the 2d-NPS.
+    """
+
+    image = array
+    image_height = array.shape[0]
+    image_width = array.shape[1]
+    center_x = image_width // 2
+    center_y = image_height // 2
+    max_size = max(image_height, image_width)
+    # create array of radii
+    x, y = np.meshgrid(np.arange(image.shape[1]), np.arange(image.shape[0]))
+    R = np.sqrt((x - center_x) ** 2 + (y - center_y) ** 2)
+
+    # calculate the mean
+    f = lambda r: image[(R >= r - .5) & (R < r + .5)].mean()
+    r = np.linspace(0, max_size // 2, num=max_size // 2 + 1)
+    mean = np.vectorize(f)(r)
+    mean = [array[center_y][center_x]] + mean
+    return mean
+
+
+def time_function(function, argument, repeats):
+
+    """
+    Measure mean execution time of function.
+
+    :param function: callable
+        Function to be measured.
+    :param argument: any
+        Single argument passed to function.
+    :param repeats: int
+        Number of calls.
+    :return: tuple
+        Mean time per call in seconds and result of the last call.
+    """
+
+    start_time = time.perf_counter()
+    for _ in range(repeats):
+        result = function(argument)
+    return (time.perf_counter() - start_time) / repeats, result
+
+
+def benchmark_radial_mean(shapes=((64, 64), (128, 128), (256, 256), (64, 128)), repeats=5):
+
+    """
+    Compare ProcessROI.radial_mean with its former implementation.
+
+    :param shapes: tuple of tuples of int
+        Shapes of tested 2d-NPS arrays.
+    :param repeats: int
+        Number of calls for each shape.
+    :return: nothing
+    """
+
+    rng = np.random.default_rng(0)
+    print('radial_mean: shape, legacy [ms], binned [ms], speed-up, max. rel. deviation')
+    for shape in shapes:
+        nps_2d = rng.random(shape)
+        time_legacy, result_legacy = time_function(radial_mean_legacy, nps_2d, repeats)
+        time_binned, result_binned = time_function(ProcessROI.radial_mean, nps_2d, repeats)
+        max_deviation = np.max(np.abs(result_binned - result_legacy) / np.abs(result_legacy))
+        assert np.allclose(result_binned, result_legacy, rtol=1e-12, atol=0)
+        print('%dx%d: %.3f, %.3f, %.1fx, %.2e' % (shape[0], shape[1],
+                                                  time_legacy * 1000,
+                                                  time_binned * 1000,
+                                                  time_legacy / time_binned,
+                                                  max_deviation))
+
+
+def benchmark_nps_kernels(shapes=((64, 64), (128, 128), (256, 256), (64, 128)), num_rois=25, repeats=5):
+
+    """
+    Compare NPS kernels 'fft2' and 'rfft2' of ProcessROI.nps_spectrum_stack.
+
+    :param shapes: tuple of tuples of int
+        Shapes of tested ROIs.
+    :param num_rois: int
+        Number of ROIs in one stack.
+    :param repeats: int
+        Number of calls for each shape.
+    :return: nothing
+    """
+
+    rng = np.random.default_rng(0)
+    print('nps kernels: shape, fft2 [ms], rfft2 [ms], speed-up, max. rel. deviation of 1d-NPS')
+    for shape in shapes:
+        stack = rng.standard_normal((num_rois,) + shape)
+        time_full, result_full = time_function(fut.partial(ProcessROI.nps_spectrum_stack, kernel='fft2'),
+                                               stack, repeats)
+        time_half, result_half = time_function(fut.partial(ProcessROI.nps_spectrum_stack, kernel='rfft2'),
+                                               stack, repeats)
+        max_deviation = np.max(np.abs(result_half['nps_1d'] - result_full['nps_1d']) /
+                               np.abs(result_full['nps_1d']))
+        assert np.allclose(result_half['nps_1d'], result_full['nps_1d'], rtol=1e-10, atol=0)
+        assert np.allclose(result_half['integral_of_2d_NPS'], result_full['integral_of_2d_NPS'],
+                           rtol=1e-12, atol=0)
+        print('%dx%d: %.3f, %.3f, %.1fx, %.2e' % (shape[0], shape[1],
+                                                  time_full * 1000,
+                                                  time_half * 1000,
+                                                  time_full / time_half,
+                                                  max_deviation))
+
+
+if __name__ == '__main__':
+    benchmark_radial_mean()
+    benchmark_nps_kernels()
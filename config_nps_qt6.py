@@ -6,6 +6,28 @@ init_dict = {
              'trunc_percentage': 1,
              'multipleFiles': True,
              'useFitting': False,
+             'useBatchedFFT': True,
+             'nps_kernel': 'fft2',
+             'nps_image_policy': 'image_ensemble',
+             'nps_image_queue_size': 64,
+             'useEnsembleNPS': False,
+             'num_series_workers': 1,
+             'num_image_threads': 1,
+             'prefetch_depth': 2,
+             'num_prefetch_threads': 2,
+             'useNoiseMap': False,
+             'noise_map_window': 32,
+             'noise_map_stride': 8,
+             'noise_map_z_average': 1,
+             'num_discovery_threads': 8,
+             'useCatalog': True,
+             'catalog_name': 'nps_catalog.sqlite',
+             'catalog_folder': None,
+             'pixel_cache_mb': 512,
+             'useVolumeCache': False,
+             'usePartialReads': True,
+             'useRescale': False,
+             'exclusion_order': 'file_order',
              'fitting_order': 2,
              'image_height_in_mm': 'undefined',
              'image_width_in_mm': 'undefined',
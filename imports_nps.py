@@ -1,18 +1,28 @@
 import gc
 import re
-import tkinter as tk
-from tkinter import *
-from tkinter.filedialog import askdirectory
 import numpy as np
 import os
+import sys
+try:
+    import tkinter as tk
+    from tkinter import *
+    from tkinter.filedialog import askdirectory
+    from PIL import ImageTk
+except ImportError:
+    # Python without Tk (e.g. headless servers): only the batch run (BatchNPS) is possible
+    tk = None
 import xlsxwriter as xlsx
 import openpyxl as opxl
 from natsort import natsorted, ns
 import pydicom
-import matplotlib.pyplot as plt
 import matplotlib
-matplotlib.use('TkAgg')
-from PIL import Image, ImageTk
+# backend is chosen before pyplot is imported: TkAgg for the GUI, Agg without display
+# (e.g. nightly batch runs on servers), a backend set in MPLBACKEND is kept
+if 'MPLBACKEND' not in os.environ:
+    matplotlib.use('TkAgg' if tk is not None and (os.environ.get('DISPLAY') or sys.platform in ('win32', 'darwin'))
+                   else 'Agg')
+import matplotlib.pyplot as plt
+from PIL import Image
 import itertools
 import cv2
 import time
@@ -21,4 +31,11 @@ import pandas as pd
 import docx
 from scipy import optimize as opt
 import multiprocessing as mp
+from concurrent.futures import ThreadPoolExecutor
 import json
+import argparse
+import traceback
+import threading
+import sqlite3
+from collections import OrderedDict, deque
+import hashlib
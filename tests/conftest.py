@@ -0,0 +1,114 @@
+"""
+Shared fixtures of the tests.
+
+Modules of the program are flat top-level modules, so that the folder
+of the program is put on sys.path. Synthetic dicom-images are written
+with pydicom (uncompressed, explicit VR little endian).
+"""
+
+import os
+import sys
+
+import numpy as np
+import pydicom
+import pytest
+from pydicom.dataset import Dataset, FileMetaDataset
+from pydicom.sequence import Sequence
+from pydicom.uid import ExplicitVRLittleEndian, generate_uid
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+
+def write_dicom(path_to_file, pixels, private_tags=True, **elements):
+
+    """
+    Write 16-bit single-frame dicom-image.
+
+    :param path_to_file: string
+        Path to created file.
+    :param pixels: ndarray (2d, int16 or uint16)
+        Pixel values.
+    :param private_tags: boolean
+        Whether private elements (7005,100a) 'Table Speed in mm/rot' and
+        (0905,1030) 'Assigning Authority For Patient ID' are written
+        (the private metadata tags of the default config).
+    :param elements: keywords and values of further elements
+    :return: string
+        path_to_file
+    """
+
+    file_meta = FileMetaDataset()
+    file_meta.TransferSyntaxUID = ExplicitVRLittleEndian
+    file_meta.MediaStorageSOPClassUID = '1.2.840.10008.5.1.4.1.1.2'
+    file_meta.MediaStorageSOPInstanceUID = generate_uid()
+    dataset_dicom = Dataset()
+    dataset_dicom.file_meta = file_meta
+    dataset_dicom.SOPInstanceUID = file_meta.MediaStorageSOPInstanceUID
+    dataset_dicom.Rows, dataset_dicom.Columns = pixels.shape
+    dataset_dicom.BitsAllocated = 16
+    dataset_dicom.BitsStored = 16
+    dataset_dicom.HighBit = 15
+    dataset_dicom.PixelRepresentation = 1 if pixels.dtype == np.int16 else 0
+    dataset_dicom.SamplesPerPixel = 1
+    dataset_dicom.PhotometricInterpretation = 'MONOCHROME2'
+    dataset_dicom.PixelSpacing = [0.5, 0.5]
+    for keyword, value in elements.items():
+        setattr(dataset_dicom, keyword, value)
+    if private_tags:
+        dataset_dicom.private_block(0x7005, 'TOSHIBA_MEC_CT3', create=True).add_new(0x0a, 'DS', '12.5')
+        dataset_dicom.private_block(0x0905, 'GEIIS', create=True).add_new(0x30, 'LO', 'AUTHORITY')
+    dataset_dicom.PixelData = pixels.tobytes()
+    dataset_dicom.save_as(path_to_file, enforce_file_format=True)
+    return path_to_file
+
+
+@pytest.fixture
+def dicom_dataset(tmp_path):
+
+    """
+    Data set of two studies with two series of six noise images each
+    (with the metadata tags of the default config).
+
+    :return: string
+        Path to root folder of the data set.
+    """
+
+    rng = np.random.default_rng(0)
+    root = tmp_path / 'dataset'
+    for study in ('StudyA', 'StudyB'):
+        for num_series in (1, 2):
+            series_folder = root / study / ('S_%d' % num_series)
+            series_folder.mkdir(parents=True)
+            for num_image in range(6):
+                pixels = rng.normal(0, 20, (96, 96)).astype(np.int16)
+                request_attributes = Dataset()
+                request_attributes.RequestedProcedureDescription = 'Phantom %s' % study
+                write_dicom(str(series_folder / ('img_%03d.dcm' % (num_image + 1))), pixels,
+                            InstanceNumber=num_image + 1, StudyDescription=study,
+                            RequestAttributesSequence=Sequence([request_attributes]))
+    return str(root)
+
+
+def open_dataset(folder_with_images, **options):
+
+    """
+    Search images of folder as StartClass does for a run, without dialog windows,
+    preview images and catalog (unless passed in options).
+
+    :param folder_with_images: string
+        Path to folder with images.
+    :param options: further parameters of class StartClass
+    :return: StartClass object
+    """
+
+    from StartClass import StartClass
+
+    parameters = {'suffixes': ['.dcm'],
+                  'list_of_indices_raw': [],
+                  'folder_with_images': folder_with_images,
+                  'metadata_settings': '0x0008, 0x1030',
+                  'files_to_exclude': (0, 0),
+                  'createPNGImages': False,
+                  'useCatalog': False}
+    parameters.update(options)
+    return StartClass(**parameters)
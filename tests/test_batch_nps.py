@@ -0,0 +1,137 @@
+"""
+Checks of the headless batch run (BatchNPS.main): start without display,
+end-to-end run with the metadata tags of the default config, including private tags,
+and results of parallel runs (series workers, image threads) compared with the serial run.
+"""
+
+import glob
+import json
+import os
+import shutil
+import subprocess
+import sys
+
+import openpyxl
+import pytest
+
+from BatchNPS import main
+from config_nps_qt6 import init_dict
+
+PROGRAM_FOLDER = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+@pytest.fixture
+def restored_init_dict():
+
+    """
+    Restore init_dict and remove folder of series volumes created in the
+    folder of the program after the run.
+    """
+
+    saved_init_dict = dict(init_dict)
+    folder_of_volumes = os.path.join(PROGRAM_FOLDER, '04.Series_volumes')
+    existed_before = os.path.isdir(folder_of_volumes)
+    yield init_dict
+    init_dict.clear()
+    init_dict.update(saved_init_dict)
+    if not existed_before:
+        shutil.rmtree(folder_of_volumes, ignore_errors=True)
+
+
+def test_batch_run_with_private_metadata_tags(dicom_dataset, tmp_path, monkeypatch, restored_init_dict):
+    monkeypatch.chdir(tmp_path)
+    monkeypatch.setenv('XDG_CACHE_HOME', str(tmp_path / 'cache'))
+    roi_specification = tmp_path / 'rois.json'
+    roi_specification.write_text(json.dumps({'rois': [[10, 10, 42, 42], [50, 50, 82, 82]]}))
+    output_dir = tmp_path / 'output'
+
+    exit_code = main([dicom_dataset, str(roi_specification),
+                      '--exclude-start', '1', '--exclude-end', '1',
+                      '--output-dir', str(output_dir),
+                      '--option', 'first_data_set=true'])
+
+    assert exit_code == 0
+    workbook = openpyxl.load_workbook(str(output_dir / 'Summary_information.xlsx'))
+    rows = [row for row in workbook.active.iter_rows(values_only=True)
+            if any(value is not None for value in row)]
+    header = rows[0]
+    assert '[Table Speed in mm/rot]' in header
+    column = header.index('[Table Speed in mm/rot]')
+    series_rows = rows[1:]
+    assert len(series_rows) == 4
+    assert all(float(row[column]) == 12.5 for row in series_rows)
+
+
+def run_batch(dataset_root, output_dir, *options):
+
+    """
+    Run batch with two ROIs per image and get contents of all written workbooks.
+
+    :return: dict
+        Keys : paths of workbooks relative to output_dir or dataset_root;
+        Values : lists of rows of all sheets.
+    """
+
+    roi_specification = os.path.join(str(output_dir), 'rois.json')
+    os.makedirs(str(output_dir))
+    with open(roi_specification, 'w') as file_to_write:
+        json.dump({'rois': [[10, 10, 42, 42], [40, 20, 88, 60]]}, file_to_write)
+    arguments = [dataset_root, roi_specification, '--exclude-start', '1', '--exclude-end', '1',
+                 '--output-dir', str(output_dir), '--option', 'first_data_set=true']
+    for option in options:
+        arguments += ['--option', option]
+    assert main(arguments) == 0
+
+    contents = {}
+    for folder in (str(output_dir), dataset_root):
+        for dir_name, _, file_names in os.walk(folder):
+            for file_name in file_names:
+                if file_name.endswith('.xlsx'):
+                    path_to_workbook = os.path.join(dir_name, file_name)
+                    workbook = openpyxl.load_workbook(path_to_workbook)
+                    contents[os.path.relpath(path_to_workbook, folder)] = [
+                        (sheet.title, row) for sheet in workbook.worksheets
+                        for row in sheet.iter_rows(values_only=True)]
+    # results written into the data set are removed for the next run
+    for dir_name in os.listdir(dataset_root):
+        for results_folder in glob.glob(os.path.join(dataset_root, dir_name, 'Results_*')):
+            shutil.rmtree(results_folder)
+    return contents
+
+
+def test_series_workers_give_serial_results(dicom_dataset, tmp_path, monkeypatch, restored_init_dict):
+    monkeypatch.chdir(tmp_path)
+    monkeypatch.setenv('XDG_CACHE_HOME', str(tmp_path / 'cache'))
+    serial = run_batch(dicom_dataset, tmp_path / 'serial', 'num_series_workers=1')
+    parallel = run_batch(dicom_dataset, tmp_path / 'parallel', 'num_series_workers=3')
+
+    assert 'Summary_information.xlsx' in serial
+    assert any(path.startswith('Only_averaged_sheets') for path in serial)
+    assert any(path.startswith('Study') and 'Results_' in path for path in serial)
+    # series results of the workers are written in the order of the serial run
+    assert parallel == serial
+
+
+@pytest.mark.parametrize('options', [('num_image_threads=4',),
+                                     ('num_image_threads=3', 'useEnsembleNPS=true'),
+                                     ('num_image_threads=4', 'useFitting=true')])
+def test_image_threads_give_serial_results(dicom_dataset, tmp_path, monkeypatch, restored_init_dict, options):
+    monkeypatch.chdir(tmp_path)
+    monkeypatch.setenv('XDG_CACHE_HOME', str(tmp_path / 'cache'))
+    other_options = tuple(option for option in options if not option.startswith('num_image_threads'))
+    serial = run_batch(dicom_dataset, tmp_path / 'serial', 'num_image_threads=1', *other_options)
+    threaded = run_batch(dicom_dataset, tmp_path / 'threaded', *options)
+    assert threaded == serial
+
+
+@pytest.mark.skipif(sys.platform in ('win32', 'darwin'), reason='Tk needs no DISPLAY on this platform')
+def test_help_without_display():
+    # fresh interpreter, so that the backend of matplotlib is chosen without display
+    environment = {key: value for key, value in os.environ.items() if key not in ('DISPLAY', 'MPLBACKEND')}
+    completed = subprocess.run([sys.executable, '-c',
+                                'import BatchNPS, matplotlib; print(matplotlib.get_backend()); '
+                                'BatchNPS.main(["--help"])'],
+                               cwd=PROGRAM_FOLDER, env=environment, capture_output=True, text=True, timeout=120)
+    assert completed.returncode == 0, completed.stderr
+    assert completed.stdout.splitlines()[0].lower() == 'agg'
+    assert 'usage:' in completed.stdout and 'roi_specification' in completed.stdout
@@ -0,0 +1,91 @@
+"""
+NPS of ROIs computed in shape buckets (compute_nps_batch) compared with
+NPS computed for each ROI on its own (compute_nps) and with the 2d-NPS
+of np.fft.fft2; half-plane kernel 'rfft2' compared with kernel 'fft2'.
+"""
+
+import numpy as np
+import pytest
+
+from PolynomialDetrender import PolynomialDetrender
+from ProcessROI import ProcessROI
+
+
+def create_processor(useFitting=False, nps_kernel='fft2'):
+    # only the attributes used by compute_nps and compute_nps_batch
+    processor = ProcessROI.__new__(ProcessROI)
+    processor.im_width_in_mm = 'undefined'
+    processor.im_height_in_mm = 'undefined'
+    processor.px_width = 512
+    processor.px_height = 512
+    processor.pixel_size_in_mm = 0.5
+    processor.useFitting = useFitting
+    processor.nps_kernel = nps_kernel
+    processor.detrender = PolynomialDetrender(order=2) if useFitting else None
+    return processor
+
+
+def roi_arrays():
+    rng = np.random.default_rng(11)
+    shapes = [(32, 32), (24, 40), (32, 32), (17, 17), (24, 40), (32, 32)]
+    return [rng.normal(0, 15, shape) + 40 for shape in shapes]
+
+
+def assert_nps_dicts_equal(actual, expected):
+    assert actual.keys() == expected.keys()
+    for key in expected:
+        np.testing.assert_allclose(actual[key], expected[key], rtol=1e-10, atol=1e-12, err_msg=key)
+
+
+@pytest.mark.parametrize('useFitting', [False, True])
+def test_batch_equals_single_roi(useFitting):
+    processor = create_processor(useFitting=useFitting)
+    arrays = roi_arrays()
+    batched = processor.compute_nps_batch(arrays, pixel_spacing=(0.5, 0.5))
+    assert len(batched) == len(arrays)
+    for array, nps_dict in zip(arrays, batched):
+        assert_nps_dicts_equal(nps_dict, processor.compute_nps(array, pixel_spacing=(0.5, 0.5)))
+
+
+def test_nps_2d_equals_shifted_fft2():
+    processor = create_processor()
+    arrays = roi_arrays()
+    for array, nps_dict in zip(arrays, processor.compute_nps_batch(arrays, pixel_spacing=(0.5, 0.5))):
+        rows, columns = array.shape
+        expected = np.abs(np.fft.fftshift(np.fft.fft2(array - array.mean()))) ** 2 / rows ** 2 / columns ** 2
+        np.testing.assert_allclose(nps_dict['nps_2d'], expected, rtol=1e-10, atol=1e-12)
+        np.testing.assert_allclose(nps_dict['integral_of_2d_NPS'], expected.sum(), rtol=1e-10)
+        np.testing.assert_allclose(nps_dict['values'], ProcessROI.radial_mean(expected), rtol=1e-10)
+        assert len(nps_dict['frequencies']) == max(rows, columns) // 2
+
+
+@pytest.mark.parametrize('shape', [(32, 32), (24, 40), (40, 24), (17, 17), (16, 33), (1, 8)])
+def test_rfft2_kernel_equals_fft2_kernel(shape):
+    stack = np.random.default_rng(shape[0] * shape[1]).normal(0, 10, (3,) + shape)
+    stack -= stack.mean(axis=(1, 2), keepdims=True)
+    full = ProcessROI.nps_spectrum_stack(stack, kernel='fft2')
+    half = ProcessROI.nps_spectrum_stack(stack, kernel='rfft2')
+
+    assert half['nps_2d'].shape == (3, shape[0], shape[1] // 2 + 1)
+    np.testing.assert_allclose(half['integral_of_2d_NPS'], full['integral_of_2d_NPS'], rtol=1e-10)
+    np.testing.assert_allclose(half['nps_1d'], full['nps_1d'], rtol=1e-10, atol=1e-12, equal_nan=True)
+    for nps_half, nps_full in zip(half['nps_2d'], full['nps_2d']):
+        # restored full plane (e.g. for images of 2d-NPS)
+        np.testing.assert_allclose(ProcessROI.full_nps_2d(nps_half, shape, kernel='rfft2'), nps_full,
+                                   rtol=1e-10, atol=1e-12)
+
+
+@pytest.mark.parametrize('useFitting', [False, True])
+def test_rfft2_results_of_rois(useFitting):
+    arrays = roi_arrays()
+    expected = create_processor(useFitting=useFitting).compute_nps_batch(arrays, pixel_spacing=(0.5, 0.5))
+    actual = create_processor(useFitting=useFitting,
+                              nps_kernel='rfft2').compute_nps_batch(arrays, pixel_spacing=(0.5, 0.5))
+    for nps_half, nps_full in zip(actual, expected):
+        for key in ('values', 'frequencies', 'integral_of_2d_NPS', 'AUC'):
+            np.testing.assert_allclose(nps_half[key], nps_full[key], rtol=1e-10, atol=1e-12, err_msg=key)
+
+
+def test_unknown_kernel():
+    with pytest.raises(ValueError):
+        ProcessROI.nps_spectrum_stack(np.zeros((1, 8, 8)), kernel='dct')
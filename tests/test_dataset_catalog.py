@@ -0,0 +1,133 @@
+"""
+Reopening of a folder with the catalog of the previous run: reused listings,
+changed directories and files, catalog outside of the folder with images
+and concurrent saves of several workers.
+"""
+
+import os
+import pickle
+import threading
+
+import numpy as np
+
+from DatasetCatalog import DatasetCatalog
+from conftest import open_dataset, write_dicom
+
+
+def open_with_catalog(folder_with_images, catalog_folder):
+    return open_dataset(folder_with_images, useCatalog=True, catalog_folder=catalog_folder,
+                        num_discovery_threads=4)
+
+
+def snapshot(folder):
+    return {path: os.stat(path).st_mtime_ns for path, _, _ in os.walk(folder)}
+
+
+def test_reopened_folder_reuses_listings(dicom_dataset, tmp_path):
+    catalog_folder = str(tmp_path / 'catalogs')
+    first = open_with_catalog(dicom_dataset, catalog_folder)
+    assert first.discovery_info['num_reused_directories'] == 0
+
+    second = open_with_catalog(dicom_dataset, catalog_folder)
+    # root, 2 studies and 4 series
+    assert second.discovery_info['num_reused_directories'] == 7
+    assert second.filelist == first.filelist
+    assert second.filedict == first.filedict
+
+
+def test_folder_with_images_is_not_written(dicom_dataset, tmp_path, monkeypatch):
+    monkeypatch.setenv('XDG_CACHE_HOME', str(tmp_path / 'cache'))
+    listing_before = sorted(os.listdir(dicom_dataset))
+    mtimes_before = snapshot(dicom_dataset)
+
+    obj_arrays = open_dataset(dicom_dataset, useCatalog=True)
+    obj_arrays.get_series_metadata(obj_arrays.filelist[0])
+    obj_arrays.save_catalog()
+
+    assert sorted(os.listdir(dicom_dataset)) == listing_before
+    assert snapshot(dicom_dataset) == mtimes_before
+    catalog_file = obj_arrays.catalog.path_to_catalog
+    assert catalog_file.startswith(os.path.join(str(tmp_path / 'cache'), 'NPS_PyQt', 'catalogs'))
+    assert os.path.isfile(catalog_file)
+
+
+def test_catalogs_of_different_folders_are_separate(tmp_path):
+    paths = {DatasetCatalog(str(tmp_path / name), 'nps_catalog.sqlite', str(tmp_path)).path_to_catalog
+             for name in ('data_1', 'data_2', 'data_1')}
+    assert len(paths) == 2
+    assert all(os.path.basename(path).endswith('.sqlite') for path in paths)
+
+
+def test_only_changed_directory_is_listed_again(dicom_dataset, tmp_path):
+    catalog_folder = str(tmp_path / 'catalogs')
+    first = open_with_catalog(dicom_dataset, catalog_folder)
+    changed_series = os.path.join(dicom_dataset, 'StudyA', 'S_2')
+    new_file = os.path.join(changed_series, 'img_new.dcm')
+    write_dicom(new_file, np.zeros((96, 96), np.int16), InstanceNumber=7)
+    removed_file = os.path.join(dicom_dataset, 'StudyB', 'S_1', 'img_001.dcm')
+    assert removed_file in first.filelist
+    os.remove(removed_file)
+
+    second = open_with_catalog(dicom_dataset, catalog_folder)
+    # listings of root, 2 studies and 2 unchanged series are reused
+    assert second.discovery_info['num_reused_directories'] == 5
+    assert new_file in second.filelist
+    assert removed_file not in second.filelist
+    assert len(second.filelist) == len(first.filelist)
+
+    # the new listings are stored as well
+    third = open_with_catalog(dicom_dataset, catalog_folder)
+    assert third.discovery_info['num_reused_directories'] == 7
+    assert third.filelist == second.filelist
+
+
+def test_metadata_is_reused_until_file_changes(dicom_dataset, tmp_path):
+    catalog_folder = str(tmp_path / 'catalogs')
+    first = open_with_catalog(dicom_dataset, catalog_folder)
+    image_file = first.filelist[0]
+    metadata = first.get_series_metadata(image_file)
+    first.save_catalog()
+
+    second = open_with_catalog(dicom_dataset, catalog_folder)
+    assert second.catalog.get_metadata(image_file, second.metadata_tags_list) == metadata
+    # other tags: stored metadata is not valid
+    assert second.catalog.get_metadata(image_file, [['0x0008', '0x0060']]) is None
+
+    write_dicom(image_file, np.zeros((96, 96), np.int16), InstanceNumber=1, StudyDescription='changed')
+    third = open_with_catalog(dicom_dataset, catalog_folder)
+    assert third.catalog.get_metadata(image_file, third.metadata_tags_list) is None
+
+
+def test_concurrent_saves_of_workers(dicom_dataset, tmp_path):
+    catalog_folder = str(tmp_path / 'catalogs')
+    obj_arrays = open_with_catalog(dicom_dataset, catalog_folder)
+    metadata_tags = obj_arrays.metadata_tags_list
+    series_folders = sorted({os.path.dirname(image_file) for image_file in obj_arrays.filelist})
+
+    # each series worker gets a copy of the catalog (as in worker processes)
+    # and stores the metadata of its series at the same time as the others
+    workers = [pickle.loads(pickle.dumps(obj_arrays.catalog)) for _ in series_folders]
+    barrier = threading.Barrier(len(workers))
+    errors = []
+
+    def store_series(catalog, series_folder):
+        try:
+            for image_file in obj_arrays.filelist:
+                if os.path.dirname(image_file) == series_folder:
+                    catalog.update_metadata(image_file, metadata_tags, {'Series': os.path.basename(series_folder)})
+            barrier.wait(timeout=30)
+            catalog.save()
+        except Exception as error:
+            errors.append(error)
+
+    threads = [threading.Thread(target=store_series, args=args) for args in zip(workers, series_folders)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join(timeout=60)
+    assert errors == []
+
+    reopened = DatasetCatalog(dicom_dataset, 'nps_catalog.sqlite', catalog_folder)
+    for image_file in obj_arrays.filelist:
+        assert reopened.get_metadata(image_file, metadata_tags) == {
+            'Series': os.path.basename(os.path.dirname(image_file))}
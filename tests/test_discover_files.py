@@ -0,0 +1,72 @@
+"""
+Parallel level-by-level discovery of files compared with the former
+sequential os.walk of create_filelist and create_filedict.
+"""
+
+import os
+
+import pytest
+from natsort import natsorted, ns
+
+from conftest import open_dataset
+
+
+def walk_files(folder_with_images, suffixes):
+    # former create_filelist and create_filedict
+    lstFiles = []
+    directories_dict = {}
+    for dirName, subdirList, fileList in os.walk(folder_with_images):
+        for filename in fileList:
+            if any(suffix.lower() in filename.lower() for suffix in suffixes):
+                filepath = os.path.join(dirName, filename)
+                lstFiles.append(filepath)
+                directories_dict.setdefault(os.path.dirname(dirName), {}).setdefault(
+                    os.path.basename(dirName), []).append(filepath)
+    return natsorted(lstFiles, alg=ns.IGNORECASE, key=lambda x: x.split('_')[-1]), directories_dict
+
+
+@pytest.fixture
+def nested_tree(tmp_path):
+    root = tmp_path / 'tree'
+    files = ['Study_2/Series_10/img_2.dcm', 'Study_2/Series_10/img_10.DCM', 'Study_2/Series_10/notes.txt',
+             'Study_2/Series_9/img_1.dcm', 'Study_10/S_a/IMG_3.dcm', 'Study_10/S_a/deeper/x_7.dcm',
+             'Study_10/S_b/y_1.dcm', 'top_5.dcm', 'Empty/readme.md', 'study_1/S/z_4.dcm']
+    for name in files:
+        path_to_file = root / name
+        path_to_file.parent.mkdir(parents=True, exist_ok=True)
+        path_to_file.write_bytes(b'')
+    (root / 'Empty' / 'no_files').mkdir()
+    os.symlink(str(root / 'Study_2'), str(root / 'link_to_study'), target_is_directory=True)
+    return str(root)
+
+
+@pytest.mark.parametrize('num_discovery_threads', [1, 4])
+def test_discovery_equals_walk(nested_tree, num_discovery_threads):
+    obj_arrays = open_dataset(nested_tree, num_discovery_threads=num_discovery_threads)
+    discovery_info = obj_arrays.discover_files(pathtoFiles=nested_tree, suffix_array=['.dcm'])
+    expected_list, expected_dict = walk_files(nested_tree, ['.dcm'])
+
+    assert discovery_info['file_list'] == expected_list
+    assert discovery_info['file_dict'] == expected_dict
+    # order of studies, series and files, as os.walk yields them
+    assert list(discovery_info['file_dict']) == list(expected_dict)
+    for study in expected_dict:
+        assert list(discovery_info['file_dict'][study]) == list(expected_dict[study])
+    assert discovery_info['num_files_found'] == 8
+    # linked directory is not followed
+    assert not any('link_to_study' in path for path in discovery_info['file_list'])
+
+
+def test_unreadable_directory_is_skipped(nested_tree, monkeypatch):
+    locked = os.path.join(nested_tree, 'Study_10', 'S_b')
+    real_scandir = os.scandir
+
+    def scandir(path='.'):
+        if os.path.abspath(path) == locked:
+            raise PermissionError(path)
+        return real_scandir(path)
+
+    monkeypatch.setattr(os, 'scandir', scandir)
+    obj_arrays = open_dataset(nested_tree)
+    assert not any(os.path.dirname(path) == locked for path in obj_arrays.filelist)
+    assert len(obj_arrays.filelist) == 7
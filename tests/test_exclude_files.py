@@ -0,0 +1,87 @@
+"""
+Exclusion of files from the beginning and the end of each series:
+order of files in filedict compared with the former slicing of series lists,
+order by InstanceNumber of the DICOM headers.
+"""
+
+import copy
+import os
+
+import numpy as np
+import pytest
+
+from conftest import open_dataset, write_dicom
+
+
+def sliced_series(file_dict, start, end):
+    # former exclude_files (for end > 0)
+    file_dict = copy.deepcopy(file_dict)
+    excluded = set()
+    for folder in file_dict:
+        for series, files in file_dict[folder].items():
+            excluded.update(files[:start] + files[-end:])
+            file_dict[folder][series] = files[start:-end]
+    return file_dict, excluded
+
+
+def synthetic_files(root):
+    # file lists of series as found by discover_files (no files are read)
+    file_dict = {}
+    for study in ('Study_1', 'Study_2'):
+        for series, num_files in (('S_1', 9), ('S_2', 4), ('S_10', 1)):
+            folder = os.path.join(root, study, series)
+            file_dict.setdefault(os.path.join(root, study), {}).update(
+                {series: [os.path.join(folder, 'img_%d.dcm' % num) for num in (5, 1, 3, 2, 9, 7, 8, 4, 6)[:num_files]]})
+    file_list = [path for study in file_dict.values() for files in study.values() for path in files]
+    return file_dict, file_list
+
+
+@pytest.mark.parametrize('start, end', [(1, 1), (0, 2), (3, 1), (2, 3)])
+def test_file_order_equals_slicing(tmp_path, start, end):
+    obj_arrays = open_dataset(str(tmp_path))
+    file_dict, file_list = synthetic_files(str(tmp_path))
+    expected_dict, excluded = sliced_series(file_dict, start, end)
+
+    new_files = obj_arrays.exclude_files(copy.deepcopy(file_dict), list(file_list), start, end)
+
+    assert new_files['file_dict'] == expected_dict
+    assert set(new_files['file_list']) == set(file_list) - excluded
+
+
+def test_only_start_is_excluded(tmp_path):
+    # the former slicing [start:-0] dropped all files
+    obj_arrays = open_dataset(str(tmp_path))
+    file_dict, file_list = synthetic_files(str(tmp_path))
+    new_files = obj_arrays.exclude_files(copy.deepcopy(file_dict), list(file_list), 2, 0)
+    for study in file_dict:
+        for series, files in file_dict[study].items():
+            assert new_files['file_dict'][study][series] == files[2:]
+    assert len(new_files['file_list']) == 2 * (7 + 2 + 0)
+
+
+def test_exclusion_by_instance_number(tmp_path):
+    series_folder = tmp_path / 'data' / 'Study' / 'S_1'
+    series_folder.mkdir(parents=True)
+    # names in other order than the positions of the images
+    instance_numbers = {'a.dcm': 4, 'b.dcm': 1, 'c.dcm': 6, 'd.dcm': 2, 'e.dcm': None, 'f.dcm': 5, 'g.dcm': 3}
+    for name, instance_number in instance_numbers.items():
+        elements = {} if instance_number is None else {'InstanceNumber': instance_number}
+        write_dicom(str(series_folder / name), np.zeros((8, 8), np.int16), **elements)
+
+    study_folder = str(tmp_path / 'data' / 'Study')
+    found_files = open_dataset(str(tmp_path / 'data')).filedict[study_folder]['S_1']
+    series_order = [os.path.basename(path) for path in found_files]
+    by_file = open_dataset(str(tmp_path / 'data'), files_to_exclude=(1, 2))
+    by_header = open_dataset(str(tmp_path / 'data'), files_to_exclude=(1, 2), exclusion_order='InstanceNumber')
+
+    assert [os.path.basename(path) for path in by_file.filedict[study_folder]['S_1']] == series_order[1:-2]
+    # lowest InstanceNumber (b), image without InstanceNumber (e) and highest (c) are excluded;
+    # remaining files keep the order of the series
+    assert [os.path.basename(path) for path in by_header.filedict[study_folder]['S_1']] == [
+        name for name in series_order if name in ('a.dcm', 'd.dcm', 'f.dcm', 'g.dcm')]
+    assert [os.path.basename(path) for path in by_header.filelist] == ['a.dcm', 'd.dcm', 'f.dcm', 'g.dcm']
+
+
+def test_unknown_exclusion_order(tmp_path):
+    with pytest.raises(ValueError):
+        open_dataset(str(tmp_path), exclusion_order='AcquisitionTime')
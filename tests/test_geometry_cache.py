@@ -0,0 +1,93 @@
+"""
+GeometryCache compared with building data for each lookup.
+"""
+
+import pickle
+from concurrent.futures import ThreadPoolExecutor
+
+import numpy as np
+import pytest
+
+from GeometryCache import GeometryCache
+from ProcessROI import ProcessROI
+
+
+def build_bins(rows, columns):
+    i, j = np.indices((rows, columns))
+    return {'radius': np.hypot(i - rows // 2, j - columns // 2), 'shape': (rows, columns)}
+
+
+def test_lookups_equal_built_data():
+    cache = GeometryCache()
+    shapes = [(32, 32), (30, 40), (32, 32), (64, 64), (30, 40), (32, 32)]
+    for rows, columns in shapes:
+        cached = cache.get(('radial_bins', rows, columns), lambda: build_bins(rows, columns))
+        np.testing.assert_array_equal(cached['radius'], build_bins(rows, columns)['radius'])
+    assert cache.statistics == {'hits': 3, 'misses': 3, 'evictions': 0, 'entries': 3}
+
+
+def test_least_recently_used_entry_is_evicted():
+    cache = GeometryCache(max_entries=2)
+    builds = []
+
+    def get(key):
+        return cache.get(key, lambda: builds.append(key) or np.zeros(1))
+
+    get(('a',))
+    get(('b',))
+    # ('a',) becomes most recently used, ('b',) is evicted
+    get(('a',))
+    get(('c',))
+    assert list(cache.entries) == [('a',), ('c',)]
+    get(('b',))
+    assert builds == [('a',), ('b',), ('c',), ('b',)]
+    assert cache.statistics == {'hits': 1, 'misses': 4, 'evictions': 2, 'entries': 2}
+
+
+def test_cached_arrays_are_read_only():
+    cache = GeometryCache()
+    cached = cache.get(('radial_bins', 8, 8), lambda: build_bins(8, 8))
+    with pytest.raises(ValueError):
+        cached['radius'][0, 0] = 1
+    nested = cache.get(('nested',), lambda: (np.zeros(2), [np.zeros(3)]))
+    assert not nested[0].flags.writeable and not nested[1][0].flags.writeable
+
+
+def test_lookups_of_several_threads():
+    cache = GeometryCache(max_entries=4)
+    keys = [('radial_bins', 16 + size, 16) for size in range(6)] * 20
+    with ThreadPoolExecutor(max_workers=8) as executor:
+        results = list(executor.map(lambda key: cache.get(key, lambda: build_bins(*key[1:])), keys))
+    for key, result in zip(keys, results):
+        np.testing.assert_array_equal(result['radius'], build_bins(*key[1:])['radius'])
+    assert len(cache.entries) <= 4
+    assert cache.statistics['hits'] + cache.statistics['misses'] == len(keys)
+
+
+def test_pickled_cache_is_empty():
+    cache = GeometryCache(max_entries=3)
+    cache.get(('a',), lambda: np.zeros(1))
+    restored = pickle.loads(pickle.dumps(cache))
+    assert restored.max_entries == 3
+    assert len(restored.entries) == 0
+    assert restored.statistics == {'hits': 0, 'misses': 0, 'evictions': 0, 'entries': 0}
+    restored.get(('a',), lambda: np.zeros(1))
+    assert restored.statistics['misses'] == 1
+
+
+def test_invalid_size():
+    with pytest.raises(ValueError):
+        GeometryCache(max_entries=0)
+
+
+@pytest.mark.parametrize('shape', [(32, 32), (30, 40), (41, 27)])
+def test_cached_geometry_of_nps_equals_uncached(shape):
+    for kernel, build_function in [('fft2', ProcessROI.radial_bins), ('rfft2', ProcessROI.radial_bins_half)]:
+        expected = build_function(shape)
+        for _ in range(2):
+            cached = ProcessROI.cached_radial_bins(shape, kernel)
+            assert cached.keys() == expected.keys()
+            for key in expected:
+                np.testing.assert_array_equal(cached[key], expected[key])
+    np.testing.assert_array_equal(ProcessROI.nps_frequencies(max(shape), 0.5),
+                                  np.fft.fftfreq(max(shape), 0.05)[:max(shape) // 2])
@@ -0,0 +1,89 @@
+"""
+Window statistics of IntegralImage compared with np.mean and np.std of pixel arrays of windows.
+"""
+
+import numpy as np
+import pytest
+
+from IntegralImage import IntegralImage
+
+
+def naive_statistics(pixels, rois, row_offset=0, column_offset=0):
+    means, sds = [], []
+    for x0, y0, x1, y1 in rois:
+        window = pixels[max(y0 - row_offset, 0):max(y1 - row_offset, 0),
+                        max(x0 - column_offset, 0):max(x1 - column_offset, 0)].astype(np.float64)
+        means.append(np.mean(window) if window.size > 0 else np.nan)
+        sds.append(np.std(window) if window.size > 0 else np.nan)
+    return np.array(means), np.array(sds)
+
+
+@pytest.mark.parametrize('dtype, offset', [(np.int16, 0), (np.uint16, 0), (np.float32, 0), (np.float64, 1000.0)])
+def test_window_statistics(dtype, offset):
+    rng = np.random.default_rng(3)
+    pixels = (rng.normal(offset, 30, (64, 80)) + (1000 if dtype == np.uint16 else 0)).astype(dtype)
+    rois = [(0, 0, 80, 64), (10, 5, 42, 37), (11, 6, 43, 38), (70, 50, 90, 70), (3, 3, 4, 4), (20, 20, 20, 30)]
+    integral_image = IntegralImage(pixels)
+
+    statistics = integral_image.window_statistics(rois)
+
+    means, sds = naive_statistics(pixels, rois)
+    if np.issubdtype(dtype, np.integer):
+        np.testing.assert_allclose(statistics['mean'], means, rtol=1e-12)
+        np.testing.assert_allclose(statistics['SD'], sds, rtol=1e-12)
+    else:
+        # sums of shifted values lose digits of small windows
+        np.testing.assert_allclose(statistics['mean'], means, rtol=1e-12, atol=1e-9)
+        np.testing.assert_allclose(statistics['SD'], sds, rtol=1e-9, atol=1e-5)
+    np.testing.assert_array_equal(statistics['count'], [64 * 80, 32 * 32, 32 * 32, 10 * 14, 1, 0])
+
+
+def test_window_statistics_of_part_of_image():
+    rng = np.random.default_rng(4)
+    image = rng.integers(-1000, 1000, (100, 100)).astype(np.int16)
+    rois = np.array([(30, 40, 62, 72), (40, 45, 70, 90)])
+    x0, y0, x1, y1 = IntegralImage.bounding_box(rois)
+    integral_image = IntegralImage(image[y0:y1, x0:x1], row_offset=y0, column_offset=x0)
+
+    statistics = integral_image.window_statistics(rois)
+
+    means, sds = naive_statistics(image, rois)
+    np.testing.assert_allclose(statistics['mean'], means, rtol=1e-12)
+    np.testing.assert_allclose(statistics['SD'], sds, rtol=1e-12)
+
+
+def test_large_integer_windows_do_not_overflow():
+    pixels = np.full((2048, 2048), -32768, dtype=np.int16)
+    pixels[::2] = 32767
+    integral_image = IntegralImage(pixels)
+
+    statistics = integral_image.window_statistics([(0, 0, 2048, 2048)])
+
+    means, sds = naive_statistics(pixels, [(0, 0, 2048, 2048)])
+    np.testing.assert_allclose(statistics['mean'], means, rtol=1e-12)
+    np.testing.assert_allclose(statistics['SD'], sds, rtol=1e-12)
+
+
+@pytest.mark.parametrize('window, stride', [(16, 8), ((8, 12), (3, 5)), (64, 1)])
+def test_window_maps(window, stride):
+    rng = np.random.default_rng(5)
+    pixels = rng.integers(0, 4096, (64, 72)).astype(np.uint16)
+    integral_image = IntegralImage(pixels)
+
+    maps = integral_image.window_maps(window, stride)
+
+    window_height, window_width = np.broadcast_to(window, 2)
+    for i, row in enumerate(maps['row_starts']):
+        for j, column in enumerate(maps['column_starts']):
+            pixel_window = pixels[row:row + window_height, column:column + window_width].astype(np.float64)
+            assert pixel_window.shape == (window_height, window_width)
+            assert maps['mean'][i, j] == pytest.approx(np.mean(pixel_window), rel=1e-12)
+            assert maps['SD'][i, j] == pytest.approx(np.std(pixel_window), rel=1e-12)
+    assert maps['row_starts'][-1] + window_height > 64 - np.broadcast_to(stride, 2)[0]
+
+
+def test_pays_off_for_many_overlapping_windows():
+    assert not IntegralImage.pays_off([])
+    assert not IntegralImage.pays_off([(0, 0, 32, 32)])
+    sliding_windows = [(x, y, x + 32, y + 32) for x in range(0, 200, 4) for y in range(0, 200, 4)]
+    assert IntegralImage.pays_off(sliding_windows)
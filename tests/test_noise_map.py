@@ -0,0 +1,101 @@
+"""
+Local noise maps: maps of slices compared with SD of windows cut out by
+sliding_window_view, pooled SD along z, saved files and noise maps of a
+batch run written outside of the data set.
+"""
+
+import glob
+import json
+import os
+import shutil
+
+import numpy as np
+import pytest
+from numpy.lib.stride_tricks import sliding_window_view
+
+from BatchNPS import main
+from NoiseMap import NoiseMap
+from PixelImage import PixelImage
+from config_nps_qt6 import init_dict
+
+
+def sliding_window_maps(pixels, window, stride, rescale_slope=1.0, rescale_intercept=0.0):
+    windows = sliding_window_view(pixels * rescale_slope + rescale_intercept, (window, window))[::stride, ::stride]
+    return windows.mean(axis=(2, 3)), windows.std(axis=(2, 3))
+
+
+@pytest.mark.parametrize('window, stride', [(16, 4), (7, 3), (50, 1), (64, 64)])
+def test_maps_of_slice_equal_sliding_windows(window, stride):
+    pixels = np.random.default_rng(window).integers(-1024, 2000, (64, 80)).astype(np.int16)
+    maps = NoiseMap(window=window, stride=stride).compute(PixelImage(pixels=pixels))
+    expected_mean, expected_sd = sliding_window_maps(pixels.astype(float), window, stride)
+
+    np.testing.assert_allclose(maps['mean'], expected_mean, rtol=1e-10, atol=1e-9)
+    np.testing.assert_allclose(maps['SD'], expected_sd, rtol=1e-8, atol=1e-6)
+    np.testing.assert_array_equal(maps['row_starts'], np.arange(0, 64 - window + 1, stride))
+    np.testing.assert_array_equal(maps['column_starts'], np.arange(0, 80 - window + 1, stride))
+
+
+def test_rescale_of_slice_is_applied():
+    pixels = np.random.default_rng(1).integers(0, 4095, (48, 48)).astype(np.uint16)
+    maps = NoiseMap(window=12, stride=6).compute(PixelImage(pixels=pixels, rescale_slope=-0.5,
+                                                            rescale_intercept=-1024.0))
+    expected_mean, expected_sd = sliding_window_maps(pixels.astype(float), 12, 6, -0.5, -1024.0)
+    np.testing.assert_allclose(maps['mean'], expected_mean, rtol=1e-10)
+    np.testing.assert_allclose(maps['SD'], expected_sd, rtol=1e-8)
+
+
+@pytest.mark.parametrize('z_average', [1, 2, 3, 0, 9])
+def test_pooled_sd_along_z(z_average):
+    sd_stack = np.random.default_rng(2).random((5, 4, 6)) * 20
+    averaged = NoiseMap(z_average=z_average).average_along_z(sd_stack)
+    num_averaged = 5 if z_average in (0, 9) else z_average
+    expected = [np.sqrt(np.mean(sd_stack[first:first + num_averaged] ** 2, axis=0))
+                for first in range(5 - num_averaged + 1)]
+    np.testing.assert_allclose(averaged, expected, rtol=1e-12)
+
+
+def test_saved_maps(tmp_path):
+    noise_map = NoiseMap(window=8, stride=4, z_average=2)
+    rng = np.random.default_rng(3)
+    slice_maps = [noise_map.compute(PixelImage(pixels=rng.normal(0, 10, (32, 32)))) for _ in range(3)]
+    created_files = noise_map.save(slice_maps, ['a.dcm', 'b.dcm', 'c.dcm'], str(tmp_path / 'maps'),
+                                   preview_filename=str(tmp_path / 'preview.jpg'))
+
+    assert created_files == [str(tmp_path / 'maps.npz'), str(tmp_path / 'preview.jpg')]
+    assert os.path.isfile(str(tmp_path / 'preview.jpg'))
+    with np.load(str(tmp_path / 'maps.npz')) as saved:
+        np.testing.assert_array_equal(saved['SD'], np.stack([maps['SD'] for maps in slice_maps]))
+        assert saved['SD_z_average'].shape == (2, 7, 7)
+        assert list(saved['image_files']) == ['a.dcm', 'b.dcm', 'c.dcm']
+        assert int(saved['window']) == 8 and int(saved['stride']) == 4
+
+
+def test_batch_run_writes_noise_maps_outside_of_data_set(dicom_dataset, tmp_path, monkeypatch):
+    saved_init_dict = dict(init_dict)
+    monkeypatch.chdir(tmp_path)
+    monkeypatch.setenv('XDG_CACHE_HOME', str(tmp_path / 'cache'))
+    roi_specification = tmp_path / 'rois.json'
+    roi_specification.write_text(json.dumps({'rois': [[10, 10, 42, 42]]}))
+    files_before = sorted(glob.glob(os.path.join(dicom_dataset, '**', '*.*'), recursive=True))
+    try:
+        exit_code = main([dicom_dataset, str(roi_specification), '--exclude-start', '1', '--exclude-end', '1',
+                          '--output-dir', str(tmp_path / 'output'), '--option', 'first_data_set=true',
+                          '--option', 'useNoiseMap=true', '--option', 'noise_map_window=16',
+                          '--option', 'noise_map_stride=8'])
+    finally:
+        init_dict.clear()
+        init_dict.update(saved_init_dict)
+        shutil.rmtree(os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))),
+                                   '04.Series_volumes'), ignore_errors=True)
+    assert exit_code == 0
+
+    # one npz-file with the results of each series, previews in the output folder
+    noise_maps = glob.glob(os.path.join(dicom_dataset, '*', 'Results_*', '*_noise_map.npz'))
+    previews = glob.glob(str(tmp_path / 'output' / '01.2d_NPS_images' / 'Noise_map__*.jpg'))
+    assert len(noise_maps) == 4 and len(previews) == 4
+    with np.load(noise_maps[0]) as saved:
+        assert saved['SD'].shape == (4, 11, 11)
+    # no new images in the data set, that next runs would find
+    new_files = set(glob.glob(os.path.join(dicom_dataset, '**', '*.*'), recursive=True)) - set(files_before)
+    assert not any(path.endswith(('.jpg', '.png', '.dcm')) for path in new_files)
@@ -0,0 +1,67 @@
+"""
+Ensemble 2d-NPS of NPSAccumulator compared with the mean of all stored 2d-NPS of each geometry.
+"""
+
+import pickle
+from concurrent.futures import ThreadPoolExecutor
+
+import numpy as np
+
+from NPSAccumulator import NPSAccumulator
+
+
+def random_images(rng, num_images):
+    images = []
+    for num_image in range(num_images):
+        pixel_spacing = (0.5, 0.5) if num_image % 2 == 0 else (0.7, 0.7)
+        shapes = [(32, 32), (32, 32), (30, 40)]
+        images.append(([rng.random(shape) for shape in shapes], shapes, pixel_spacing))
+    return images
+
+
+def naive_geometries(images):
+    stored_nps = {}
+    for nps_2d_list, roi_shapes, pixel_spacing in images:
+        for nps_2d, shape in zip(nps_2d_list, roi_shapes):
+            stored_nps.setdefault(tuple(shape) + (pixel_spacing[0],), []).append(nps_2d)
+    return {geometry: (np.mean(nps_list, axis=0), len(nps_list)) for geometry, nps_list in stored_nps.items()}
+
+
+def assert_same_geometries(accumulator, images):
+    expected = naive_geometries(images)
+    geometries = accumulator.geometries()
+    assert len(geometries) == len(expected)
+    for geometry in geometries:
+        mean_nps, count = expected[tuple(geometry['shape']) + (geometry['pixel_spacing'],)]
+        assert geometry['count'] == count
+        np.testing.assert_allclose(geometry['nps_2d'], mean_nps, rtol=1e-12)
+
+
+def test_geometries_equal_mean_of_stored_nps():
+    images = random_images(np.random.default_rng(7), num_images=6)
+    accumulator = NPSAccumulator()
+    for nps_2d_list, roi_shapes, pixel_spacing in images:
+        accumulator.add_image_nps(nps_2d_list, roi_shapes, pixel_spacing)
+    assert_same_geometries(accumulator, images)
+
+
+def test_images_added_by_several_threads():
+    images = random_images(np.random.default_rng(8), num_images=40)
+    accumulator = NPSAccumulator()
+    with ThreadPoolExecutor(max_workers=8) as executor:
+        list(executor.map(lambda image: accumulator.add_image_nps(*image), images))
+    assert_same_geometries(accumulator, images)
+
+
+def test_pickled_accumulator():
+    images = random_images(np.random.default_rng(9), num_images=4)
+    accumulator = NPSAccumulator()
+    accumulator.add_image_nps(*images[0])
+    accumulator = pickle.loads(pickle.dumps(accumulator))
+    for image in images[1:]:
+        accumulator.add_image_nps(*image)
+    assert_same_geometries(accumulator, images)
+
+
+def test_empty_accumulator():
+    assert NPSAccumulator().geometries() == []
@@ -0,0 +1,103 @@
+"""
+Background writing of 2d-NPS images: policies, unique names, bounded queue
+of pending images and flush on close.
+"""
+
+import os
+import threading
+import time
+
+import numpy as np
+import pytest
+
+from NPSImageWriter import NPSImageWriter
+
+
+def identity_nps(nps_2d, shape, kernel):
+    return nps_2d
+
+
+def spectrum():
+    return np.random.default_rng().random((8, 8))
+
+
+def written_files(folder):
+    return sorted(name for name in os.listdir(folder) if name.endswith('.jpg'))
+
+
+def test_policies(tmp_path):
+    spectra = [np.random.default_rng(num).random((16, 16)) for num in range(3)]
+    shapes = [(16, 16)] * 3
+    written = {}
+    for policy in NPSImageWriter.policies:
+        folder = tmp_path / policy
+        folder.mkdir()
+        writer = NPSImageWriter(str(folder), policy, 'fft2', identity_nps)
+        writer.add_image_nps(spectra, shapes, name='StudyA__S_1__img_1', first_image=True)
+        writer.add_image_nps(spectra, shapes, name='StudyA__S_1__img_2', first_image=False)
+        # the same image once more: names must not collide
+        writer.add_image_nps(spectra, shapes, name='StudyA__S_1__img_2', first_image=False)
+        writer.close()
+        written[policy] = written_files(str(folder))
+    assert written['off'] == []
+    assert written['first_roi_per_series'] == ['NPS_2D__StudyA__S_1__img_1__ROI_1__.jpg']
+    assert len(written['image_ensemble']) == 3
+    assert 'NPS_2D__StudyA__S_1__img_2__ensemble_2__.jpg' in written['image_ensemble']
+    assert len(written['all']) == 9
+
+
+def test_submit_waits_if_queue_is_full(tmp_path):
+    disk_ready = threading.Event()
+
+    def slow_disk(nps_2d, shape, kernel):
+        disk_ready.wait(timeout=30)
+        return nps_2d
+
+    writer = NPSImageWriter(str(tmp_path), 'all', 'fft2', slow_disk, max_pending=3)
+    num_images = 10
+    submitter = threading.Thread(target=lambda: [writer.submit(spectrum(), (8, 8), 'img_%d' % num)
+                                                 for num in range(num_images)])
+    submitter.start()
+    time.sleep(0.5)
+    # computation waits for the disk instead of queueing all spectra
+    assert submitter.is_alive()
+    assert writer.num_written == 3
+    assert len(writer.futures) <= 3
+
+    disk_ready.set()
+    submitter.join(timeout=30)
+    assert not submitter.is_alive()
+    assert len(writer.futures) <= 3
+    writer.close()
+    assert len(writer.futures) == 0 and writer.executor is None
+    assert len(written_files(str(tmp_path))) == num_images
+
+
+def test_close_writes_pending_images(tmp_path):
+    def slow_disk(nps_2d, shape, kernel):
+        time.sleep(0.02)
+        return nps_2d
+
+    writer = NPSImageWriter(str(tmp_path), 'all', 'fft2', slow_disk, max_pending=64)
+    writer.add_image_nps([spectrum() for _ in range(20)], [(8, 8)] * 20, name='img', first_image=True)
+    assert len(written_files(str(tmp_path))) < 20
+    writer.close()
+    assert len(written_files(str(tmp_path))) == 20
+    # the writer is usable after close
+    writer.submit(spectrum(), (8, 8), 'img')
+    writer.close()
+    assert len(written_files(str(tmp_path))) == 21
+
+
+def test_errors_of_writing_are_raised(tmp_path):
+    writer = NPSImageWriter(str(tmp_path), 'all', 'fft2', lambda nps_2d, shape, kernel: 1 / 0, max_pending=1)
+    writer.submit(spectrum(), (8, 8), 'img_1')
+    with pytest.raises(ZeroDivisionError):
+        writer.submit(spectrum(), (8, 8), 'img_2')
+
+
+def test_invalid_arguments(tmp_path):
+    with pytest.raises(ValueError):
+        NPSImageWriter(str(tmp_path), 'some', 'fft2', identity_nps)
+    with pytest.raises(ValueError):
+        NPSImageWriter(str(tmp_path), 'all', 'fft2', identity_nps, max_pending=0)
@@ -0,0 +1,73 @@
+"""
+Rows read by PartialPixelReader compared with rows of the whole image
+decoded by pydicom.
+"""
+
+import numpy as np
+import pydicom
+import pytest
+
+from PartialPixelReader import PartialPixelReader
+from conftest import open_dataset, write_dicom
+
+
+def read_rows(image_file, row_start, row_end):
+    # position of Pixel Data as left by the header read of StartClass.create_base_array
+    with open(image_file, 'rb') as file_to_read:
+        header_dcm = pydicom.dcmread(file_to_read, force=True, stop_before_pixels=True)
+        pixel_data_position = file_to_read.tell()
+    return PartialPixelReader.read_rows(image_file, header_dcm, pixel_data_position, row_start, row_end)
+
+
+@pytest.mark.parametrize('dtype, bits_stored', [(np.int16, 16), (np.uint16, 16), (np.int16, 12), (np.uint16, 12)])
+def test_read_rows_equals_rows_of_pixel_array(tmp_path, dtype, bits_stored):
+    rng = np.random.default_rng(1)
+    low, high = (-(1 << (bits_stored - 1)), 1 << (bits_stored - 1)) if dtype == np.int16 else (0, 1 << bits_stored)
+    pixels = rng.integers(low, high, (40, 24)).astype(dtype)
+    image_file = write_dicom(str(tmp_path / 'image.dcm'), pixels,
+                             BitsStored=bits_stored, HighBit=bits_stored - 1)
+    whole_array = pydicom.dcmread(image_file, force=True).pixel_array
+
+    for row_start, row_end in [(0, 40), (5, 17), (39, 40), (30, 60), (12, 12)]:
+        band = read_rows(image_file, row_start, row_end)
+        assert band.dtype == whole_array.dtype
+        np.testing.assert_array_equal(band, whole_array[row_start:row_end])
+
+
+def test_headers_of_different_length_within_series(tmp_path):
+    rng = np.random.default_rng(2)
+    series_folder = tmp_path / 'series'
+    series_folder.mkdir()
+    for num_image in range(4):
+        write_dicom(str(series_folder / ('image_%d.dcm' % num_image)),
+                    rng.integers(-1000, 1000, (64, 48)).astype(np.int16),
+                    ImageComments='x' * (7 * num_image), InstanceNumber=num_image + 1)
+    obj_arrays = open_dataset(str(tmp_path), pixel_cache_mb=0)
+
+    for image_file in obj_arrays.filelist:
+        image_dict = obj_arrays.create_base_array(image_file, row_range=(20, 36))
+        # the band is read, there is no fall back to full decoding
+        assert image_dict['row_offset'] == 20
+        assert image_dict['base_array'].shape == (16, 48)
+        np.testing.assert_array_equal(image_dict['base_array'],
+                                      pydicom.dcmread(image_file, force=True).pixel_array[20:36])
+
+
+def test_truncated_pixel_data_is_not_read(tmp_path):
+    image_file = write_dicom(str(tmp_path / 'image.dcm'), np.zeros((32, 32), np.int16))
+    with open(image_file, 'r+b') as file_to_truncate:
+        file_to_truncate.truncate(file_to_truncate.seek(0, 2) - 100)
+    assert read_rows(image_file, 0, 8) is not None
+    assert read_rows(image_file, 24, 32) is None
+
+
+def test_unsupported_image_is_not_read(tmp_path):
+    image_file = write_dicom(str(tmp_path / 'image.dcm'), np.arange(64, dtype=np.uint8).reshape(8, 8),
+                             BitsAllocated=8, BitsStored=8, HighBit=7)
+    assert read_rows(image_file, 0, 4) is None
+
+
+def test_wrong_position_is_not_read(tmp_path):
+    image_file = write_dicom(str(tmp_path / 'image.dcm'), np.zeros((32, 32), np.int16))
+    header_dcm = pydicom.dcmread(image_file, force=True, stop_before_pixels=True)
+    assert PartialPixelReader.read_rows(image_file, header_dcm, 132, 0, 8) is None
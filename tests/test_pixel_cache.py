@@ -0,0 +1,97 @@
+"""
+Pixel cache of StartClass: reuse of decoded images, eviction of least
+recently used images within the budget and invalidation of changed files.
+"""
+
+import os
+import pickle
+
+import numpy as np
+import pydicom
+import pytest
+
+from conftest import open_dataset, write_dicom
+
+# bytes of one decoded 32x32 int16 image
+IMAGE_BYTES = 32 * 32 * 2
+
+
+@pytest.fixture
+def series(tmp_path):
+    rng = np.random.default_rng(4)
+    series_folder = tmp_path / 'data' / 'Study' / 'S_1'
+    series_folder.mkdir(parents=True)
+    for num_image in range(4):
+        write_dicom(str(series_folder / ('img_%d.dcm' % num_image)),
+                    rng.integers(-500, 500, (32, 32)).astype(np.int16), InstanceNumber=num_image + 1)
+    return str(tmp_path / 'data')
+
+
+def open_counting_reads(folder_with_images, num_cached_images):
+    obj_arrays = open_dataset(folder_with_images, pixel_cache_mb=num_cached_images * IMAGE_BYTES / 1024 ** 2)
+    obj_arrays.decoded_files = []
+    read_image = obj_arrays.read_image
+
+    def counting_read_image(image_file):
+        obj_arrays.decoded_files.append(os.path.basename(image_file))
+        return read_image(image_file)
+
+    obj_arrays.read_image = counting_read_image
+    return obj_arrays
+
+
+def test_cached_image_is_not_decoded_again(series):
+    obj_arrays = open_counting_reads(series, num_cached_images=4)
+    first = obj_arrays.create_base_array(obj_arrays.filelist[0])
+    second = obj_arrays.create_base_array(obj_arrays.filelist[0])
+
+    assert obj_arrays.decoded_files == ['img_0.dcm']
+    assert second['base_array'] is first['base_array']
+    # the shared array cannot be changed by one of its users
+    assert not second['base_array'].flags.writeable
+    np.testing.assert_array_equal(second['base_array'], pydicom.dcmread(obj_arrays.filelist[0]).pixel_array)
+    assert obj_arrays.pixel_cache_statistics['hits'] == 1
+    assert obj_arrays.pixel_cache_statistics['misses'] == 1
+
+
+def test_least_recently_used_image_is_evicted(series):
+    obj_arrays = open_counting_reads(series, num_cached_images=2)
+    img_0, img_1, img_2 = obj_arrays.filelist[:3]
+    for image_file in (img_0, img_1, img_0, img_2):
+        obj_arrays.create_base_array(image_file)
+    # img_1 has been used less recently than img_0
+    for image_file in (img_0, img_2, img_1):
+        obj_arrays.create_base_array(image_file)
+
+    assert obj_arrays.decoded_files == ['img_0.dcm', 'img_1.dcm', 'img_2.dcm', 'img_1.dcm']
+    statistics = obj_arrays.pixel_cache_statistics
+    assert statistics['entries'] == 2
+    assert statistics['bytes'] == 2 * IMAGE_BYTES
+    assert statistics['evictions'] == 2
+
+
+def test_changed_file_is_decoded_again(series):
+    obj_arrays = open_counting_reads(series, num_cached_images=4)
+    image_file = obj_arrays.filelist[1]
+    obj_arrays.create_base_array(image_file)
+    changed_pixels = np.full((32, 32), 3, np.int16)
+    write_dicom(image_file, changed_pixels, InstanceNumber=2, ImageComments='changed')
+
+    np.testing.assert_array_equal(obj_arrays.create_base_array(image_file)['base_array'], changed_pixels)
+    assert obj_arrays.decoded_files == ['img_1.dcm', 'img_1.dcm']
+
+
+def test_disabled_cache_and_copies_for_workers(series):
+    obj_arrays = open_counting_reads(series, num_cached_images=0)
+    obj_arrays.create_base_array(obj_arrays.filelist[0])
+    obj_arrays.create_base_array(obj_arrays.filelist[0])
+    assert obj_arrays.decoded_files == ['img_0.dcm', 'img_0.dcm']
+    assert len(obj_arrays.pixel_cache) == 0
+
+    obj_arrays = open_dataset(series, pixel_cache_mb=1)
+    obj_arrays.create_base_array(obj_arrays.filelist[0])
+    # worker processes start with an empty cache of their own
+    copy_for_worker = pickle.loads(pickle.dumps(obj_arrays))
+    assert len(obj_arrays.pixel_cache) == 1 and len(copy_for_worker.pixel_cache) == 0
+    copy_for_worker.create_base_array(obj_arrays.filelist[1])
+    assert len(copy_for_worker.pixel_cache) == 1
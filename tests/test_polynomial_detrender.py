@@ -0,0 +1,55 @@
+"""
+Backgrounds fitted by PolynomialDetrender compared with np.linalg.lstsq
+of each ROI in pixel coordinates.
+"""
+
+import numpy as np
+import pytest
+
+from GeometryCache import GeometryCache
+from PolynomialDetrender import PolynomialDetrender
+
+
+def naive_fit(roi, order):
+    rows, columns = np.indices(roi.shape)
+    basis = np.stack([np.ravel(rows ** p * columns ** q)
+                      for p in range(order + 1) for q in range(order + 1)], axis=1).astype(np.float64)
+    coefficients = np.linalg.lstsq(basis, np.ravel(roi).astype(np.float64), rcond=None)[0]
+    return (basis @ coefficients).reshape(roi.shape)
+
+
+@pytest.mark.parametrize('order', [1, 2])
+@pytest.mark.parametrize('shape', [(32, 32), (30, 40), (1, 16)])
+def test_detrend_stack_equals_least_squares_of_each_roi(order, shape):
+    rng = np.random.default_rng(6)
+    rows, columns = np.indices(shape)
+    stack = np.stack([rng.normal(0, 10, shape) + 3 * rows - 2 * columns + 0.1 * rows * columns + 50
+                      for _ in range(5)]).astype(np.int16)
+    detrender = PolynomialDetrender(order=order)
+
+    detrended = detrender.detrend_stack(stack)
+
+    for roi, detrended_roi in zip(stack, detrended):
+        np.testing.assert_allclose(detrended_roi, roi - naive_fit(roi, order), atol=1e-8)
+        np.testing.assert_allclose(detrender.detrend(roi), detrended_roi, atol=1e-10)
+
+
+def test_polynomial_background_is_removed():
+    rows, columns = np.indices((24, 24)).astype(np.float64)
+    background = 4 + 0.5 * rows - 0.25 * columns + 0.01 * rows ** 2 * columns ** 2
+    np.testing.assert_allclose(PolynomialDetrender(order=2).detrend(background), 0, atol=1e-9)
+
+
+def test_projector_is_built_once_per_shape():
+    cache = GeometryCache()
+    detrender = PolynomialDetrender(order=1, cache=cache)
+    for _ in range(3):
+        detrender.detrend_stack(np.zeros((2, 16, 16)))
+    detrender.detrend_stack(np.zeros((2, 16, 20)))
+    assert cache.statistics['misses'] == 2
+    assert cache.statistics['hits'] == 2
+
+
+def test_invalid_order():
+    with pytest.raises(ValueError):
+        PolynomialDetrender(order=3)
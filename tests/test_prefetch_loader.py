@@ -0,0 +1,89 @@
+"""
+PrefetchLoader: order of loaded images, read-ahead bound, errors of
+loading and cancelling of pending loads.
+"""
+
+import threading
+import time
+
+import pytest
+
+from PrefetchLoader import PrefetchLoader
+
+
+def test_images_are_yielded_in_order_of_keys():
+    keys = list(range(20))
+
+    def load(key):
+        # later keys are loaded faster than earlier ones
+        time.sleep(0.002 * (len(keys) - key) % 7)
+        return key * 10
+
+    loader = PrefetchLoader(load_function=load, keys=keys, depth=5, num_threads=4)
+    assert list(loader) == [key * 10 for key in keys]
+    assert loader.statistics()['images'] == len(keys)
+    loader.close()
+
+
+def test_loads_are_bounded_by_depth():
+    started = []
+    consumed = []
+    lock = threading.Lock()
+    max_ahead = []
+
+    def load(key):
+        with lock:
+            started.append(key)
+            max_ahead.append(len(started) - len(consumed))
+        return key
+
+    loader = PrefetchLoader(load_function=load, keys=range(30), depth=3, num_threads=3)
+    for image in loader:
+        with lock:
+            consumed.append(image)
+        time.sleep(0.001)
+    loader.close()
+    # the current image and depth images loaded ahead
+    assert max(max_ahead) <= 3 + 1
+    assert consumed == list(range(30))
+
+
+def test_slow_load_is_counted_as_stall():
+    release = threading.Event()
+
+    def load(key):
+        if key == 1:
+            release.wait(timeout=30)
+        return key
+
+    loader = PrefetchLoader(load_function=load, keys=[0, 1, 2], depth=1)
+    assert next(loader) == 0
+    threading.Timer(0.1, release.set).start()
+    assert next(loader) == 1
+    statistics = loader.statistics()
+    assert statistics['stalls'] >= 1 and statistics['stall_time'] >= 0.05
+    loader.close()
+
+
+def test_error_of_load_is_raised_in_order():
+    def load(key):
+        if key == 2:
+            raise OSError('image %d cannot be read' % key)
+        return key
+
+    loader = PrefetchLoader(load_function=load, keys=range(5), depth=0, num_threads=2)
+    assert [next(loader), next(loader)] == [0, 1]
+    with pytest.raises(OSError):
+        next(loader)
+    loader.close()
+
+
+def test_close_cancels_pending_loads():
+    loaded = []
+    loader = PrefetchLoader(load_function=lambda key: loaded.append(key) or time.sleep(0.05),
+                            keys=range(50), depth=4, num_threads=1)
+    next(loader)
+    loader.close()
+    # only images already being loaded are finished
+    assert len(loaded) <= 6
+    assert len(loader.futures) == 0
@@ -0,0 +1,39 @@
+"""
+Radial mean of 2d-NPS built by one binned reduction compared with the
+former implementation (one boolean mask of the radius grid per radius).
+"""
+
+import numpy as np
+import pytest
+
+from ProcessROI import ProcessROI
+
+
+def masked_radial_mean(array):
+    # former ProcessROI.radial_mean
+    image_height, image_width = array.shape
+    center_x = image_width // 2
+    center_y = image_height // 2
+    max_size = max(image_height, image_width)
+    x, y = np.meshgrid(np.arange(image_width), np.arange(image_height))
+    R = np.sqrt((x - center_x) ** 2 + (y - center_y) ** 2)
+    r = np.linspace(0, max_size // 2, num=max_size // 2 + 1)
+    with np.errstate(invalid='ignore', divide='ignore'):
+        mean = np.array([array[(R >= radius - .5) & (R < radius + .5)].mean() for radius in r])
+    return [array[center_y][center_x]] + mean
+
+
+@pytest.mark.parametrize('shape', [(64, 64), (63, 63), (32, 48), (48, 31), (1, 9), (2, 2)])
+def test_radial_mean_equals_masked_mean(shape):
+    array = np.random.default_rng(sum(shape)).random(shape)
+    with np.errstate(invalid='ignore'):
+        expected = masked_radial_mean(array)
+    np.testing.assert_allclose(ProcessROI.radial_mean(array), expected, rtol=1e-12, equal_nan=True)
+
+
+def test_radial_mean_stack_equals_radial_mean_of_each_array():
+    stack = np.random.default_rng(5).random((7, 40, 40))
+    means = ProcessROI.radial_mean_stack(stack)
+    assert means.shape == (7, 21)
+    for array, mean in zip(stack, means):
+        np.testing.assert_allclose(mean, masked_radial_mean(array), rtol=1e-12)
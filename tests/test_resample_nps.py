@@ -0,0 +1,73 @@
+"""
+Vectorized interpolation of 1d-NPS onto freq_range compared with the
+former loop over the frequencies of freq_range (get_current_nps).
+"""
+
+import numpy as np
+import pytest
+
+from ProcessROI import ProcessROI
+
+
+def interpolate_each_frequency(values, freq_array, freq_range):
+    # former loop of execute_nps_comp: stops at the first frequency,
+    # that has no lower or upper boundary frequency in freq_array
+    freq_array = list(freq_array)
+    nps_range = []
+    new_freq_range = []
+    for freq_value in freq_range:
+        less_values = [freq for freq in freq_array if freq <= freq_value]
+        greater_values = [freq for freq in freq_array if freq >= freq_value]
+        if not less_values or not greater_values:
+            break
+        min_bound_idx = freq_array.index(max(less_values))
+        max_bound_idx = freq_array.index(min(greater_values))
+        if min_bound_idx == max_bound_idx:
+            current_nps = values[min_bound_idx]
+        else:
+            slope = (values[max_bound_idx] - values[min_bound_idx]) / \
+                    (freq_array[max_bound_idx] - freq_array[min_bound_idx])
+            current_nps = values[min_bound_idx] + slope * (freq_value - freq_array[min_bound_idx])
+        nps_range.append(max(current_nps, 0))
+        new_freq_range.append(freq_value)
+    return nps_range, new_freq_range
+
+
+@pytest.mark.parametrize('max_size, pixel_spacing', [(64, 0.5), (33, 0.7), (128, 0.35), (2, 1.0)])
+def test_resample_equals_loop_over_frequencies(max_size, pixel_spacing):
+    freq_array = np.fft.fftfreq(max_size, pixel_spacing / 10)[:max_size // 2]
+    # frequencies of freq_range coincide partly with freq_array
+    freq_range = np.round(np.arange(0, 15, 0.1), 10)
+    values_stack = np.random.default_rng(max_size).normal(1, 1, (4, freq_array.size))
+
+    resampled = ProcessROI.resample_nps(values_stack, freq_array, freq_range)
+
+    for values, actual in zip(values_stack, resampled['values']):
+        expected, expected_freqs = interpolate_each_frequency(values, freq_array, freq_range)
+        np.testing.assert_allclose(actual, expected, rtol=1e-12, atol=1e-12)
+        np.testing.assert_array_equal(resampled['frequencies'], expected_freqs)
+    # negative interpolated values are set to zero
+    assert (resampled['values'] >= 0).all()
+
+
+def test_freq_range_below_first_frequency():
+    freq_array = np.array([0.2, 0.4, 0.6])
+    resampled = ProcessROI.resample_nps(np.ones((2, 3)), freq_array, np.array([0., 0.3, 0.5]))
+    assert resampled['values'].shape == (2, 0)
+    assert resampled['frequencies'].size == 0
+
+
+def test_list_of_nps_with_different_frequencies():
+    processor = ProcessROI.__new__(ProcessROI)
+    processor.freq_range = np.round(np.arange(0, 12, 0.25), 10)
+    rng = np.random.default_rng(3)
+    list_of_dict = []
+    for max_size in (64, 40, 64, 40, 25):
+        freqs = np.fft.fftfreq(max_size, 0.05)[:max_size // 2]
+        list_of_dict.append({'values': rng.random(freqs.size), 'frequencies': freqs})
+
+    for nps_dict, ranged in zip(list_of_dict, processor.resample_nps_list(list_of_dict)):
+        expected, expected_freqs = interpolate_each_frequency(nps_dict['values'], nps_dict['frequencies'],
+                                                              processor.freq_range)
+        np.testing.assert_allclose(ranged['values'], expected, rtol=1e-12, atol=1e-12)
+        np.testing.assert_array_equal(ranged['frequencies'], expected_freqs)
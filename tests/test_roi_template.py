@@ -0,0 +1,84 @@
+"""
+ROITemplate compared with the naive dict mapping each image to its own list of ROIs.
+"""
+
+import os
+
+import numpy as np
+import pytest
+
+from ROITemplate import ROITemplate
+
+FILES = [os.path.join('/data', series, 'img_%d.dcm' % num_image)
+         for series in ('S_1', 'S_2') for num_image in range(3)]
+ROIS = [(10, 10, 42, 42), (50, 10, 82, 42)]
+
+
+def assert_same_as_dict(template, naive_dict):
+    assert list(template) == list(naive_dict)
+    assert list(template.keys()) == list(naive_dict.keys())
+    assert len(template) == len(naive_dict)
+    for image_file, rois in template.items():
+        np.testing.assert_array_equal(rois, np.array(naive_dict[image_file], dtype=np.int64).reshape(-1, 4))
+        np.testing.assert_array_equal(template[image_file], rois)
+        assert image_file in template
+
+
+def test_rois_of_whole_data_set():
+    template = ROITemplate(FILES, ROIS)
+    naive_dict = {image_file: list(ROIS) for image_file in FILES}
+    assert_same_as_dict(template, naive_dict)
+
+    template.append((1, 2, 33, 34))
+    for image_file in naive_dict:
+        naive_dict[image_file].append((1, 2, 33, 34))
+    assert_same_as_dict(template, naive_dict)
+
+    template.remove_last()
+    template.remove_last()
+    for image_file in naive_dict:
+        del naive_dict[image_file][-2:]
+    assert_same_as_dict(template, naive_dict)
+
+
+def test_overrides_of_series_and_images():
+    template = ROITemplate(FILES, ROIS)
+    naive_dict = {image_file: list(ROIS) for image_file in FILES}
+
+    template.set_series_rois('/data/S_2', [(0, 0, 16, 16)])
+    template.update({FILES[0]: [(5, 5, 21, 21)], FILES[4]: [(6, 6, 22, 22), (30, 30, 46, 46)]})
+    for image_file in FILES[3:]:
+        naive_dict[image_file] = [(0, 0, 16, 16)]
+    naive_dict[FILES[0]] = [(5, 5, 21, 21)]
+    naive_dict[FILES[4]] = [(6, 6, 22, 22), (30, 30, 46, 46)]
+    assert_same_as_dict(template, naive_dict)
+
+    # ROIs of the whole data set do not change overrides
+    template.append((1, 2, 33, 34))
+    for image_file in FILES[1:3]:
+        naive_dict[image_file].append((1, 2, 33, 34))
+    assert_same_as_dict(template, naive_dict)
+
+
+def test_image_with_own_rois_is_added():
+    template = ROITemplate(FILES, ROIS)
+    template.set_image_rois('/data/S_3/img_0.dcm', [(0, 0, 8, 8)])
+    assert '/data/S_3/img_0.dcm' in template
+    assert len(template) == len(FILES) + 1
+    np.testing.assert_array_equal(template['/data/S_3/img_0.dcm'], [[0, 0, 8, 8]])
+
+
+def test_rois_are_shared_and_read_only():
+    template = ROITemplate(FILES, ROIS)
+    assert all(template[image_file] is template.rois for image_file in FILES)
+    with pytest.raises(ValueError):
+        template[FILES[0]][0, 0] = 0
+
+
+def test_errors():
+    template = ROITemplate(FILES)
+    assert template[FILES[0]].shape == (0, 4)
+    with pytest.raises(IndexError):
+        template.remove_last()
+    with pytest.raises(KeyError):
+        template['/data/S_1/unknown.dcm']
@@ -0,0 +1,68 @@
+"""
+RunningStatistics compared with np.mean, np.var and np.std of all values.
+"""
+
+import numpy as np
+import pytest
+
+from RunningStatistics import RunningStatistics
+
+
+def assert_same_statistics(statistics, values):
+    assert statistics.count == len(values)
+    np.testing.assert_allclose(statistics.mean, np.mean(values, axis=0), rtol=1e-12)
+    np.testing.assert_allclose(statistics.variance(), np.var(values, axis=0), rtol=1e-9)
+    np.testing.assert_allclose(statistics.sd(), np.std(values, axis=0), rtol=1e-9)
+
+
+@pytest.mark.parametrize('shape', [(), (17,)])
+def test_update_one_by_one(shape):
+    values = np.random.default_rng(10).normal(1000, 5, (50,) + shape)
+    statistics = RunningStatistics()
+    for value in values:
+        statistics.update(value)
+    assert_same_statistics(statistics, values)
+
+
+@pytest.mark.parametrize('shape', [(), (17,)])
+def test_update_batches(shape):
+    values = np.random.default_rng(11).normal(-20, 3, (50,) + shape)
+    statistics = RunningStatistics()
+    for start, end in [(0, 7), (7, 8), (8, 8), (8, 31), (31, 50)]:
+        statistics.update_batch(values[start:end])
+    assert_same_statistics(statistics, values)
+
+
+def test_batches_and_single_values():
+    values = np.random.default_rng(12).normal(0, 1, 30)
+    statistics = RunningStatistics()
+    statistics.update(values[0])
+    statistics.update_batch(values[1:20])
+    for value in values[20:]:
+        statistics.update(value)
+    assert_same_statistics(statistics, values)
+
+
+def test_from_values_is_exact_for_first_batch():
+    values = [3.0, 1.0, 4.0, 1.0, 5.0]
+    statistics = RunningStatistics.from_values(values)
+    assert statistics.mean == np.mean(values)
+    assert statistics.variance() == np.var(values)
+
+
+def test_large_offset_does_not_lose_variance():
+    values = 1e9 + np.random.default_rng(13).normal(0, 1, 1000)
+    statistics = RunningStatistics()
+    for value in values:
+        statistics.update(value)
+    np.testing.assert_allclose(statistics.variance(), np.var(values), rtol=1e-6)
+
+
+def test_no_values():
+    statistics = RunningStatistics()
+    assert statistics.count == 0
+    assert np.isnan(statistics.mean)
+    assert np.isnan(statistics.variance())
+    assert np.isnan(statistics.sd())
+    statistics.update_batch([])
+    assert statistics.count == 0
@@ -0,0 +1,122 @@
+"""
+Images sliced out of series volumes compared with images read from their files;
+reuse and rebuild of stored volumes, series that cannot be stored as volume
+and building of one series without blocking the others.
+"""
+
+import os
+import threading
+
+import numpy as np
+import pydicom
+
+from SeriesVolumeCache import SeriesVolumeCache
+from conftest import open_dataset, write_dicom
+
+
+def write_series(root, series, num_images=4, shape=(32, 40), dtype=np.int16, seed=0):
+    rng = np.random.default_rng(seed)
+    series_folder = root / 'Study' / series
+    series_folder.mkdir(parents=True, exist_ok=True)
+    low, high = (-2000, 2000) if dtype == np.int16 else (0, 65535)
+    for num_image in range(num_images):
+        write_dicom(str(series_folder / ('img_%02d.dcm' % num_image)),
+                    rng.integers(low, high, shape).astype(dtype), InstanceNumber=num_image + 1)
+    return str(series_folder)
+
+
+def create_cache(tmp_path, obj_arrays):
+    folder_of_volumes = tmp_path / 'volumes'
+    folder_of_volumes.mkdir(exist_ok=True)
+    return SeriesVolumeCache(folder_of_volumes=str(folder_of_volumes), file_dict=obj_arrays.filedict)
+
+
+def test_images_of_volume_equal_read_images(tmp_path):
+    write_series(tmp_path / 'data', 'S_1', dtype=np.uint16)
+    write_series(tmp_path / 'data', 'S_2', shape=(24, 24), seed=1)
+    obj_arrays = open_dataset(str(tmp_path / 'data'), pixel_cache_mb=0)
+    cache = create_cache(tmp_path, obj_arrays)
+
+    for image_file in obj_arrays.filelist:
+        image_dict = cache.get_image(image_file, obj_arrays.read_image)
+        expected = pydicom.dcmread(image_file).pixel_array
+        # native data type of the images (uint16 values above 32767 are not wrapped)
+        assert image_dict['base_array'].dtype == expected.dtype
+        np.testing.assert_array_equal(image_dict['base_array'], expected)
+        assert isinstance(image_dict['base_array'], np.memmap)
+        assert [float(i) for i in image_dict['whole_dcm'].PixelSpacing] == [0.5, 0.5]
+    assert len(os.listdir(str(tmp_path / 'volumes'))) == 4
+
+
+def test_stored_volume_is_reused_and_rebuilt_after_change(tmp_path):
+    series_folder = write_series(tmp_path / 'data', 'S_1')
+    obj_arrays = open_dataset(str(tmp_path / 'data'), pixel_cache_mb=0)
+    first_file = obj_arrays.filelist[0]
+    create_cache(tmp_path, obj_arrays).get_image(first_file, obj_arrays.read_image)
+
+    def no_read(image_file):
+        raise AssertionError('%s is read, although the volume is stored' % image_file)
+
+    # next run: images are taken from the stored volume without reading files
+    image_dict = create_cache(tmp_path, obj_arrays).get_image(obj_arrays.filelist[2], no_read)
+    np.testing.assert_array_equal(image_dict['base_array'], pydicom.dcmread(obj_arrays.filelist[2]).pixel_array)
+
+    # a changed image makes the volume be built again
+    changed_pixels = np.full((32, 40), 7, dtype=np.int16)
+    write_dicom(os.path.join(series_folder, 'img_02.dcm'), changed_pixels, InstanceNumber=3, ImageComments='changed')
+    read_files = []
+    cache = create_cache(tmp_path, obj_arrays)
+    image_dict = cache.get_image(obj_arrays.filelist[2],
+                                 lambda image_file: read_files.append(image_file) or obj_arrays.read_image(image_file))
+    np.testing.assert_array_equal(image_dict['base_array'], changed_pixels)
+    assert sorted(read_files) == sorted(obj_arrays.filelist)
+
+
+def test_series_that_cannot_be_stored_as_volume(tmp_path):
+    mixed_folder = write_series(tmp_path / 'data', 'S_mixed')
+    write_dicom(os.path.join(mixed_folder, 'img_99.dcm'), np.zeros((16, 16), np.int16))
+    broken_folder = write_series(tmp_path / 'data', 'S_broken', seed=2)
+    with open(os.path.join(broken_folder, 'img_01.dcm'), 'r+b') as file_to_break:
+        file_to_break.truncate(200)
+    obj_arrays = open_dataset(str(tmp_path / 'data'), pixel_cache_mb=0)
+    cache = create_cache(tmp_path, obj_arrays)
+
+    for series_folder in (mixed_folder, broken_folder):
+        files = [image_file for image_file in obj_arrays.filelist if os.path.dirname(image_file) == series_folder]
+        # the run continues with the normal read path (None), it is not aborted
+        assert cache.get_image(files[0], obj_arrays.read_image) is None
+        assert cache.volumes[series_folder] is None
+    assert os.listdir(str(tmp_path / 'volumes')) == []
+
+
+def test_building_a_volume_does_not_block_other_series(tmp_path):
+    write_series(tmp_path / 'data', 'S_1')
+    write_series(tmp_path / 'data', 'S_2', seed=3)
+    obj_arrays = open_dataset(str(tmp_path / 'data'), pixel_cache_mb=0)
+    cache = create_cache(tmp_path, obj_arrays)
+    files_1 = [image_file for image_file in obj_arrays.filelist if '/S_1/' in image_file.replace(os.sep, '/')]
+    files_2 = [image_file for image_file in obj_arrays.filelist if '/S_2/' in image_file.replace(os.sep, '/')]
+    slow_read_started = threading.Event()
+    slow_read_released = threading.Event()
+
+    def slow_read(image_file):
+        slow_read_started.set()
+        slow_read_released.wait(timeout=30)
+        return obj_arrays.read_image(image_file)
+
+    results = {}
+    builder = threading.Thread(target=lambda: results.update(S_1=cache.get_image(files_1[0], slow_read)))
+    builder.start()
+    assert slow_read_started.wait(timeout=30)
+
+    other_series = threading.Thread(target=lambda: results.update(S_2=cache.get_image(files_2[0],
+                                                                                      obj_arrays.read_image)))
+    other_series.start()
+    other_series.join(timeout=30)
+    # series S_2 is built, while S_1 is still being read
+    assert not other_series.is_alive() and builder.is_alive()
+
+    slow_read_released.set()
+    builder.join(timeout=30)
+    np.testing.assert_array_equal(results['S_1']['base_array'], pydicom.dcmread(files_1[0]).pixel_array)
+    np.testing.assert_array_equal(results['S_2']['base_array'], pydicom.dcmread(files_2[0]).pixel_array)
@@ -0,0 +1,84 @@
+"""
+Sorting of ROIs into studies and series by the path index of
+sort_all_roi_dict, compared with a scan of all series for each key.
+"""
+
+import os
+
+import numpy as np
+from natsort import natsorted
+
+from ProcessROI import ProcessROI
+from ROITemplate import ROITemplate
+
+
+def scanned_roi_dict(directories_dict, all_roi_dict):
+    # scan of all series for each key (as the former nested loops),
+    # keys match whole paths or the end of paths at a separator
+    sorted_all_roi_dict = {}
+    for file_name_prim in natsorted(all_roi_dict.keys(), key=lambda f: f.split('_')[-1]):
+        for classdirname in natsorted(directories_dict.keys(), key=lambda f: f.split('_')[-1]):
+            for serie_name in natsorted(directories_dict[classdirname].keys(), key=lambda f: f.split('_')[-1]):
+                for file_name_second in directories_dict[classdirname][serie_name]:
+                    if file_name_second == file_name_prim or file_name_second.endswith(os.sep + file_name_prim):
+                        sorted_all_roi_dict.setdefault(classdirname, {}).setdefault(serie_name, {}).update(
+                            {file_name_prim: all_roi_dict[file_name_prim]})
+    return sorted_all_roi_dict
+
+
+def directories(root):
+    directories_dict = {}
+    for study in ('Study_1', 'Study_2', 'Study_10'):
+        for series in ('S_1', 'XS_1', 'S_2'):
+            directories_dict.setdefault(os.path.join(root, study), {})[series] = [
+                os.path.join(root, study, series, '%d.dcm' % num) for num in (1, 2, 11, 12)]
+    return directories_dict
+
+
+def test_full_paths_are_sorted_as_by_scan(tmp_path):
+    directories_dict = directories(str(tmp_path))
+    all_files = [path for study in directories_dict.values() for files in study.values() for path in files]
+    all_roi_dict = {path: [(0, 0, 8, 8)] for path in all_files[::-1]}
+
+    sorted_dict = ProcessROI.sort_all_roi_dict(directories_dict, all_roi_dict)
+
+    assert sorted_dict == scanned_roi_dict(directories_dict, all_roi_dict)
+    # each image is in exactly its own series
+    for study, series_dict in sorted_dict.items():
+        for series, roi_dict in series_dict.items():
+            assert all(os.path.dirname(path) == os.path.join(study, series) for path in roi_dict)
+    assert sum(len(roi_dict) for series_dict in sorted_dict.values()
+               for roi_dict in series_dict.values()) == len(all_files)
+
+
+def test_keys_are_not_matched_as_substrings(tmp_path):
+    directories_dict = directories(str(tmp_path))
+    study_1 = os.path.join(str(tmp_path), 'Study_1')
+    # '1.dcm' is contained in '11.dcm' and 'S_1' in 'XS_1'
+    full_path = os.path.join(study_1, 'S_1', '1.dcm')
+    relative_path = os.path.join('S_1', '2.dcm')
+    all_roi_dict = {full_path: [(0, 0, 4, 4)], relative_path: [(1, 1, 5, 5)]}
+
+    sorted_dict = ProcessROI.sort_all_roi_dict(directories_dict, all_roi_dict)
+
+    assert sorted_dict == scanned_roi_dict(directories_dict, all_roi_dict)
+    assert sorted_dict[study_1] == {'S_1': {full_path: [(0, 0, 4, 4)], relative_path: [(1, 1, 5, 5)]}}
+    # relative path matches series S_1 of each study, but not XS_1
+    for study, series_dict in sorted_dict.items():
+        assert list(series_dict) == ['S_1']
+
+
+def test_roi_template_is_sorted_without_copies(tmp_path):
+    directories_dict = directories(str(tmp_path))
+    all_files = [path for study in directories_dict.values() for files in study.values() for path in files]
+    template = ROITemplate(files=all_files, rois=[(0, 0, 8, 8), (8, 8, 16, 16)])
+    template.set_image_rois(all_files[3], [(2, 2, 6, 6)])
+
+    sorted_dict = ProcessROI.sort_all_roi_dict(directories_dict, template)
+
+    for study, series_dict in sorted_dict.items():
+        for series, roi_dict in series_dict.items():
+            for path, rois in roi_dict.items():
+                # the shared array of the template is passed on
+                assert rois is template.rois_of_image(path)
+    np.testing.assert_array_equal(template[all_files[3]], [(2, 2, 6, 6)])